@@ -0,0 +1,205 @@
+import Libraries
+from Events import compile_checks
+
+# NumPy is optional, without it every check goes through the usual scalar path
+# it only gets imported once there are numeric checks to batch, see create_batch_evaluator()
+numpy = None
+
+# which checks can be batched: Components holding a plain number, compared with a plain operator
+# Timer's equal_to has its own idea of equality, so it stays scalar
+NUMERIC_TYPES = ('COUNTER', 'TIMER', 'ANALOG_INPUT')
+OPERATOR_CODES = {'greater_than': 0, 'less_than': 1, 'equal_to': 2}
+SCALAR_ONLY = {('TIMER', 'equal_to')}
+
+
+def _batchable(entry):
+    """
+    Private function
+    :param entry: one of Condition.checks
+    :rtype: bool
+    """
+    comp_type = entry['COMPONENT'].get_type()
+    method_name = entry['METHOD']
+    return comp_type in NUMERIC_TYPES and method_name in OPERATOR_CODES \
+        and (comp_type, method_name) not in SCALAR_ONLY and entry['VALUE'] is not None
+
+
+def _load_numpy():
+    """
+    Private function
+    :return: whether NumPy could be imported
+    :rtype: bool
+    """
+    global numpy
+    if numpy is None:
+        try:
+            numpy = Libraries.load('numpy')
+        except ImportError:
+            return False
+    return True
+
+
+def _has_batchable_checks(events):
+    """
+    Private function
+    :type events: list[Event]
+    :rtype: bool
+    """
+    for event in events:
+        for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+            if condition is not None and any(_batchable(entry) for entry in condition.checks):
+                return True
+    return False
+
+
+class BatchEvaluator(object):
+    """
+    Works out every numeric comparison of every Condition in one vectorized pass per tick
+    Each batchable check becomes a row in three arrays:
+        slots      - which entry of the per-tick value array to look at
+        operators  - OPERATOR_CODES
+        thresholds - the value to compare against
+    Rows are grouped by Condition, so a segment reduction (logical_and.reduceat) ANDs them into one result
+    per Condition. Each Condition is then recompiled to check that result first, followed by whatever checks
+    couldn't be batched
+
+    Like EventIndex, a pass only looks at what could have changed: the rows of Components which changed since
+    the last pass, and the Conditions those rows belong to. Everything else keeps its result from before
+
+    Numeric checks see values as they were at the start of the pass, like the rest of a PLC scan.
+    A Counter bumped by one Event won't be seen by another Event's numeric checks until the next scan
+    """
+
+    def __init__(self, events):
+        """
+        :type events: list[Event]
+        """
+        self.components = []
+        self.conditions = []
+
+        # per Condition results of the last pass, as a plain list so compiled Conditions can index it cheaply
+        self.results = []
+
+        # Component -> its entry in the per-tick value array
+        self.component_slots = {}
+        component_slots = self.component_slots
+        slots = []
+        operators = []
+        thresholds = []
+        segment_starts = []
+        row_conditions = []
+
+        for event in events:
+            for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+                if condition is None:
+                    continue
+                numeric = [entry for entry in condition.checks if _batchable(entry)]
+                if not numeric:
+                    continue
+
+                segment_starts.append(len(slots))
+                for entry in numeric:
+                    component = entry['COMPONENT']
+                    if component not in component_slots:
+                        component_slots[component] = len(self.components)
+                        self.components.append(component)
+                    slots.append(component_slots[component])
+                    operators.append(OPERATOR_CODES[entry['METHOD']])
+                    thresholds.append(float(entry['VALUE']))
+                    row_conditions.append(len(self.conditions))
+
+                scalar = [entry for entry in condition.checks if not _batchable(entry)]
+                condition.evaluate = compile_checks(scalar, batch=self, batch_index=len(self.conditions),
+                                                    sources=condition.sources)
+                self.conditions.append(condition)
+                self.results.append(True)
+
+        self.slots = numpy.array(slots, dtype=numpy.intp)
+        self.thresholds = numpy.array(thresholds, dtype=numpy.float64)
+        self.segment_starts = numpy.array(segment_starts, dtype=numpy.intp)
+        self.segment_ends = numpy.append(self.segment_starts[1:], len(slots)).astype(numpy.intp)
+        self.operators = numpy.array(operators, dtype=numpy.int8)
+        self.row_conditions = numpy.array(row_conditions, dtype=numpy.intp)
+
+        # rows for each operator, so each comparison is one vectorized operation over just its own rows
+        self.rows = [numpy.nonzero(self.operators == code)[0] for code in range(len(OPERATOR_CODES))]
+
+        # rows for each Component, by slot
+        self.component_rows = [numpy.nonzero(self.slots == slot)[0] for slot in range(len(self.components))]
+
+        self.values = numpy.zeros(len(self.components), dtype=numpy.float64)
+        self.check_results = numpy.zeros(len(slots), dtype=bool)
+
+        # everything starts off needing a look
+        self.evaluate()
+
+    @staticmethod
+    def available():
+        """
+        :return: whether NumPy is installed
+        :rtype: bool
+        """
+        return Libraries.available('numpy')
+
+    def evaluate(self, changed_components=None):
+        """
+        Evaluates the batched checks of Components which have changed, all at once
+        Call at the start of each scan, before the Events get evaluated
+        :param changed_components: Components whose value has changed since the last pass, None for all of them
+        :type changed_components: set[Component]
+        """
+        if not self.conditions:
+            return
+        if changed_components is None:
+            self._evaluate_all()
+            return
+
+        changed_slots = [self.component_slots[component] for component in changed_components
+                         if component in self.component_slots]
+        if not changed_slots:
+            return
+
+        values = self.values
+        for slot in changed_slots:
+            values[slot] = self.components[slot].get_value()
+        rows = numpy.concatenate([self.component_rows[slot] for slot in changed_slots])
+
+        row_values = values[self.slots[rows]]
+        thresholds = self.thresholds[rows]
+        operators = self.operators[rows]
+        self.check_results[rows] = numpy.where(
+            operators == OPERATOR_CODES['greater_than'], row_values > thresholds,
+            numpy.where(operators == OPERATOR_CODES['less_than'], row_values < thresholds, row_values == thresholds))
+
+        check_results = self.check_results
+        results = self.results
+        for condition_index in numpy.unique(self.row_conditions[rows]).tolist():
+            results[condition_index] = \
+                bool(check_results[self.segment_starts[condition_index]:self.segment_ends[condition_index]].all())
+
+    def _evaluate_all(self):
+        values = self.values
+        for slot, component in enumerate(self.components):
+            values[slot] = component.get_value()
+
+        row_values = values[self.slots]
+        thresholds = self.thresholds
+        check_results = self.check_results
+        greater, less, equal = self.rows
+        check_results[greater] = row_values[greater] > thresholds[greater]
+        check_results[less] = row_values[less] < thresholds[less]
+        check_results[equal] = row_values[equal] == thresholds[equal]
+
+        self.results = numpy.logical_and.reduceat(check_results, self.segment_starts).tolist()
+
+
+def create_batch_evaluator(events):
+    """
+    :type events: list[Event]
+    :return: a BatchEvaluator, or None if NumPy isn't available (or there's nothing to batch)
+             and the scalar path has to do
+    :rtype: BatchEvaluator
+    """
+    if not _has_batchable_checks(events) or not _load_numpy():
+        return None
+    return BatchEvaluator(events)
@@ -0,0 +1,338 @@
+"""
+Benchmarks for the rule engine and FileHandler, run on the simulated hardware backend
+    python Benchmark.py --components 20 --events 500 --output bench.json
+
+Synthetic definitions get generated with N Components of every type in COMPONENT_CLASSES and M Events
+whose Conditions and Effects are 1 to --max-width checks/actions wide. Measured:
+    BUILD         - create_components() and create_events(), in total and per item
+    MEMORY        - bytes allocated per Component and per Event (needs tracemalloc, so Python 3)
+    EVALUATE      - Event.evaluate() throughput, every Event every pass, and through an EventIndex
+    SERIALIZATION - save_definition() and save_live_feed(), and writing the results to disk
+    BOOT          - load_definition() from definitions.json, and again from the snapshot it leaves behind
+Results come out as JSON, so runs can be compared over time
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import Events
+import FileHandler
+import Hardware
+from Components import COMPONENT_CLASSES, create_components
+from Events import EventIndex, create_events
+from Scheduler import clock
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# (method, value) a synthetic Condition can check, per component type
+CONDITIONS = \
+    {
+        'TIMER': [('greater_than', 30.0), ('less_than', 10.0), ('equal_to', 5.0)],
+        'COUNTER': [('greater_than', 3), ('less_than', 100), ('equal_to', 0)],
+        'DIGITAL_INPUT': [('equal_to', 'PRESSED'), ('equal_to', 'HELD_UP')],
+        'DIGITAL_OUTPUT': [('equal_to', 'HIGH'), ('equal_to', 'LOW')],
+        'ANALOG_INPUT': [('greater_than', 512.0), ('less_than', 100.0)],
+        'FILE_QUEUE': [('key_in_value', 'go')],
+        'SIMPLE_AUDIO_PLAYER': [('equal_to', '')],
+        'SIMPLE_VIDEO_PLAYER': [('equal_to', '')]
+    }
+
+# (method, arg) a synthetic Effect can perform, per component type
+# media effects only queue a command, whatever they cost happens on other threads, so they're left out
+EFFECTS = \
+    {
+        'TIMER': [('set_state', 'RUNNING'), ('set_state', 'PAUSED')],
+        'COUNTER': [('increase_value', 1), ('decrease_value', 1)],
+        'DIGITAL_OUTPUT': [('set_value', 'HIGH'), ('toggle', None)]
+    }
+
+
+def _component_value(comp_type, index, workdir):
+    """
+    Private function
+    A valid configuration for the index-th Component of a type
+    """
+    if comp_type == 'DIGITAL_INPUT':
+        return index % len(COMPONENT_CLASSES[comp_type].GPIO_PINS) + 1
+    if comp_type == 'DIGITAL_OUTPUT':
+        return index % len(COMPONENT_CLASSES[comp_type].GPIO_PINS) + 1
+    if comp_type == 'ANALOG_INPUT':
+        return index % 4
+    if comp_type == 'FILE_QUEUE':
+        return os.path.join(workdir, 'queue_' + str(index) + '.txt')
+    if comp_type == 'SIMPLE_AUDIO_PLAYER':
+        return 'bench_' + str(index) + '.wav'
+    if comp_type == 'SIMPLE_VIDEO_PLAYER':
+        return 'bench_' + str(index) + '.mp4'
+    return 0
+
+
+def generate_definitions(component_count, event_count, max_width, workdir, seed=0):
+    """
+    Makes up definitions in the same shape as definitions.json
+    :param component_count: Components of each type
+    :type component_count: int
+    :param event_count: number of Events
+    :type event_count: int
+    :param max_width: widest Condition and Effect, widths cycle from 1 up to this
+    :type max_width: int
+    :param workdir: where FILE_QUEUEs keep their files
+    :type workdir: str
+    :param seed: for the random choices, the same seed gives the same definitions
+    :return: {'COMPONENTS': {...}, 'EVENTS': [...]}
+    :rtype: dict
+    """
+    rng = random.Random(seed)
+
+    components = {}
+    labels = {}
+    for comp_type in sorted(COMPONENT_CLASSES.keys()):
+        entries = []
+        for index in range(component_count):
+            label = comp_type.lower() + '_' + str(index)
+            entries.append({'LABEL': label, 'VALUE': _component_value(comp_type, index, workdir)})
+        components[comp_type] = entries
+        labels[comp_type] = [entry['LABEL'] for entry in entries]
+
+    condition_types = sorted(CONDITIONS.keys())
+    effect_types = sorted(EFFECTS.keys())
+    events = []
+    for index in range(event_count):
+        conditions = []
+        for _ in range(index % max_width + 1):
+            comp_type = rng.choice(condition_types)
+            method, value = rng.choice(CONDITIONS[comp_type])
+            conditions.append({'LABEL': rng.choice(labels[comp_type]), 'METHOD': method, 'VALUE': value})
+
+        effects = []
+        for _ in range((index // max_width) % max_width + 1):
+            comp_type = rng.choice(effect_types)
+            method, arg = rng.choice(EFFECTS[comp_type])
+            effects.append({'LABEL': rng.choice(labels[comp_type]), 'METHOD': method, 'ARG': arg})
+
+        events.append({'LABEL': 'event_' + str(index), 'CONDITIONS': conditions, 'EFFECTS': effects})
+
+    return {'COMPONENTS': components, 'EVENTS': events}
+
+
+def _teardown(components):
+    for component in components:
+        component.teardown()
+
+
+def _build(definitions):
+    components = create_components(components_dict=definitions['COMPONENTS'])
+    events = create_events(components, events_list=definitions['EVENTS'])
+    return components, events
+
+
+def measure_build(definitions):
+    """
+    :return: seconds taken by create_components() and create_events()
+    :rtype: dict
+    """
+    start = clock()
+    components = create_components(components_dict=definitions['COMPONENTS'])
+    components_time = clock() - start
+
+    start = clock()
+    events = create_events(components, events_list=definitions['EVENTS'])
+    events_time = clock() - start
+
+    _teardown(components)
+    return {'COMPONENTS': len(components), 'EVENTS': len(events),
+            'CREATE_COMPONENTS': components_time, 'CREATE_EVENTS': events_time,
+            'PER_COMPONENT': components_time / max(len(components), 1),
+            'PER_EVENT': events_time / max(len(events), 1)}
+
+
+def measure_memory(definitions):
+    """
+    :return: bytes allocated per Component and per Event, or None without tracemalloc
+    :rtype: dict
+    """
+    if tracemalloc is None:
+        return None
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    components = create_components(components_dict=definitions['COMPONENTS'])
+    after_components = tracemalloc.get_traced_memory()[0]
+    events = create_events(components, events_list=definitions['EVENTS'])
+    after_events = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    _teardown(components)
+    return {'COMPONENTS_BYTES': after_components - before, 'EVENTS_BYTES': after_events - after_components,
+            'PER_COMPONENT': (after_components - before) // max(len(components), 1),
+            'PER_EVENT': (after_events - after_components) // max(len(events), 1)}
+
+
+def measure_evaluate(components, events, rounds):
+    """
+    :param rounds: passes over the Events
+    :type rounds: int
+    :return: throughput of evaluating every Event, and of an EventIndex with and without changes
+    :rtype: dict
+    """
+    start = clock()
+    for _ in range(rounds):
+        for event in events:
+            event.evaluate()
+    full_time = clock() - start
+    evaluations = rounds * len(events)
+
+    index = EventIndex(events)
+    index.evaluate(set(components))
+    start = clock()
+    quiet_evaluations = 0
+    for _ in range(rounds):
+        quiet_evaluations += index.evaluate(set())
+    quiet_time = clock() - start
+
+    everything = set(components)
+    start = clock()
+    busy_evaluations = 0
+    for _ in range(rounds):
+        busy_evaluations += index.evaluate(everything)
+    busy_time = clock() - start
+
+    return {'ROUNDS': rounds,
+            'EVALUATIONS_PER_SECOND': evaluations / full_time if full_time else 0.0,
+            'PER_EVALUATION': full_time / max(evaluations, 1),
+            'PASS_TIME': full_time / rounds,
+            'INDEX_QUIET_PASS_TIME': quiet_time / rounds,
+            'INDEX_QUIET_EVALUATIONS': quiet_evaluations // rounds,
+            'INDEX_ALL_CHANGED_PASS_TIME': busy_time / rounds,
+            'INDEX_ALL_CHANGED_EVALUATIONS': busy_evaluations // rounds}
+
+
+def measure_serialization(components, events, rounds):
+    """
+    Saves go to the current directory
+    :param rounds: how many times to call each save
+    :type rounds: int
+    :return: seconds per save_definition() and save_live_feed(), and for the writes to disk
+    :rtype: dict
+    """
+    start = clock()
+    for _ in range(rounds):
+        FileHandler.save_definition(components, events)
+    definition_time = clock() - start
+
+    start = clock()
+    for _ in range(rounds):
+        FileHandler.save_live_feed(components)
+    live_feed_time = clock() - start
+
+    start = clock()
+    FileHandler.flush_writes(True)
+    flush_time = clock() - start
+
+    return {'ROUNDS': rounds,
+            'SAVE_DEFINITION': definition_time / rounds,
+            'SAVE_LIVE_FEED': live_feed_time / rounds,
+            'FLUSH': flush_time,
+            'DEFINITION_BYTES': os.path.getsize('definitions.json'),
+            'LIVE_FEED_BYTES': os.path.getsize('live_feed.json')}
+
+
+def measure_boot(definitions):
+    """
+    Saves go to the current directory
+    :return: seconds taken by load_definition() going by the JSON, and going by the snapshot
+    :rtype: dict
+    """
+    with open('definitions.json', 'w') as f:
+        json.dump(definitions, f, separators=(',', ':'))
+    if os.path.exists(FileHandler.SNAPSHOT_FILE):
+        os.remove(FileHandler.SNAPSHOT_FILE)
+
+    # nothing compiled so far gets to help out
+    Events.code_cache.clear()
+    start = clock()
+    components, _ = FileHandler.load_definition()
+    json_time = clock() - start
+    _teardown(components)
+    FileHandler.flush_writes(True)
+
+    Events.code_cache.clear()
+    start = clock()
+    components, _ = FileHandler.load_definition()
+    snapshot_time = clock() - start
+    _teardown(components)
+
+    return {'JSON': json_time, 'SNAPSHOT': snapshot_time,
+            'DEFINITION_BYTES': os.path.getsize('definitions.json'),
+            'SNAPSHOT_BYTES': os.path.getsize(FileHandler.SNAPSHOT_FILE)}
+
+
+def run_benchmark(component_count, event_count, max_width=4, rounds=100, seed=0):
+    """
+    Runs everything in a scratch directory on the simulated backend
+    :return: results, ready for json.dumps()
+    :rtype: dict
+    """
+    Hardware.set_backend(Hardware.SimulatedBackend())
+
+    workdir = tempfile.mkdtemp(prefix='pilc_bench_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        definitions = generate_definitions(component_count, event_count, max_width, workdir, seed)
+
+        results = {'PARAMETERS': {'COMPONENTS_PER_TYPE': component_count, 'EVENTS': event_count,
+                                  'MAX_WIDTH': max_width, 'ROUNDS': rounds, 'SEED': seed},
+                   'ENVIRONMENT': {'PYTHON': platform.python_version(),
+                                   'IMPLEMENTATION': platform.python_implementation(),
+                                   'MACHINE': platform.machine(), 'BACKEND': Hardware.get_backend().NAME,
+                                   'TIMESTAMP': time.time()}}
+
+        results['BUILD'] = measure_build(definitions)
+        results['MEMORY'] = measure_memory(definitions)
+
+        components, events = _build(definitions)
+        try:
+            results['EVALUATE'] = measure_evaluate(components, events, rounds)
+            results['SERIALIZATION'] = measure_serialization(components, events, rounds)
+        finally:
+            _teardown(components)
+
+        results['BOOT'] = measure_boot(definitions)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the rule engine and FileHandler')
+    parser.add_argument('--components', type=int, default=20, help='Components of each type')
+    parser.add_argument('--events', type=int, default=500, help='number of Events')
+    parser.add_argument('--max-width', type=int, default=4, help='widest Condition and Effect')
+    parser.add_argument('--rounds', type=int, default=100, help='repetitions of each timed operation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the JSON results to, rather than stdout')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.components, args.events, args.max_width, args.rounds, args.seed)
+    results_json = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(results_json + '\n')
+    else:
+        print(results_json)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,28 +1,74 @@
+import bisect
 import json
+import mmap
+import os
+import threading
 import time
-
-import requests
-
-# https://github.com/adafruit/Adafruit_Python_MCP3008
-# sudo pip install adafruit-mcp3008
-import Adafruit_MCP3008
-# http://python-omxplayer-wrapper.readthedocs.io/en/latest/
-# pip install omxplayer-wrapper
-import omxplayer
-# should come pre-installed on RPi
-import pygame
-from omxplayer.player import OMXPlayer as OMX
-
-# https://sourceforge.net/p/raspberry-gpio-python/wiki/Home/
-# pip install RPi.GPIO
-# I think only one instance of RPi.GPIO can be instantiated per machine
-# so make sure you don't have another script running this if you get errors
+from collections import deque
+
+import Hardware
+import HttpClient
+from MediaCommandQueue import MediaCommandQueue
+from Persistence import FileWriter, write_atomic
+from Sampler import ADCSampler
+from Scheduler import clock
+from SoundBank import get_sound_bank
+from VideoPlayerManager import VideoPlayerManager
+
+# file locks keep FileQueue producers and compaction out of each other's way, where the platform has them
 try:
-    import RPi.GPIO as GPIO
-except RuntimeError:
-    print('Error importing RPi.GPIO!  ' +
-          'This is probably because you need superuser privileges.' +
-          'You can achieve this by using \'sudo\' to run your script')
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Components whose value or state has changed since the last call to pop_dirty_components()
+# GPIO callbacks mark Components dirty from their own thread while the scan thread takes the set, hence the lock
+_dirty_components = set()
+_dirty_lock = threading.Lock()
+
+# saves FileQueue cursors when nobody has set FileQueue.cursor_writer
+_direct_writer = FileWriter()
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _same_file(f, file_name):
+    """
+    Whether the open file f is still the one at file_name, rather than one that's since been replaced
+    """
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(file_name))
+    except OSError:
+        return False
+
+
+def pop_dirty_components():
+    """
+    Hands over every Component that has changed since the last call, and starts a fresh tally
+    :rtype: set[Component]
+    """
+    global _dirty_components
+    with _dirty_lock:
+        dirty = _dirty_components
+        _dirty_components = set()
+    return dirty
+
+
+def peek_dirty_components():
+    """
+    Components that have changed since the last pop_dirty_components(), without taking them
+    :rtype: set[Component]
+    """
+    with _dirty_lock:
+        return set(_dirty_components)
 
 
 class Component(object):
@@ -32,6 +78,13 @@ class Component(object):
 
     COMPONENT_TYPE = 'COMPONENT'
 
+    # effect methods which can take a while (network, files)
+    # media players have a MediaCommandQueue of their own instead
+    # when an EffectPool is running these get handed to it, rather than holding up the scan loop
+    # they may run off the scan thread, so they leave the Component alone and return its new value instead
+    # (None to leave it as it is), which the scan thread hands to set_value()
+    SLOW_EFFECTS = ()
+
     def __init__(self, label, initial_value):
         """
         :param label: User-defined identifier, basically the Component's name
@@ -44,6 +97,17 @@ class Component(object):
         self.INITIAL_VALUE = initial_value
         self.value = initial_value
 
+        # position in the ComponentRegistry
+        self.slot = None
+
+        # (what it was made from, encoded JSON) for get_definition_json() and get_display_json()
+        self._definition_json = None
+        self._display_json = None
+
+        # set when this Component takes part in a ProcessImage scan cycle
+        self.process_image = None
+        self.image_slot = None
+
         # Methods which can be called when an Event is evaluated
         # the keys are used to map web-app created Events to Component methods
         self.effect_methods = \
@@ -87,9 +151,77 @@ class Component(object):
         value = self.get_value()
         return self.COMPONENT_TYPE, {label: value}
 
+    def get_definition_json(self):
+        """
+        get_definition()'s dict, already encoded. Only re-encoded when the configuration changes
+        :rtype: str
+        """
+        if self._definition_json is None or self._definition_json[0] != self.INITIAL_VALUE:
+            self._definition_json = (self.INITIAL_VALUE, json.dumps(self.get_definition()[1], separators=(',', ':')))
+        return self._definition_json[1]
+
+    def get_display_json(self):
+        """
+        get_display()'s dict, already encoded. Only re-encoded when the value changes
+        :rtype: str
+        """
+        value = self.get_value()
+        if self._display_json is None or self._display_json[0] != value:
+            self._display_json = (value, json.dumps({self.get_label(): value}, separators=(',', ':')))
+        return self._display_json[1]
+
     def set_value(self, value):
+        if value != self.value:
+            self.mark_dirty()
         self.value = value
 
+    def mark_dirty(self):
+        """
+        Flags this Component as changed, so Events that depend on it get re-evaluated
+        """
+        with _dirty_lock:
+            _dirty_components.add(self)
+
+    def can_reconfigure(self, initial_value):
+        """
+        Whether reconfigure() would take initial_value, worked out without changing anything
+        Does whatever slow preparation reconfigure() needs, so it's safe to call from off the control loop
+        :param initial_value: the new configuration data
+        :return: False if the Component needs to be torn down and made again instead
+        :rtype: bool
+        :raises ValueError: if initial_value is no good for this kind of Component
+        """
+        return False
+
+    def reconfigure(self, initial_value):
+        """
+        Takes on a new configuration without being rebuilt, if this kind of Component can
+        :param initial_value: the new configuration data
+        :return: False if the Component needs to be torn down and made again instead
+        :rtype: bool
+        """
+        return False
+
+    def attach(self):
+        """
+        Takes hold of hardware only one Component can have at a time, like a GPIO pin. Kept out of __init__
+        so a replacement can be made (and checked) while the Component it replaces still has the pin
+        create_components() attaches everything it makes
+        """
+        pass
+
+    def detach(self):
+        """
+        Lets go of whatever attach() took, attach() can take it back again
+        """
+        pass
+
+    def teardown(self):
+        """
+        Releases whatever hardware the Component holds on to, called when it's removed or replaced
+        """
+        self.detach()
+
     def update(self):
         """
         many components need to be kept up-to-date in real time,
@@ -125,8 +257,9 @@ class URIComponent(Component):
     COMPONENT_TYPE = 'URI_COMPONENT'
 
     def __init__(self, label, uri):
-        super(URIComponent, self).__init__(label, '')
+        super(URIComponent, self).__init__(label, uri)
         self.uri = uri
+        self.value = ''
         self.condition_methods['key_in_value'] = self.key_in_value
 
     def key_in_value(self, keyword):
@@ -143,12 +276,27 @@ class WebGet(URIComponent):
     Class that reads data from a URL
     Think of it like curl or wget
     """
+
+    SLOW_EFFECTS = ('web_get',)
+
+    # don't ask the same URL more than once per this many seconds, however often the Event fires
+    MIN_POLL_INTERVAL = 1.0
+
     def __init__(self, label, url):
         super(WebGet, self).__init__(label, url)
         self.effect_methods['web_get'] = self.web_get
+        self.last_poll = 0.0
 
     def web_get(self):
-        self.set_value(requests.get(self.uri))
+        """
+        Fetches the URL, the value becomes the body of the response
+        :return: the body, or None if the URL was asked too recently
+        """
+        now = time.time()
+        if now - self.last_poll < self.MIN_POLL_INTERVAL:
+            return None
+        self.last_poll = now
+        return HttpClient.get_client().get(self.uri)
 
 
 class WebPost(URIComponent):
@@ -156,11 +304,19 @@ class WebPost(URIComponent):
     Class that posts data to a URL
     Think of it like curl or wget
     """
+
+    SLOW_EFFECTS = ('web_post',)
+
     def __init__(self, label, url):
         super(WebPost, self).__init__(label, url)
+        self.effect_methods['web_post'] = self.web_post
 
     def web_post(self, data):
-        requests.post(self.uri, data)
+        """
+        Posts data to the URL, the value becomes the body of the response
+        :return: the body
+        """
+        return HttpClient.get_client().post(self.uri, data)
 
 
 class FileQueue(URIComponent):
@@ -169,26 +325,157 @@ class FileQueue(URIComponent):
     Especially useful for receiving communications through the web
 
     Messages are separated by newlines
-    First-in-first-out queue
-    Oldest messages at top of file
+    First-in-first-out queue, the file is an append-only log:
+        - producers only ever append, see append_message()
+        - the read cursor (a byte offset) is kept in <file>.offset, so nothing has to be rewritten to pop a message
+        - each update() maps the file and pops the next complete line after the cursor, so a message costs the
+          same however much is queued behind it. A line still being written (no newline yet) waits for the next update
+        - once COMPACT_THRESHOLD bytes have been consumed the file is compacted on a background thread: the unread
+          messages go to a temp file which is renamed over the queue, all under the same lock producers take,
+          so nothing appended in the meantime gets lost. Messages don't get popped until it's done
+
+    The cursor goes to disk through cursor_writer (coalesced, like every other save) when one is set,
+    so after a crash the last few messages may be read again, but none are skipped
     """
 
     COMPONENT_TYPE = 'FILE_QUEUE'
 
+    # bytes of consumed messages the file may hold before it gets compacted
+    COMPACT_THRESHOLD = 64 * 1024
+
+    # seconds a cursor change may wait before it goes to disk
+    CURSOR_WRITE_WINDOW = 1.0
+
+    # a Persistence.FileWriter the cursors get saved through, set by the engine
+    # without one every pop writes the cursor straight away
+    cursor_writer = None
+
     def __init__(self, label, file_name):
         super(FileQueue, self).__init__(label, file_name)
+        self.cursor_file = file_name + '.offset'
+        self.offset = self._load_offset()
+
+        # held while compacting, update() leaves the queue alone rather than wait for it
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+
+    def _load_offset(self):
+        try:
+            with open(self.cursor_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def _save_offset(self, now=False):
+        writer = FileQueue.cursor_writer
+        if writer is None:
+            writer = _direct_writer
+            now = True
+        if now:
+            writer.write_now(self.cursor_file, str(self.offset))
+        else:
+            writer.write(self.cursor_file, str(self.offset), self.CURSOR_WRITE_WINDOW)
+
+    @staticmethod
+    def append_message(file_name, message):
+        """
+        Adds a message to the end of a queue file, safe alongside other producers and a consuming FileQueue
+        :param file_name: path to the queue file
+        :type file_name: str
+        :param message: one message, without newlines
+        :type message: str
+        """
+        data = (message + '\n').encode('utf-8')
+        while True:
+            with open(file_name, 'ab') as f:
+                _lock_file(f)
+                try:
+                    # compact() may have swapped in a new file while we were waiting for the lock
+                    if fcntl is not None and not _same_file(f, file_name):
+                        continue
+                    f.write(data)
+                    f.flush()
+                    return
+                finally:
+                    _unlock_file(f)
 
     def update(self):
         """
-        Reads the top line from the file.
-        If the file is empty (or basically empty), hold on to the previous command
+        Pops the next message off the queue
+        If there's nothing new (or only half a line), hold on to the previous command
         """
-        with open(self.uri, 'rw') as f:
-            all_commands = f.read()
-            if all_commands != '' or all_commands != '\n':
-                command_list = all_commands.split('\n')
-                self.set_value(command_list[0])
-                f.write('\n'.join(command_list[1:]))
+        if not self._compact_lock.acquire(False):
+            return
+        try:
+            self._pop()
+        finally:
+            self._compact_lock.release()
+
+        if self.offset >= self.COMPACT_THRESHOLD and self._compact_thread is None:
+            self._compact_thread = threading.Thread(target=self._compact_in_background,
+                                                    name='FileQueueCompact-' + str(self.LABEL))
+            self._compact_thread.daemon = True
+            self._compact_thread.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except (IOError, OSError) as e:
+            print('Could not compact ' + self.uri + ': ' + str(e))
+        finally:
+            self._compact_thread = None
+
+    def _pop(self):
+        try:
+            size = os.path.getsize(self.uri)
+        except OSError:
+            return
+        if size < self.offset:
+            # somebody else truncated or replaced the file, start over from the top
+            self.offset = 0
+        if size == self.offset:
+            return
+
+        with open(self.uri, 'rb') as f:
+            queue = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                start = self.offset
+                end = queue.find(b'\n', start)
+                # blank lines aren't messages
+                while end == start:
+                    start += 1
+                    end = queue.find(b'\n', start)
+                if end == -1:
+                    self.offset = start
+                    return
+                line = queue[start:end]
+            finally:
+                queue.close()
+
+        self.offset = end + 1
+        self.set_value(line.rstrip(b'\r').decode('utf-8'))
+        # the same command twice in a row is still two commands
+        self.mark_dirty()
+        self._save_offset()
+
+    def compact(self):
+        """
+        Drops the messages which have already been read from the front of the file
+        The unread ones are written to a temp file which then replaces the queue, like Persistence.FileWriter does,
+        holding the producers' lock the whole time so nothing can be appended halfway through
+        """
+        with self._compact_lock:
+            with open(self.uri, 'rb') as f:
+                _lock_file(f)
+                try:
+                    f.seek(self.offset)
+                    remaining = f.read()
+                    # cursor first: a crash before the rename means reading some messages again, not losing them
+                    self.offset = 0
+                    self._save_offset(now=True)
+                    write_atomic(self.uri, remaining)
+                finally:
+                    _unlock_file(f)
 
 
 class NumericalComponent(Component):
@@ -235,6 +522,17 @@ class Counter(NumericalComponent):
         self.effect_methods['decrease_value'] = self.decrease_value
         self.effect_methods['increase_value'] = self.increase_value
 
+    def can_reconfigure(self, initial_value):
+        int(initial_value)
+        return True
+
+    def reconfigure(self, initial_value):
+        """
+        Only the starting count changes, the current count carries on
+        """
+        self.INITIAL_VALUE = int(initial_value)
+        return True
+
     def decrease_value(self, amount):
         """
         Decreases this Counter's count by amount
@@ -259,10 +557,20 @@ class Timer(NumericalComponent):
     Component to keep track of times. State determines if the timer increases its value
     Stopping the timer sets its time to 0
     Pausing holds current time
+
+    When the engine gives Timers a Scheduler, a running Timer doesn't count as changed every scan.
+    Instead it puts the next of its thresholds (times its Events compare against) in the Scheduler's heap,
+    and gets woken up right when the clock gets there. That marks it changed, so the Events that depend on it
+    get evaluated, exactly once per crossing, and equal_to() is true for that one scan
     """
 
     COMPONENT_TYPE = 'TIMER'
 
+    # Scheduler whose heap running Timers keep their next threshold in, and what to call when one is crossed
+    # both set by the engine, without a Scheduler Timers get polled every scan
+    scheduler = None
+    on_threshold = None
+
     def __init__(self, label, initial_value):
         super(Timer, self).__init__(label, initial_value)
         self.state = 'PAUSED'
@@ -270,20 +578,98 @@ class Timer(NumericalComponent):
         self.effect_methods['set_state'] = self.set_state
         self.condition_methods['get_state'] = self.get_state
 
+        # sorted times the Events care about, see set_thresholds()
+        self.thresholds = []
+
+        # thresholds passed at the latest wake-up, equal_to() is true for them until the next scan
+        self.crossed = ()
+        self._crossing_fresh = False
+        self._armed_from = 0.0
+        self._threshold_task = None
+
+    def can_reconfigure(self, initial_value):
+        return True
+
+    def reconfigure(self, initial_value):
+        """
+        Only the starting time changes, a running clock keeps running
+        """
+        self.INITIAL_VALUE = initial_value
+        return True
+
+    def teardown(self):
+        self._disarm()
+        super(Timer, self).teardown()
+
+    def set_thresholds(self, thresholds):
+        """
+        The times this Timer's Events compare against
+        :type thresholds: list[float]
+        """
+        self.thresholds = sorted(set(thresholds))
+        self._rearm()
+
+    def _disarm(self):
+        if self._threshold_task is not None:
+            self._threshold_task.cancel()
+            self._threshold_task = None
+
+    def _rearm(self):
+        """
+        Puts the next threshold ahead of the clock in the Scheduler's heap, replacing whatever was there
+        """
+        self._disarm()
+        if Timer.scheduler is None or self.state != 'RUNNING':
+            return
+        elapsed = clock() - self.start_time
+        self._armed_from = elapsed
+        upcoming = bisect.bisect_right(self.thresholds, elapsed)
+        if upcoming < len(self.thresholds):
+            self._threshold_task = Timer.scheduler.call_at(self.start_time + self.thresholds[upcoming],
+                                                           self._on_threshold, label='TIMER_THRESHOLD')
+
+    def _on_threshold(self):
+        self._threshold_task = None
+        if self.state != 'RUNNING':
+            return
+        elapsed = clock() - self.start_time
+
+        # a late wake-up may have gone past several at once
+        self.crossed = tuple([t for t in self.thresholds if self._armed_from < t <= elapsed])
+        self._crossing_fresh = True
+        self.value = elapsed
+        self.mark_dirty()
+        self._rearm()
+
+        if Timer.on_threshold is not None:
+            Timer.on_threshold()
+
     def update(self):
         """
         Updates the value with the current relative time (relative to self.start_time)
         """
         if self.state == 'RUNNING':
-            elapsed_time = time.time() - self.start_time
-            super(Timer, self).set_value(elapsed_time)
+            elapsed_time = clock() - self.start_time
+            if Timer.scheduler is None:
+                super(Timer, self).set_value(elapsed_time)
+            else:
+                # nobody needs to hear about the clock ticking, crossing a threshold wakes whoever's interested
+                self.value = elapsed_time
+
+        # a crossing is only news for the scan straight after it
+        if self._crossing_fresh:
+            self._crossing_fresh = False
+        else:
+            self.crossed = ()
 
     def get_value(self):
         """
         :rtype: float
         """
         # call update() first in order to report on the most accurate time
-        self.update()
+        # unless a ProcessImage is in charge, then every check within a scan sees the same time
+        if self.process_image is None:
+            self.update()
         return super(Timer, self).get_value()
 
     def set_state(self, state):
@@ -292,16 +678,22 @@ class Timer(NumericalComponent):
         :param state: "STOPPED", "RUNNING", or "PAUSED"
         """
         old_state = self.state
+        if old_state == 'RUNNING':
+            # hold on to the time it got to
+            self.value = clock() - self.start_time
         self.state = state
-        if old_state != 'STOPPED' and state == 'RUNNING':
+        if old_state != state:
+            self.mark_dirty()
+        if old_state != 'RUNNING' and state == 'RUNNING':
 
-            # clock just started, take time measurements relative to right now
-            self.start_time = time.time()
+            # clock just started, carry on from the time it was holding
+            self.start_time = clock() - float(self.value)
         elif self.state == 'STOPPED':
             self.set_value(0)
         else:
             # self.state == paused, do nothing
             pass
+        self._rearm()
 
     def set_value(self, value):
         """
@@ -311,13 +703,14 @@ class Timer(NumericalComponent):
         """
 
         # cast to float so we don't end up with an int. This ain't no counter
-        float(value)
+        value = float(value)
 
         # adjust the starting time so subsequent times will be relative,
         # we don't want to set the value and have it go back to the way things were
-        new_start_time = time.time() - value
+        new_start_time = clock() - value
         self.start_time = new_start_time
         super(Timer, self).set_value(value)
+        self._rearm()
 
     def get_state(self):
         """
@@ -330,10 +723,13 @@ class Timer(NumericalComponent):
     def equal_to(self, compare_time):
         """
         Returns whether the time on the clock is equal to compare_time.
-        Rounded to nearest tenth of a second
+        For thresholds in the Scheduler's heap that's exactly once, the scan after the clock gets there
+        Otherwise rounded to nearest tenth of a second
         :param compare_time: Time you want to compare to
         :rtype: float
         """
+        if Timer.scheduler is not None and compare_time in self.thresholds:
+            return compare_time in self.crossed
         return round(self.value, 1) == round(compare_time, 1)
 
 
@@ -345,7 +741,18 @@ class AnalogInput(NumericalComponent):
     COMPONENT_TYPE = 'ANALOG_INPUT'
 
     # the Adafruit_MCP3008 instance needs to be shared among all AnalogInput components, hence class level
-    mcp = Adafruit_MCP3008.MCP3008(clk=2, cs=3, miso=17, mosi=4)
+    # made by get_adc() the first time it's needed
+    mcp = None
+
+    # when an ADCSampler is running, it owns the MCP3008 and AnalogInputs read from its buffers instead
+    sampler = None
+
+    # start_sampler() arguments for when the first AnalogInput comes along, see use_sampler()
+    sampler_settings = None
+
+    # conditions which look at the sampler's window rather than the latest reading
+    WINDOWED_CONDITIONS = ('mean_greater_than', 'mean_less_than', 'ema_greater_than', 'ema_less_than',
+                           'max_greater_than', 'min_less_than')
 
     def __init__(self, label, channel):
         """
@@ -357,12 +764,133 @@ class AnalogInput(NumericalComponent):
             raise ValueError('Channel must be between 0 and 3')
         self.channel = channel
 
+        # the reading starts at 0, but the definition (and the snapshot) has to hold the channel
+        self.INITIAL_VALUE = channel
+
+        # set by register_windowed_inputs() when an Event uses one of the WINDOWED_CONDITIONS
+        self.windowed = False
+        self._sample_count = 0
+
+        self.condition_methods['mean_greater_than'] = self.mean_greater_than
+        self.condition_methods['mean_less_than'] = self.mean_less_than
+        self.condition_methods['ema_greater_than'] = self.ema_greater_than
+        self.condition_methods['ema_less_than'] = self.ema_less_than
+        self.condition_methods['max_greater_than'] = self.max_greater_than
+        self.condition_methods['min_less_than'] = self.min_less_than
+        if AnalogInput.sampler is None and AnalogInput.sampler_settings is not None:
+            AnalogInput.start_sampler(**AnalogInput.sampler_settings)
+        if AnalogInput.sampler is not None:
+            AnalogInput.sampler.add_channel(channel)
+        else:
+            AnalogInput.get_adc()
+
+    def teardown(self):
+        """
+        Stops the sampler scanning this channel, unless another AnalogInput still reads it
+        """
+        if AnalogInput.sampler is not None:
+            AnalogInput.sampler.remove_channel(self.channel)
+        super(AnalogInput, self).teardown()
+
+    @staticmethod
+    def get_adc():
+        """
+        The shared MCP3008, from the current hardware backend
+        """
+        if AnalogInput.mcp is None:
+            AnalogInput.mcp = Hardware.get_backend().create_adc()
+        return AnalogInput.mcp
+
+    @staticmethod
+    def use_sampler(rate=1000.0, window=256, ema_alpha=0.1):
+        """
+        Has the first AnalogInput to be created start an ADCSampler, see start_sampler()
+        Until then neither the ADC nor its library get touched
+        """
+        AnalogInput.sampler_settings = {'rate': rate, 'window': window, 'ema_alpha': ema_alpha}
+
+    @staticmethod
+    def start_sampler(rate=1000.0, window=256, ema_alpha=0.1, source=None, channels=()):
+        """
+        Hands the ADC over to a background ADCSampler
+        :param rate: scans per second
+        :param window: samples per channel used for min/max/mean
+        :param ema_alpha: weight of each new sample in the moving average
+        :param source: defaults to the shared MCP3008, give a FakeADC to run without the chip
+        :param channels: channels to scan, AnalogInputs add their own channel as they get created
+        :rtype: ADCSampler
+        """
+        if source is None:
+            source = AnalogInput.get_adc()
+        AnalogInput.stop_sampler()
+        AnalogInput.sampler = ADCSampler(source, channels, rate=rate, window=window, ema_alpha=ema_alpha)
+        AnalogInput.sampler.start()
+        return AnalogInput.sampler
+
+    @staticmethod
+    def stop_sampler():
+        if AnalogInput.sampler is not None:
+            AnalogInput.sampler.stop()
+            AnalogInput.sampler = None
+
     def update(self):
         """
         10-bit precision value reported by the MCP3008
         """
-        analog_value = AnalogInput.mcp.read_adc(self.channel)  # type: int
-        self.set_value(analog_value)
+        if AnalogInput.sampler is not None:
+            sample_count = AnalogInput.sampler.sample_count(self.channel)
+            analog_value = AnalogInput.sampler.latest(self.channel)
+            if analog_value is None:
+                # the sampler owns the chip, so until it has a reading for this channel the last value stands
+                return
+            if self.windowed and sample_count != self._sample_count:
+                # a spike can come and go between scans, leaving the latest reading where it was
+                # but the window has moved, so the windowed conditions need another look
+                self.mark_dirty()
+            self._sample_count = sample_count
+        else:
+            analog_value = AnalogInput.get_adc().read_adc(self.channel)  # type: int
+
+        # skip our own set_value(), that one's for keeping everybody else out
+        super(AnalogInput, self).set_value(analog_value)
+
+    def _sampled(self, statistic):
+        """
+        Grabs a statistic for this channel from the sampler,
+        falls back on the current value if there is no sampler, or it hasn't got anything yet
+        :param statistic: name of an ADCSampler method, such as 'mean'
+        :type statistic: str
+        """
+        result = None
+        if AnalogInput.sampler is not None:
+            result = getattr(AnalogInput.sampler, statistic)(self.channel)
+        if result is None:
+            result = self.get_value()
+        return result
+
+    def mean_greater_than(self, amount):
+        return self._sampled('mean') > amount
+
+    def mean_less_than(self, amount):
+        return self._sampled('mean') < amount
+
+    def ema_greater_than(self, amount):
+        return self._sampled('ema') > amount
+
+    def ema_less_than(self, amount):
+        return self._sampled('ema') < amount
+
+    def max_greater_than(self, amount):
+        """
+        Catches spikes that came and went between scans
+        """
+        return self._sampled('maximum') > amount
+
+    def min_less_than(self, amount):
+        """
+        Catches dips that came and went between scans
+        """
+        return self._sampled('minimum') < amount
 
     def set_value(self, value):
         # You can't dictate the value, the chip does
@@ -374,26 +902,49 @@ class AnalogInput(NumericalComponent):
         :return: 0 - 1023
         :rtype: int
         """
-        self.update()
+        if self.process_image is None:
+            self.update()
         return super(AnalogInput, self).get_value()
 
 
 class GPIOBase(Component):
     """
-    Base for GPIO classes, utilizes RPi.GPIO package
+    Base for GPIO classes, utilizes the backend's GPIO (RPi.GPIO on a Pi)
     """
 
     COMPONENT_TYPE = 'GPIO_BASE'
 
+    # BCM pins, in the order they're numbered on the PCB
+    GPIO_PINS = []
+
     def __init__(self, label, gpio_pin):
         """
+        The pin doesn't get set up until attach()
         :param gpio_pin: Give a number, not the actual BCM value
         :type gpio_pin: int
         """
         gpio_pin = int(gpio_pin)
+        if not 0 <= gpio_pin < len(self.GPIO_PINS):
+            raise ValueError('Pin must be between 1 and ' + str(len(self.GPIO_PINS)))
         super(GPIOBase, self).__init__(label, 'LOW')
+        self.gpio = Hardware.get_backend().gpio
         self.gpio_pin = gpio_pin
-        self.INITIAL_VALUE = gpio_pin
+        self.channel = self.GPIO_PINS[gpio_pin]
+        self.attached = False
+
+        # subclasses hand over an index, but the definition has to hold the counting number it came in as
+        self.INITIAL_VALUE = gpio_pin + 1
+
+    def attach(self):
+        self.attached = True
+
+    def detach(self):
+        """
+        Lets go of the pin
+        """
+        if self.attached:
+            self.gpio.cleanup(self.channel)
+            self.attached = False
 
 
 class DigitalInput(GPIOBase):
@@ -406,35 +957,160 @@ class DigitalInput(GPIOBase):
     # BCM numbering
     GPIO_PINS = [7, 8, 25, 24, 16, 18]
 
+    # In edge detection mode, GPIO interrupts queue up each edge as it happens,
+    # instead of comparing levels whenever the input gets read. That way even a press shorter than a scan is seen
+    # Use use_edge_detection() to switch it on, it applies to DigitalInputs created afterwards
+    edge_detection = False
+
+    # edges closer together than this (in seconds) are contact bounce
+    DEBOUNCE_TIME = 0.02
+
+    # called from the GPIO callback thread whenever an edge gets queued, so the event loop can wake up for it
+    on_edge = None
+
     def __init__(self, label, gpio_pin):
-        gpio_pin -= 1  # counting numbers to index
+        gpio_pin = int(gpio_pin) - 1  # counting numbers to index
         super(DigitalInput, self).__init__(label, gpio_pin)
-        self.channel = self.GPIO_PINS[gpio_pin]
 
+        # (time.time(), GPIO level) for every debounced edge which hasn't been handed to the event engine yet
+        self.edges = None
+        self.last_level = None
+        self.last_edge_time = 0.0
+
+        # _on_edge() runs on the GPIO callback thread, so the edge state above is only touched while holding this
+        self._edge_lock = threading.Lock()
+
+        # when the edge behind the current PRESSED or RELEASED value happened
+        self.edge_time = None
+
+    def attach(self):
         # pull_up_down=gpio.PUD_UP specifies to use the built-in pull up resistor
         # this means that a value of gpio.LOW corresponds with +12v across the input
-        GPIO.setup(self.channel, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        self.gpio.setup(self.channel, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+
+        if DigitalInput.edge_detection:
+            with self._edge_lock:
+                self.edges = deque()
+                self.last_level = self.gpio.input(self.channel)
+                self.last_edge_time = 0.0
+            self.gpio.add_event_detect(self.channel, self.gpio.BOTH, callback=self._on_edge)
+        super(DigitalInput, self).attach()
+
+    @staticmethod
+    def use_edge_detection(enabled=True, debounce_time=None, on_edge=None):
+        """
+        Switches edge detection mode on or off for DigitalInputs created from now on
+        :type enabled: bool
+        :param debounce_time: edges closer together than this (in seconds) are ignored
+        :type debounce_time: float
+        :param on_edge: called with no arguments, from the GPIO callback thread, whenever an edge comes in
+        """
+        DigitalInput.edge_detection = enabled
+        if debounce_time is not None:
+            DigitalInput.DEBOUNCE_TIME = debounce_time
+        DigitalInput.on_edge = on_edge
+
+    def detach(self):
+        if self.attached and self.edges is not None:
+            self.gpio.remove_event_detect(self.channel)
+            with self._edge_lock:
+                self.edges = None
+        super(DigitalInput, self).detach()
+
+    def _on_edge(self, channel):
+        """
+        GPIO callback, runs on RPi.GPIO's own thread
+        """
+        now = time.time()
+        level = self.gpio.input(channel)
+
+        with self._edge_lock:
+            # detach() may have got in first, while this callback was already on its way
+            if self.edges is None:
+                return
+
+            # ignore bounces, and edges which didn't actually change anything
+            if now - self.last_edge_time < DigitalInput.DEBOUNCE_TIME or level == self.last_level:
+                return
+
+            self.last_level = level
+            self.last_edge_time = now
+            self.edges.append((now, level))
+        self.mark_dirty()
+
+        if DigitalInput.on_edge is not None:
+            DigitalInput.on_edge()
+
+    def _next_edge(self):
+        """
+        Takes the oldest queued edge
+        :return: (time.time(), GPIO level) or None if nothing is queued
+        """
+        with self._edge_lock:
+            if self.edges:
+                return self.edges.popleft()
+
+            # a bounce might have hidden the edge that settled the input, so check up on it once things are quiet
+            if time.time() - self.last_edge_time >= DigitalInput.DEBOUNCE_TIME:
+                level = self.gpio.input(self.channel)
+                if level != self.last_level:
+                    self.last_level = level
+                    self.last_edge_time = time.time()
+                    return self.last_edge_time, level
+
+        return None
 
     def update(self):
+        if self.edges is not None:
+            self._update_from_edges()
+        else:
+            self._update_from_level()
+
+    def _update_from_edges(self):
+        """
+        Hands over one queued edge per update, so a press and release within the same scan show up as
+        PRESSED then RELEASED on consecutive scans, rather than not at all
+        """
+        edge = self._next_edge()
+        new_val = self.value
+
+        if edge is not None:
+            self.edge_time, level = edge
+            new_val = 'PRESSED' if level == self.gpio.LOW else 'RELEASED'
+        elif self.value == 'PRESSED':
+            new_val = 'HELD_DOWN'
+        elif self.value == 'RELEASED':
+            new_val = 'HELD_UP'
+        elif self.value != 'HELD_DOWN' and self.value != 'HELD_UP':
+            # first update, nothing has happened yet
+            new_val = 'HELD_DOWN' if self.last_level == self.gpio.LOW else 'HELD_UP'
+
+        super(DigitalInput, self).set_value(new_val)
+
+        # more edges waiting, make sure the engine comes back for them
+        if self.edges:
+            self.mark_dirty()
+
+    def _update_from_level(self):
         # gpio.LOW means +12v is applied across input
 
-        pin_state = GPIO.input(self.channel)
+        pin_state = self.gpio.input(self.channel)
         new_val = self.value
 
         # steady on
-        if pin_state == GPIO.LOW and (self.value == 'PRESSED' or self.value == 'HELD_DOWN'):
+        if pin_state == self.gpio.LOW and (self.value == 'PRESSED' or self.value == 'HELD_DOWN'):
             new_val = 'HELD_DOWN'
 
         # analogous to rising edge
-        elif pin_state == GPIO.LOW and (self.value == 'RELEASED' or self.value == 'HELD_UP'):
+        elif pin_state == self.gpio.LOW and (self.value == 'RELEASED' or self.value == 'HELD_UP'):
             new_val = 'PRESSED'
 
         # analogous to falling edge
-        elif pin_state == GPIO.HIGH and (self.value == 'PRESSED' or self.value == 'HELD_DOWN'):
+        elif pin_state == self.gpio.HIGH and (self.value == 'PRESSED' or self.value == 'HELD_DOWN'):
             new_val = 'RELEASED'
 
         # steady off
-        elif pin_state == GPIO.HIGH:
+        elif pin_state == self.gpio.HIGH:
             new_val = 'HELD_UP'
 
         super(DigitalInput, self).set_value(new_val)
@@ -447,7 +1123,8 @@ class DigitalInput(GPIOBase):
         """
         :rtype: str
         """
-        self.update()
+        if self.process_image is None:
+            self.update()
         return super(DigitalInput, self).get_value()
 
 
@@ -467,12 +1144,16 @@ class DigitalOutput(GPIOBase):
         :type gpio_pin: int
         """
         # take one off to convert from counting numbers to index
-        gpio_pin -= 1
+        gpio_pin = int(gpio_pin) - 1
         super(DigitalOutput, self).__init__(label, gpio_pin)
 
         self.effect_methods['toggle'] = self.toggle_value
-        self.channel = self.GPIO_PINS[gpio_pin]
-        GPIO.setup(self.channel, GPIO.OUT, initial=GPIO.LOW)
+
+    def attach(self):
+        self.gpio.setup(self.channel, self.gpio.OUT, initial=self.gpio.LOW)
+        super(DigitalOutput, self).attach()
+        # if this output had the pin before, and is taking it back, it carries on where it left off
+        self.write_output()
 
     def set_value(self, new_state):
         """
@@ -481,10 +1162,29 @@ class DigitalOutput(GPIOBase):
         :type new_state: str
         """
         super(DigitalOutput, self).set_value(new_state)
+        if self.process_image is None:
+            self.write_output()
+        else:
+            self.process_image.stage_output(self)
+
+    def write_output(self):
+        """
+        Pushes the current value out to the pin, if it has one
+        """
+        if not self.attached:
+            return
         if self.value == 'HIGH':
-            GPIO.output(self.channel, GPIO.HIGH)
+            self.gpio.output(self.channel, self.gpio.HIGH)
         elif self.value == 'LOW':
-            GPIO.output(self.channel, GPIO.LOW)
+            self.gpio.output(self.channel, self.gpio.LOW)
+
+    def detach(self):
+        """
+        Switches the relay off before letting go of the pin
+        """
+        if self.attached:
+            self.gpio.output(self.channel, self.gpio.LOW)
+        super(DigitalOutput, self).detach()
 
     def toggle_value(self):
         """
@@ -516,14 +1216,18 @@ class PWMOutput(GPIOBase):
         :type gpio_pin: int
         """
         # take one off to convert from counting numbers to index
-        gpio_pin -= 1
+        gpio_pin = int(gpio_pin) - 1
         super(PWMOutput, self).__init__(label, gpio_pin)
         self.effect_methods['start'] = self.start
         self.effect_methods['stop'] = self.stop
-        self.channel = self.GPIO_PINS[gpio_pin]
-        GPIO.setup(self.channel, GPIO.OUT, initial=GPIO.LOW)
-        self.pwm_controller = GPIO.PWM(self.channel, 200)
-        self.set_value(0)
+        self.pwm_controller = None
+        self.duty_cycle = 0
+
+    def attach(self):
+        self.gpio.setup(self.channel, self.gpio.OUT, initial=self.gpio.LOW)
+        self.pwm_controller = Hardware.get_backend().create_pwm(self.channel, 200)
+        super(PWMOutput, self).attach()
+        self.write_output()
 
     def set_value(self, duty_cycle):
         """
@@ -531,7 +1235,18 @@ class PWMOutput(GPIOBase):
         :param duty_cycle: new duty cycle expressed as percentage (1-100)
         :type duty_cycle: int
         """
-        self.pwm_controller.ChangeDutyCycle(duty_cycle)
+        self.duty_cycle = duty_cycle
+        if self.process_image is None:
+            self.write_output()
+        else:
+            self.process_image.stage_output(self)
+
+    def write_output(self):
+        """
+        Pushes the current duty cycle out to the PWM controller
+        """
+        if self.pwm_controller is not None:
+            self.pwm_controller.ChangeDutyCycle(self.duty_cycle)
 
     def start(self, inital_dutycycle=0):
         """
@@ -540,14 +1255,22 @@ class PWMOutput(GPIOBase):
         :param inital_dutycycle: sets the initial duty cycle when first started
         :type inital_dutycycle: int
         """
-        self.pwm_controller.start(inital_dutycycle)
+        if self.pwm_controller is not None:
+            self.pwm_controller.start(inital_dutycycle)
 
     def stop(self):
         """
         Stops the PWM signal
         Use set_value(0) for intermediate "off", and stop() to free up processor
         """
-        self.pwm_controller.stop()
+        if self.pwm_controller is not None:
+            self.pwm_controller.stop()
+
+    def detach(self):
+        if self.attached:
+            self.stop()
+            self.pwm_controller = None
+        super(PWMOutput, self).detach()
 
 
 class MediaPlayer(Component):
@@ -557,6 +1280,8 @@ class MediaPlayer(Component):
        Play() - starts playing track until track stops playing or,
                    does nothing if already playing
        Stop()      - stops playback of currently playing track
+    Events don't call these directly, they go through the player's MediaCommandQueue, so they
+    get carried out on the queue's own thread, and the latest one always happens eventually
     """
 
     COMPONENT_TYPE = 'MEDIA_PLAYER'
@@ -567,9 +1292,53 @@ class MediaPlayer(Component):
         :type track: str
         """
         super(MediaPlayer, self).__init__(label, track)
-        self.effect_methods['play'] = self.play
-        self.effect_methods['stop'] = self.stop
+        self.effect_methods['play'] = self.request_play
+        self.effect_methods['stop'] = self.request_stop
         self.track = track
+        self.commands = MediaCommandQueue(label, self.run_command, self.ready_in)
+        self.commands.start()
+
+    def can_reconfigure(self, track):
+        return True
+
+    def reconfigure(self, track):
+        """
+        Switches tracks, takes effect next time it plays
+        """
+        self.INITIAL_VALUE = track
+        self.value = track
+        self.track = track
+        return True
+
+    def teardown(self):
+        self.commands.stop()
+        super(MediaPlayer, self).teardown()
+
+    def request_play(self):
+        self.commands.submit('play')
+
+    def request_stop(self):
+        self.commands.submit('stop')
+
+    def ready_in(self):
+        """
+        :return: seconds until the player can take another command
+        :rtype: float
+        """
+        return 0
+
+    def run_command(self, command, submitted=None):
+        """
+        Carries out a command from the queue, called on the queue's thread
+        :type command: str
+        :param submitted: when the command was asked for
+        :type submitted: float
+        :return: False if the player wasn't ready after all, and the command has to wait
+        """
+        if command == 'play':
+            self.play()
+        elif command == 'stop':
+            self.stop()
 
     def play(self):
         pass
@@ -581,23 +1350,36 @@ class MediaPlayer(Component):
 class SimpleVideoPlayer(MediaPlayer):
     """
     Uses OMXPlayer to play videos through HDMI port
-     - You can only have one OMXPlayer at any time, hence class level player
+     - You can only have one OMXPlayer at any time, hence class level manager
+     - the VideoPlayerManager keeps it warm, so replays are a seek rather than a new process
     """
     COMPONENT_TYPE = 'SIMPLE_VIDEO_PLAYER'
-    player = None
+    manager = None
 
-    # Things misbehave when you try to issue too many commands too quickly, so these block that
+    # Things misbehave when you try to issue too many commands too quickly, so these hold commands back
     # Also, gotta keep this class level so all components play by the same rules
-    # TODO eventually make it so that if you hit a timeout period, you come back and try again later
     time_out = 0
     TIME_PERIOD = 1
 
+    # every SimpleVideoPlayer's queue shares the one OMXPlayer, so they take turns
+    command_lock = threading.Lock()
+
     def __init__(self, label, uri):
         """
         :param uri: Can be a path to local video or even some web-based video streams
         :type uri: str
         """
+        self.backend = Hardware.get_backend()
         super(SimpleVideoPlayer, self).__init__(label, uri)
+        if SimpleVideoPlayer.manager is None:
+            SimpleVideoPlayer.manager = VideoPlayerManager(self.backend)
+            SimpleVideoPlayer.manager.start()
+        SimpleVideoPlayer.manager.preload(uri)
+
+    def reconfigure(self, track):
+        super(SimpleVideoPlayer, self).reconfigure(track)
+        SimpleVideoPlayer.manager.preload(track)
+        return True
 
     @staticmethod
     def start_timeout(block_time):
@@ -615,142 +1397,247 @@ class SimpleVideoPlayer(MediaPlayer):
         """
         return time.time() > SimpleVideoPlayer.time_out
 
-    def play(self):
+    def ready_in(self):
+        return max(0.0, SimpleVideoPlayer.time_out - time.time())
+
+    def run_command(self, command, submitted=None):
+        with SimpleVideoPlayer.command_lock:
+            # another player's queue may have got in first
+            if not self.timeout_elapsed():
+                return False
+            if command == 'play':
+                self.play(submitted)
+            elif command == 'stop':
+                self.stop()
+
+    def play(self, requested=None):
         """
         Starts playing video from the beginning, or does nothing if already playing
+        :param requested: when the Event asking for this fired, for latency figures
+        :type requested: float
         """
-        playing = False
-
-        # Most of the errors are fine and we can ignore them
         try:
-            playing = SimpleVideoPlayer.player.is_playing()
-        except omxplayer.player.OMXPlayerDeadError as e:
-            print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
-        except AttributeError:
-            pass
-        except Exception as e:
-            print('Unknown Error!!!')
-            print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
-
-        # Most of the errors are fine and we can ignore them
-        try:
-            if not playing and self.timeout_elapsed():
-
-                # This creates a brand new player and automatically starts it
-                SimpleVideoPlayer.player = OMX(self.track, ['-b', '--no-osd'])
-                self.start_timeout(SimpleVideoPlayer.TIME_PERIOD)
-        except omxplayer.player.OMXPlayerDeadError:
-            pass
-        except AttributeError:
-            pass
+            SimpleVideoPlayer.manager.play(self.track, requested)
+            self.start_timeout(SimpleVideoPlayer.TIME_PERIOD)
         except Exception as e:
             print('Unknown Error!!!')
-            print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
+            print('Exception type: ' + str(type(e)) + '\nMessage: ' + str(e))
             raise
 
     def stop(self):
         """
-        Stops playing the current video and conceptually sets the playback timer to 0 (not technically exactly true)
+        Stops playing the current video and sets the playback position back to 0
         """
-
-        # Most of the errors are fine and we can ignore them
         try:
-            if self.timeout_elapsed() and SimpleVideoPlayer.player.get_source() == self.track:
-                SimpleVideoPlayer.player.stop()
+            if SimpleVideoPlayer.manager.is_playing(self.track):
+                SimpleVideoPlayer.manager.stop(self.track)
                 self.start_timeout(SimpleVideoPlayer.TIME_PERIOD)
-        except omxplayer.player.OMXPlayerDeadError:
-            pass
-        except AttributeError:
-            pass
         except Exception as e:
             print('Unknown Error!!!')
-            print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
+            print('Exception type: ' + str(type(e)) + '\nMessage: ' + str(e))
             raise
 
 
 class SimpleAudioPlayer(MediaPlayer):
     """
     Audio player which utilizes pygame. Sounds play through HDMI
+    Short tracks get decoded into the SoundBank when the player is made and play on the player's own
+    mixer channel, so they start right away and several players can sound at once
+    Long tracks stream through the one shared music player, like they always have
     """
 
     COMPONENT_TYPE = 'SIMPLE_AUDIO_PLAYER'
 
-    # init() required for pygame to do its thing
-    pygame.init()
-
-    # share one player among all SimpleAudioPlayer instances
+    # share one music player among all SimpleAudioPlayer instances, for the tracks that stream
     player = None
 
-    # only the component which started the audio can stop it prematurely. All components can start a new track, though
+    # only the component which started the music can stop it prematurely. All components can start a new track, though
     initiator = ''
 
-    # Things misbehave when you try to issue too many commands too quickly, so these block that
-    # Also, gotta keep this class level so all components play by the same rules
-    # TODO eventually make it so that if you hit a timeout period, you come back and try again later
-    time_out = 0
-    TIME_PERIOD = 0.5
-
     def __init__(self, label, path):
         """
         :param path: path to local audio file
         """
         super(SimpleAudioPlayer, self).__init__(label, path)
         if SimpleAudioPlayer.player is None:
-            SimpleAudioPlayer.player = pygame.mixer.music
+            SimpleAudioPlayer.player = Hardware.get_backend().get_music_player()
+        self.bank = get_sound_bank()
+        self.channel = self.bank.reserve_channel()
+        self.bank.load(path)
 
-    @staticmethod
-    def start_timeout(block_time):
-        """
-        Starts the timeout clock
-        :param block_time: how long to wait
-        """
-        SimpleAudioPlayer.time_out = time.time() + block_time
+    def can_reconfigure(self, track):
+        # decoded ahead of time, reconfigure() just finds it in the bank
+        self.bank.load(track)
+        return True
 
-    @staticmethod
-    def timeout_elapsed():
-        """
-        Check if OMXPlayer is ready for a new command
-        :return: whether we are beyond the timeout period
-        """
-        return time.time() > SimpleAudioPlayer.time_out
+    def reconfigure(self, track):
+        super(SimpleAudioPlayer, self).reconfigure(track)
+        self.bank.load(track)
+        return True
 
     def play(self):
         """
-        Attempts to play this player's track
+        Attempts to play this player's track, from the top if it's already playing
         """
-        if self.timeout_elapsed():
-            try:
+        try:
+            sound = self.bank.get(self.track)
+            if sound is not None:
+                self.channel.play(sound)
+            else:
                 SimpleAudioPlayer.player.load(self.track)
                 SimpleAudioPlayer.player.play()
-                self.start_timeout(SimpleAudioPlayer.TIME_PERIOD)
                 SimpleAudioPlayer.initiator = self.LABEL
-            except Exception as e:
-                print('could not play audio')
-                print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
-                raise
+        except Exception as e:
+            print('could not play audio')
+            print('Exception type: ' + str(type(e)) + '\nMessage: ' + str(e))
+            raise
 
     def stop(self):
         """
-        Stops play if and only if it was the one to start playing in the first place
+        Stops this player's sound, or the music if and only if it was the one to start playing in the first place
         """
         try:
-            if self.timeout_elapsed() and SimpleAudioPlayer.initiator == self.LABEL:
+            self.channel.stop()
+            if SimpleAudioPlayer.initiator == self.LABEL:
                 SimpleAudioPlayer.player.stop()
-                self.start_timeout(SimpleAudioPlayer.TIME_PERIOD)
         except Exception as e:
             print('could not stop audio')
-            print('Exception type: ' + str(type(e)) + '\nMessage: ' + e.message)
+            print('Exception type: ' + str(type(e)) + '\nMessage: ' + str(e))
             raise
 
+    def teardown(self):
+        self.bank.release_channel(self.channel)
+        super(SimpleAudioPlayer, self).teardown()
+
+
+# so I can avoid a huge long annoying "if" tree
+# you gotta add any new Component classes to this in order to make them
+# the Key must be COMPONENT_TYPE
+COMPONENT_CLASSES = \
+    {
+        'TIMER': Timer,
+        'COUNTER': Counter,
+        'DIGITAL_INPUT': DigitalInput,
+        'DIGITAL_OUTPUT': DigitalOutput,
+        'ANALOG_INPUT': AnalogInput,
+        'FILE_QUEUE': FileQueue,
+        'SIMPLE_AUDIO_PLAYER': SimpleAudioPlayer,
+        'SIMPLE_VIDEO_PLAYER': SimpleVideoPlayer
+    }
+
 
-def create_components(component_json_string='', components_dict=None):
+class ComponentRegistry(object):
+    """
+    Holds every Component in play, with hash indexes by label and by type
+    Each Component gets a stable integer slot when it's added, which it keeps until it's removed
+    Iterating over the registry gives the Components in slot order, so it can stand in for a plain list
+    """
+
+    def __init__(self, components=()):
+        """
+        :type components: list[Component]
+        """
+        # index is slot, removed Components leave a None behind so nobody else's slot changes
+        self.slots = []
+        self.by_label = {}
+        self.by_type = {}
+        for component in components:
+            self.add(component)
+
+    def __iter__(self):
+        for component in self.slots:
+            if component is not None:
+                yield component
+
+    def __len__(self):
+        return len(self.by_label)
+
+    def __contains__(self, label):
+        return label in self.by_label
+
+    def add(self, component):
+        """
+        Registers component and gives it a slot
+        :type component: Component
+        :return: the slot
+        :rtype: int
+        """
+        label = component.get_label()
+        if label in self.by_label:
+            raise ValueError('There is already a component labelled ' + str(label))
+
+        component.slot = len(self.slots)
+        self.slots.append(component)
+        self.by_label[label] = component
+
+        comp_type = component.get_type()
+        if comp_type not in self.by_type:
+            self.by_type[comp_type] = []
+        self.by_type[comp_type].append(component)
+
+        return component.slot
+
+    def remove(self, label):
+        """
+        Takes a Component out of the registry, its slot stays empty
+        :type label: str
+        :return: the Component which was removed
+        :rtype: Component
+        """
+        component = self.by_label.pop(label)
+        self.slots[component.slot] = None
+        self.by_type[component.get_type()].remove(component)
+        if not self.by_type[component.get_type()]:
+            del self.by_type[component.get_type()]
+        return component
+
+    def get(self, label):
+        """
+        :type label: str
+        :return: the Component with that label, or None if there isn't one
+        :rtype: Component
+        """
+        return self.by_label.get(label)
+
+    def get_by_type(self, comp_type):
+        """
+        :param comp_type: a COMPONENT_TYPE
+        :type comp_type: str
+        :rtype: list[Component]
+        """
+        return self.by_type.get(comp_type, [])
+
+    def get_slot(self, slot):
+        """
+        :type slot: int
+        :return: the Component in that slot, or None if it's empty
+        :rtype: Component
+        """
+        return self.slots[slot]
+
+    def copy(self):
+        """
+        A registry holding the same Components in the same slots, which can be added to and removed from
+        without touching this one
+        :rtype: ComponentRegistry
+        """
+        registry = ComponentRegistry()
+        registry.slots = list(self.slots)
+        registry.by_label = dict(self.by_label)
+        registry.by_type = dict((comp_type, list(components)) for comp_type, components in self.by_type.items())
+        return registry
+
+
+def create_components(component_json_string='', components_dict=None, attach=True):
     """
     Parses json strings into a list of components. Useful for receiving updates from web browser
     Either send component_json_string or components_dict, not both
     :param component_json_string: stringified representation of all components
     :param components_dict: already-loaded dict of components
-    :return: list of parsed out components
-    :rtype: list[Component]
+    :param attach: have the Components take hold of their hardware, see Component.attach()
+    :type attach: bool
+    :return: registry of parsed out components
+    :rtype: ComponentRegistry
 
 
     Example json:
@@ -768,21 +1655,9 @@ def create_components(component_json_string='', components_dict=None):
     }
     """
 
-    # so I can avoid a huge long annoying "if" tree
-    # you gotta add any new Component classes to this in order to make them
-    # the Key must be COMPONENT_TYPE
-    classes_dict = \
-        {
-            'TIMER': Timer,
-            'COUNTER': Counter,
-            'DIGITAL_INPUT': DigitalInput,
-            'DIGITAL_OUTPUT': DigitalOutput,
-            'ANALOG_INPUT': AnalogInput,
-            'SIMPLE_AUDIO_PLAYER': SimpleAudioPlayer,
-            'SIMPLE_VIDEO_PLAYER': SimpleVideoPlayer
-        }
+    classes_dict = COMPONENT_CLASSES
 
-    components = []
+    components = ComponentRegistry()
 
     # parse the json string into a dict
     if components_dict is None and component_json_string != '':
@@ -794,6 +1669,10 @@ def create_components(component_json_string='', components_dict=None):
             label = entry['LABEL']
             value = entry['VALUE']
             new_comp = classes_dict[comp_type](label, value)
-            components.append(new_comp)
+            components.add(new_comp)
+
+    if attach:
+        for component in components:
+            component.attach()
 
     return components
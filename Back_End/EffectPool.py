@@ -0,0 +1,270 @@
+import threading
+import time
+from collections import deque
+
+# workers running slow effects at once
+POOL_SIZE = 4
+
+# effects allowed to wait for a worker before new ones get turned away
+MAX_PENDING = 32
+
+# seconds an effect gets before it's reported as timed out
+EFFECT_TIMEOUT = 10.0
+
+# workers stuck on timed out effects allowed on top of POOL_SIZE, past this they aren't replaced any more
+MAX_HUNG_WORKERS = 4
+
+
+class EffectResult(object):
+    """
+    How a slow effect went, handed back to the engine by EffectPool.collect()
+    """
+
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    TIMED_OUT = 'TIMED_OUT'
+    REJECTED = 'REJECTED'
+
+    def __init__(self, component, method_name, status, submitted, duration=0.0, error=None, value=None):
+        self.component = component
+        self.method_name = method_name
+        self.status = status
+        self.submitted = submitted
+        self.duration = duration
+        self.error = error
+
+        # what the effect returned, the Component's new value unless it's None
+        self.value = value
+
+    def __str__(self):
+        text = self.component.get_label() + '.' + self.method_name + ': ' + self.status
+        text += ' after ' + str(round(self.duration, 3)) + 's'
+        if self.error is not None:
+            text += ' (' + str(self.error) + ')'
+        return text
+
+
+class _Job(object):
+    def __init__(self, component, method_name, method, arg, timeout):
+        self.component = component
+        self.method_name = method_name
+        self.method = method
+        self.arg = arg
+        self.timeout = timeout
+        self.submitted = time.time()
+        self.started = None
+        self.reported = False
+
+
+class EffectPool(object):
+    """
+    Bounded pool of worker threads for effects too slow to run on the scan loop (network, files)
+        - each Component's effects run one at a time, in the order they were submitted
+        - an effect identical to one already waiting for the same Component is dropped, it'd do the same thing
+        - once MAX_PENDING effects are waiting, new ones are rejected rather than piling up (backpressure)
+        - an effect that runs past its timeout is reported as TIMED_OUT and its worker is replaced,
+          Python threads can't be killed, so the old one gets left to finish on its own.
+          When it does, it takes its place back if the pool is short, otherwise it retires
+        - at most max_hung workers get left like that at once, past that the pool runs short rather than growing,
+          and once there's no worker left that isn't hung, new effects are rejected
+    Effects run off the scan thread, so they don't touch their Component: they return its new value instead
+    Results come back to the engine through collect(), which applies them on the scan thread
+    """
+
+    def __init__(self, size=POOL_SIZE, max_pending=MAX_PENDING, timeout=EFFECT_TIMEOUT, on_complete=None,
+                 max_hung=MAX_HUNG_WORKERS):
+        """
+        :param size: number of worker threads
+        :type size: int
+        :param max_pending: effects allowed to wait at once
+        :type max_pending: int
+        :param timeout: default seconds an effect gets to finish
+        :type timeout: float
+        :param on_complete: called with no arguments, from a worker thread, whenever an effect finishes
+        :param max_hung: workers stuck on timed out effects allowed on top of size
+        :type max_hung: int
+        """
+        self.size = size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.on_complete = on_complete
+        self.max_hung = max_hung
+
+        self._lock = threading.Condition()
+
+        # Component -> deque of _Jobs waiting, Components with work that nobody's running take turns in _ready
+        self._waiting = {}
+        self._ready = deque()
+        self._running = {}
+        self._pending_count = 0
+
+        self._results = deque()
+        self._workers = []
+        self._stopping = False
+
+        # workers taking jobs, and workers still stuck on an effect that timed out
+        self._healthy = 0
+        self._hung = 0
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def start(self):
+        with self._lock:
+            for _ in range(self.size):
+                self._add_worker()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+
+    def _add_worker(self):
+        """
+        Must hold self._lock
+        """
+        self._healthy += 1
+        worker = threading.Thread(target=self._work, name='EffectWorker')
+        worker.daemon = True
+        self._workers.append(worker)
+        worker.start()
+
+    def submit(self, component, method_name, method, arg=None, timeout=None):
+        """
+        Queues up an effect
+        :param component: the Component the effect belongs to
+        :param method_name: name of the effect method, for reporting
+        :type method_name: str
+        :param method: the bound effect method
+        :param arg: argument for the method, or None to call it without one
+        :param timeout: seconds this effect gets, defaults to the pool's timeout
+        :type timeout: float
+        :return: False if the effect was turned away
+        :rtype: bool
+        """
+        job = _Job(component, method_name, method, arg, self.timeout if timeout is None else timeout)
+        with self._lock:
+            waiting = self._waiting.get(component)
+            if waiting and waiting[-1].method_name == method_name and waiting[-1].arg == arg:
+                self.coalesced += 1
+                return True
+
+            # with every worker hung there's nobody to run it, so it'd only sit there
+            if self._pending_count >= self.max_pending or (self._healthy == 0 and self._workers):
+                self.rejected += 1
+                self._results.append(EffectResult(component, method_name, EffectResult.REJECTED, job.submitted))
+                return False
+
+            if waiting is None:
+                waiting = self._waiting[component] = deque()
+            waiting.append(job)
+            self._pending_count += 1
+            self.submitted += 1
+
+            # a Component somebody's already working on gets picked up again when they're done
+            if len(waiting) == 1 and component not in self._running:
+                self._ready.append(component)
+                self._lock.notify()
+        return True
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._ready and not self._stopping:
+                    self._lock.wait()
+                if self._stopping:
+                    return
+                component = self._ready.popleft()
+                job = self._waiting[component].popleft()
+                self._pending_count -= 1
+                job.started = time.time()
+                self._running[component] = job
+
+            status = EffectResult.DONE
+            error = None
+            value = None
+            try:
+                if job.arg is None:
+                    value = job.method()
+                else:
+                    value = job.method(job.arg)
+            except Exception as e:
+                status = EffectResult.FAILED
+                error = e
+
+            with self._lock:
+                abandoned = job.reported
+                if self._running.get(component) is job:
+                    del self._running[component]
+                    self._next_for(component)
+                if not abandoned:
+                    self._results.append(EffectResult(component, job.method_name, status, job.submitted,
+                                                      time.time() - job.started, error, value))
+                else:
+                    # timed out, back to work if the pool is short of a worker, otherwise retire
+                    self._hung -= 1
+                    if self._healthy < self.size and not self._stopping:
+                        self._healthy += 1
+                    else:
+                        self._workers.remove(threading.current_thread())
+                        return
+
+            if not abandoned and self.on_complete is not None:
+                self.on_complete()
+
+    def _next_for(self, component):
+        """
+        Must hold self._lock
+        """
+        if self._waiting.get(component):
+            self._ready.append(component)
+            self._lock.notify()
+        elif component in self._waiting:
+            del self._waiting[component]
+
+    def _check_timeouts(self):
+        """
+        Must hold self._lock
+        """
+        now = time.time()
+        for component, job in list(self._running.items()):
+            if not job.reported and now - job.started > job.timeout:
+                job.reported = True
+                self._results.append(EffectResult(component, job.method_name, EffectResult.TIMED_OUT,
+                                                  job.submitted, now - job.started))
+
+                # let the Component's other effects carry on without it, on a fresh worker if there's room for one
+                del self._running[component]
+                self._next_for(component)
+                self._healthy -= 1
+                self._hung += 1
+                if self._healthy + self._hung < self.size + self.max_hung:
+                    self._add_worker()
+
+    def collect(self):
+        """
+        Hands over the results of every effect that has finished (or failed, or timed out) since the last call
+        Call it from the scan thread: it's where each effect's value gets set, and its Component marked dirty
+        so the Events that depend on it take another look
+        :rtype: list[EffectResult]
+        """
+        with self._lock:
+            self._check_timeouts()
+            results = list(self._results)
+            self._results.clear()
+
+        for result in results:
+            if result.value is not None:
+                result.component.set_value(result.value)
+            result.component.mark_dirty()
+        return results
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        with self._lock:
+            return {'PENDING': self._pending_count, 'RUNNING': len(self._running), 'SUBMITTED': self.submitted,
+                    'COALESCED': self.coalesced, 'REJECTED': self.rejected, 'WORKERS': self._healthy,
+                    'HUNG_WORKERS': self._hung}
@@ -1,4 +1,134 @@
 import json
+import math
+
+from Components import ComponentRegistry
+from Scheduler import clock
+
+# JSON fragments are stitched together, so keep them free of needless whitespace
+SEPARATORS = (',', ':')
+
+# check values of these types get written straight into compiled conditions as literals
+_LITERAL_TYPES = (bool, int, float, str)
+
+# Timer checks whose answer only changes when the clock passes their value, see register_timer_thresholds()
+TIMER_THRESHOLD_METHODS = ('greater_than', 'less_than', 'equal_to')
+
+# generated condition source -> its compiled code, compiling is most of what building an Event costs
+# Snapshot saves the code along with the Events and puts it back in here on the next boot
+# only holds code for the Events in play, see prune_code_cache()
+code_cache = {}
+
+
+def _is_literal(value):
+    """
+    Private function
+    Whether repr(value) gives value back, so it can go straight into generated source
+    :rtype: bool
+    """
+    if type(value) not in _LITERAL_TYPES:
+        return False
+    return type(value) is not float or not (math.isnan(value) or math.isinf(value))
+
+
+def compile_source(source):
+    """
+    :param source: generated by compile_checks()
+    :type source: str
+    :return: compiled code for source, from code_cache if it's been compiled before
+    """
+    code = code_cache.get(source)
+    if code is None:
+        code = compile(source, '<condition>', 'eval')
+        code_cache[source] = code
+    return code
+
+
+def prune_code_cache(events):
+    """
+    Drops compiled code none of events' Conditions came from, so code_cache only ever holds what's in play,
+    however many times the definitions change
+    Call whenever a new set of Events is swapped in, once it's been compiled (and batched)
+    :type events: list[Event]
+    """
+    live = set()
+    for event in events:
+        for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+            if condition is not None:
+                live.update(condition.sources)
+
+    for source in list(code_cache):
+        if source not in live:
+            code_cache.pop(source, None)
+
+
+def evaluate_metric(event):
+    """
+    Name of the Metrics histogram EventIndex times event's evaluate() with
+    :type event: Event
+    :rtype: str
+    """
+    return 'event.' + event.get_label() + '.evaluate'
+
+
+def prune_event_timings(metrics, events):
+    """
+    Drops the evaluate timings of Events which are no longer around
+    Call whenever a new set of Events is swapped in
+    :type metrics: Metrics
+    :type events: list[Event]
+    """
+    metrics.prune('event.', [evaluate_metric(event) for event in events])
+
+
+def compile_checks(checks, batch=None, batch_index=None, sources=None):
+    """
+    Turns a Condition's checks into a single short-circuiting function, so evaluating it costs one call
+    instead of a loop of dict lookups. For checks [(timer, 'greater_than', 30.0), (button, 'equal_to', 'PRESSED')]
+    the generated source is
+        lambda m0=timer.greater_than, m1=button.equal_to: m0(30.0) and m1('PRESSED')
+    Condition methods are bound ahead of time and passed in as defaults, which makes them fast locals
+    :param checks: Condition.checks
+    :type checks: list
+    :param batch: BatchEvaluator which has already worked out the rest of this Condition's checks
+    :param batch_index: where this Condition's combined result sits in batch.results
+    :type batch_index: int
+    :param sources: set to add the generated source to, see Condition.sources
+    :type sources: set
+    :return: function taking no arguments, with the same truthiness as Condition.evaluate()
+    """
+    if not checks and batch is None:
+        return lambda: True
+
+    namespace = {}
+    params = []
+    terms = []
+
+    if batch is not None:
+        # the index is passed in rather than written into the source, so the source stays the same when it moves
+        namespace['batch'] = batch
+        namespace['batch_index'] = batch_index
+        params.extend(['batch=batch', 'batch_index=batch_index'])
+        terms.append('batch.results[batch_index]')
+    for i, entry in enumerate(checks):
+        method_name = 'm' + str(i)
+        namespace[method_name] = entry['COMPONENT'].condition_methods[entry['METHOD']]
+        params.append(method_name + '=' + method_name)
+
+        value = entry['VALUE']
+        if value is None:
+            terms.append(method_name + '()')
+        elif _is_literal(value):
+            terms.append(method_name + '(' + repr(value) + ')')
+        else:
+            value_name = 'v' + str(i)
+            namespace[value_name] = value
+            params.append(value_name + '=' + value_name)
+            terms.append(method_name + '(' + value_name + ')')
+
+    source = 'lambda ' + ', '.join(params) + ': ' + ' and '.join(terms)
+    if sources is not None:
+        sources.add(source)
+    return eval(compile_source(source), namespace)
 
 
 class Event(object):
@@ -29,6 +159,13 @@ class Event(object):
         self.effect = effect
         self.state = 'ACTIVE'
 
+        # for condition hit rates, see Metrics
+        self.evaluations = 0
+        self.hits = 0
+
+        # definitions never change once an Event is made, so this only gets encoded once
+        self._definition_json = None
+
     def __str__(self):
         return self.label + ':\n\tconditions: ' + str(self.condition) + '\n\teffects: ' + str(self.effect)
 
@@ -46,19 +183,51 @@ class Event(object):
     def evaluate(self):
         """
         Basically causes the event to chooch
+        :return: True if the effect fired or the state changed, meaning this Event has to be looked at again next tick
+        :rtype: bool
         """
+        hot = False
+        self.evaluations += 1
 
         # If it isn't active, don't do anything
         if self.state == 'ACTIVE' and self.condition.evaluate():
+            self.hits += 1
             self.effect.perform_actions()
+            hot = True
 
         # determine state
         if self.deactivate_condition is not None:
             if self.state == 'ACTIVE' and self.deactivate_condition.evaluate():
                 self.set_state('DEACTIVATED')
+                hot = True
         if self.activate_condition is not None:
             if self.state == 'DEACTIVATED' and self.activate_condition.evaluate():
                 self.set_state('ACTIVE')
+                hot = True
+
+        return hot
+
+    def compile(self):
+        """
+        Compiles all of this Event's Conditions, see compile_checks()
+        """
+        self.condition.compile()
+        if self.activate_condition is not None:
+            self.activate_condition.compile()
+        if self.deactivate_condition is not None:
+            self.deactivate_condition.compile()
+
+    def get_components(self):
+        """
+        Every Component referenced by this Event's conditions (main, ACTIVATE and DEACTIVATE)
+        :rtype: set[Component]
+        """
+        components = self.condition.get_components()
+        if self.activate_condition is not None:
+            components |= self.activate_condition.get_components()
+        if self.deactivate_condition is not None:
+            components |= self.deactivate_condition.get_components()
+        return components
 
     def get_definition(self):
         """
@@ -81,6 +250,22 @@ class Event(object):
 
         return identity
 
+    def get_definition_json(self):
+        """
+        get_definition(), encoded once and kept, put together from the Conditions' and Effect's own fragments
+        :rtype: str
+        """
+        if self._definition_json is None:
+            parts = ['"LABEL":' + json.dumps(self.label),
+                     '"CONDITIONS":' + self.condition.get_definition_json(),
+                     '"EFFECTS":' + self.effect.get_definition_json()]
+            if self.activate_condition is not None:
+                parts.append('"ACTIVATE":' + self.activate_condition.get_definition_json())
+            if self.deactivate_condition is not None:
+                parts.append('"DEACTIVATE":' + self.deactivate_condition.get_definition_json())
+            self._definition_json = '{' + ','.join(parts) + '}'
+        return self._definition_json
+
 
 class Condition(object):
     """
@@ -92,6 +277,10 @@ class Condition(object):
         :type checks: list
         """
         self.checks = checks
+        self._definition_json = None
+
+        # every source this Condition has been compiled from, so Snapshot knows which code to keep
+        self.sources = set()
 
     def __str__(self):
         return str(self.checks)
@@ -114,6 +303,20 @@ class Condition(object):
 
         return all_conditions_met
 
+    def compile(self):
+        """
+        Swaps evaluate() for a compiled version of the checks, see compile_checks()
+        Only do this once the Components are all set, the compiled version holds on to their methods
+        """
+        self.evaluate = compile_checks(self.checks, sources=self.sources)
+
+    def get_components(self):
+        """
+        :return: the Components this Condition checks on
+        :rtype: set[Component]
+        """
+        return set(entry['COMPONENT'] for entry in self.checks)
+
     def get_definition(self):
         """
         Creates a save-able form of Condition's data
@@ -127,16 +330,34 @@ class Condition(object):
 
         return def_list
 
+    def get_definition_json(self):
+        """
+        get_definition(), encoded once and kept
+        :rtype: str
+        """
+        if self._definition_json is None:
+            self._definition_json = json.dumps(self.get_definition(), separators=SEPARATORS)
+        return self._definition_json
+
 
 class Effect(object):
     """
     Class which controls all actions, such as changing a Component's state
+    Actions listed in their Component's SLOW_EFFECTS go to the EffectPool when there is one
     """
+
+    # EffectPool for slow actions, or None to run everything right here
+    pool = None
+
+    # Metrics to time actions run right here with, or None not to bother
+    metrics = None
+
     def __init__(self, actions):
         """
         :type actions: list
         """
         self.actions = actions
+        self._definition_json = None
 
     def __str__(self):
         return str(self.actions)
@@ -153,51 +374,212 @@ class Effect(object):
 
         return effect_def
 
+    def get_definition_json(self):
+        """
+        get_definition(), encoded once and kept
+        :rtype: str
+        """
+        if self._definition_json is None:
+            self._definition_json = json.dumps(self.get_definition(), separators=SEPARATORS)
+        return self._definition_json
+
     def perform_actions(self):
         """
         Method which does the stuff
         """
 
+        metrics = Effect.metrics
         for entry in self.actions:
             method = entry["METHOD"]
             arg = entry["ARG"]
-            print(method)
-            print(arg)
+            if entry["SLOW"] and Effect.pool is not None:
+                Effect.pool.submit(entry["COMPONENT"], entry["METHOD_NAME"], method, arg)
+                continue
+
+            start = clock() if metrics is not None else None
             if arg is None:
-                method()
+                value = method()
             else:
-                method(arg)
+                value = method(arg)
+            # slow effects hand back the new value rather than setting it, see Component.SLOW_EFFECTS
+            if entry["SLOW"] and value is not None:
+                entry["COMPONENT"].set_value(value)
+            if metrics is not None:
+                metrics.record(entry["METRIC"], clock() - start)
+
+
+class EventIndex(object):
+    """
+    Reverse index from each Component to the Events whose Conditions reference it.
+    Rather than evaluating every Event every tick, only Events that could have changed their answer get evaluated:
+      - Events that depend on a Component which changed since the last tick
+      - Events which fired or changed state last tick (a condition that was true stays true until something changes,
+        and the effect is supposed to keep happening while it is)
+    Conditions are plain comparisons against Component state,
+    so an Event that was quiet last tick stays quiet until one of its Components changes
+    """
+
+    def __init__(self, events, metrics=None):
+        """
+        :type events: list[Event]
+        :param metrics: to time every Event's evaluate() with, see Metrics
+        :type metrics: Metrics
+        """
+        self.events = events
+
+        # Event -> its evaluate time Histogram, when there's timing to be done
+        self.timings = None
+        if metrics is not None:
+            self.timings = dict([(event, metrics.histogram(evaluate_metric(event))) for event in events])
+
+        # keeps evaluation in the same order as the events list
+        self.positions = {}
+
+        # Component -> list of Events which reference it
+        self.dependents = {}
+
+        for position, event in enumerate(events):
+            self.positions[event] = position
+            for component in event.get_components():
+                if component not in self.dependents:
+                    self.dependents[component] = []
+                self.dependents[component].append(event)
+
+        # the very first tick has to look at everything
+        self.hot = set(events)
+
+    def get_components(self):
+        """
+        :return: every Component referenced by at least one Event
+        :rtype: list[Component]
+        """
+        return list(self.dependents.keys())
+
+    def evaluate(self, changed_components):
+        """
+        Evaluates only those Events which could be affected by changed_components
+        :param changed_components: Components whose value or state has changed since the last tick
+        :type changed_components: set[Component]
+        :return: how many Events were evaluated
+        :rtype: int
+        """
+        pending = self.hot
+        for component in changed_components:
+            if component in self.dependents:
+                pending.update(self.dependents[component])
+
+        hot = set()
+        timings = self.timings
+        if timings is None:
+            for event in sorted(pending, key=self.positions.get):
+                if event.evaluate():
+                    hot.add(event)
+        else:
+            for event in sorted(pending, key=self.positions.get):
+                start = clock()
+                if event.evaluate():
+                    hot.add(event)
+                timings[event].record(clock() - start)
+
+        self.hot = hot
+        return len(pending)
+
+
+def register_timer_thresholds(all_components, events):
+    """
+    Hands every Timer the times its Events compare it against, so a running Timer can have the Scheduler
+    wake it at exactly those times rather than being checked every scan
+    :type all_components: ComponentRegistry
+    :type events: list[Event]
+    """
+    thresholds = {}
+    for event in events:
+        for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+            if condition is None:
+                continue
+            for entry in condition.checks:
+                component = entry['COMPONENT']
+                if component.get_type() == 'TIMER' and entry['METHOD'] in TIMER_THRESHOLD_METHODS:
+                    thresholds.setdefault(component, []).append(entry['VALUE'])
+
+    for timer in all_components.get_by_type('TIMER'):
+        timer.set_thresholds(thresholds.get(timer, []))
+
+
+def register_windowed_inputs(all_components, events):
+    """
+    Flags every AnalogInput whose Events look at its sampler window, so it counts as changed whenever new
+    samples come in rather than only when the latest reading does
+    :type all_components: ComponentRegistry
+    :type events: list[Event]
+    """
+    windowed = set()
+    for event in events:
+        for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+            if condition is None:
+                continue
+            for entry in condition.checks:
+                component = entry['COMPONENT']
+                if component.get_type() == 'ANALOG_INPUT' and entry['METHOD'] in component.WINDOWED_CONDITIONS:
+                    windowed.add(component)
+
+    for analog in all_components.get_by_type('ANALOG_INPUT'):
+        analog.windowed = analog in windowed
 
 
-def create_events(all_components, events_json_str='', events_list=None):
+def create_events(all_components, events_json_str='', events_list=None, skip_invalid=False):
     """
     takes the raw string json from the server and parses it out to make new events
-    :type all_components: list[Component]
+    :type all_components: ComponentRegistry
     :param events_json_str: optional json of already-made events
     :param events_list: optional list of already-made events dict, must have one or the other
+    :param skip_invalid: leave out (and complain about) Events which can't be made, rather than raising
+    :type skip_invalid: bool
     :rtype: list[Event]
+    :raises ValueError: if an Event refers to a Component or method which doesn't exist, unless skip_invalid
     """
     if events_list is None and events_json_str != '':
         events_list = json.loads(events_json_str)
 
+    if not isinstance(all_components, ComponentRegistry):
+        all_components = ComponentRegistry(all_components)
+
     events = []
 
     for event in events_list:
-        label = event['LABEL']
-        condition = create_condition(event['CONDITIONS'], all_components)
-        effect = create_effect(event['EFFECTS'], all_components)
+        try:
+            events.append(create_event(event, all_components))
+        except ValueError as e:
+            if not skip_invalid:
+                raise
+            print('Leaving out event ' + str(event['LABEL']) + ': ' + str(e))
 
-        activate_condition = None
-        deactivate_condition = None
-        if 'ACTIVATE' in event:
-            activate_condition = create_condition(event['ACTIVATE'], all_components)
-        if 'DEACTIVATE' in event:
-            deactivate_condition = create_condition(event['DEACTIVATE'], all_components)
+    return events
 
-        new_event = Event(label, condition, effect, activate_condition, deactivate_condition)
-        events.append(new_event)
 
-    return events
+def create_event(event, all_components):
+    """
+    Makes one Event, all or nothing
+    :param event: definition, formatted like the entries create_events() takes
+    :type event: dict
+    :type all_components: ComponentRegistry
+    :rtype: Event
+    :raises ValueError: if the Event refers to a Component or method which doesn't exist
+    """
+    label = event['LABEL']
+    condition = create_condition(event['CONDITIONS'], all_components)
+    effect = create_effect(event['EFFECTS'], all_components)
+
+    activate_condition = None
+    deactivate_condition = None
+    if 'ACTIVATE' in event:
+        activate_condition = create_condition(event['ACTIVATE'], all_components)
+    if 'DEACTIVATE' in event:
+        deactivate_condition = create_condition(event['DEACTIVATE'], all_components)
+
+    new_event = Event(label, condition, effect, activate_condition, deactivate_condition)
+    new_event.compile()
+    return new_event
 
 
 def create_effect(actions_list, all_components):
@@ -209,32 +591,41 @@ def create_effect(actions_list, all_components):
                     'METHOD':component_method_pointer,
                     'METHOD_NAME': 'method_string',
                     'ARG':optional_parameter }, ... ]
-    :type all_components: list[Component]
+    :type all_components: ComponentRegistry
     :rtype: Effect
+    :raises ValueError: if a label doesn't belong to any Component
     """
     actions = []
 
     for entry in actions_list:
         component_label = entry['LABEL']
-        component = None
-        for comp in all_components:
-            # find the correct component based off its label, then quit looking
-            if comp.get_label() == component_label:
-                component = comp
-                break
-        # label doesn't represent an actual component
+        component = all_components.get(component_label)
+
+        # dropping just this action would leave an Effect which does something other than what was asked
         if component is None:
-            break
-        method_name = entry['METHOD']
-        arg = None
-        if 'ARG' in entry:
-            arg = entry['ARG']
-        effect_method = component.effect_methods[method_name]
-        actions.append({'METHOD': effect_method, 'ARG': arg, 'LABEL': component_label, 'METHOD_NAME': method_name})
+            raise ValueError('Effect refers to unknown component ' + str(component_label))
+        actions.append(create_action(component, entry['METHOD'], entry.get('ARG')))
 
     return Effect(actions)
 
 
+def create_action(component, method_name, arg=None):
+    """
+    One of an Effect's actions, for a Component that's already been looked up
+    :type component: Component
+    :param method_name: one of the Component's effect_methods
+    :type method_name: str
+    :param arg: passed to the method, or None for no argument
+    :rtype: dict
+    :raises ValueError: if the Component has no such method
+    """
+    if method_name not in component.effect_methods:
+        raise ValueError(component.get_type() + ' has no effect ' + str(method_name))
+    return {'METHOD': component.effect_methods[method_name], 'ARG': arg, 'LABEL': component.get_label(),
+            'METHOD_NAME': method_name, 'COMPONENT': component, 'SLOW': method_name in component.SLOW_EFFECTS,
+            'METRIC': 'effect.' + component.get_type()}
+
+
 def create_condition(checks_list, all_components_list):
     """
     Function to create a Condition from a list of checks
@@ -243,31 +634,42 @@ def create_condition(checks_list, all_components_list):
                             'METHOD': boolean-evaluating method which checks state of component,
                             'VALUE': value to compare against or general parameter for method
                         }, ... ]
-    :type all_components_list: list[Component]
+    :type all_components_list: ComponentRegistry
     :rtype: Condition
+    :raises ValueError: if a label doesn't belong to any Component
     """
     checks = []
 
     for entry in checks_list:
         component_label = entry['LABEL']
-        component = None
-        for comp in all_components_list:
-            if comp.get_label() == component_label:
-                component = comp
-                break
+        component = all_components_list.get(component_label)
+        # dropping just this check would leave a Condition which is true more often than it should be,
+        # with none left at all it would be true on every scan
         if component is None:
-            break
-        operator = entry['METHOD']
-        value = entry['VALUE']
+            raise ValueError('Condition refers to unknown component ' + str(component_label))
+        checks.append(create_check(component, entry['METHOD'], entry['VALUE']))
 
-        # cast values to appropriate type
-        comp_type = component.COMPONENT_TYPE
-        if comp_type == 'COUNTER':
-            value = int(value)
-        elif comp_type == 'TIMER' or comp_type == 'ANALOG_INPUT':
-            value = float(value)
+    return Condition(checks)
 
-        checks.append({'COMPONENT': component, 'COMPONENT_LABEL': component.get_label(),
-                           'METHOD': operator, 'VALUE': value})
 
-    return Condition(checks)
+def create_check(component, operator, value):
+    """
+    One of a Condition's checks, for a Component that's already been looked up
+    :type component: Component
+    :param operator: one of the Component's condition_methods
+    :type operator: str
+    :param value: what to compare against, cast to suit the Component
+    :rtype: dict
+    :raises ValueError: if the Component has no such method, or value doesn't suit it
+    """
+    if operator not in component.condition_methods:
+        raise ValueError(component.get_type() + ' has no condition ' + str(operator))
+
+    # cast values to appropriate type
+    comp_type = component.COMPONENT_TYPE
+    if comp_type == 'COUNTER':
+        value = int(value)
+    elif comp_type == 'TIMER' or comp_type == 'ANALOG_INPUT':
+        value = float(value)
+
+    return {'COMPONENT': component, 'COMPONENT_LABEL': component.get_label(), 'METHOD': operator, 'VALUE': value}
@@ -1,121 +1,326 @@
 from Components import *
 from Events import *
+from Persistence import FileWriter
+from Reconciler import prepare
+import Snapshot
+import atexit
+import hashlib
 import json
+import os
+import threading
+import time
 
+# where the web-app leaves its updates
+CLIENT_UPDATES_FILE = '../Front_End/json-server-api/db.json'
 
-def _load_object_from_json(filename, node=''):
-    """
-    Private function
-    Performs a loads() on the data from filename
-    :param filename: relative path to file
-    :type filename: str
-    :param node: optionally cleaves a part of the dict and only returns data from node
-    """
-    with open(filename, 'r') as f:
-        def_str = f.read()
+# every file the back end saves goes through here, see Persistence.FileWriter
+# definitions.json changes in bursts while someone's editing, so give it a while to settle
+DEFINITION_WRITE_WINDOW = 5.0
+
+# definitions.json, already parsed and compiled, see Snapshot
+SNAPSHOT_FILE = 'definitions.snapshot'
+file_writer = FileWriter()
 
-    temp_dict = None
-    if def_str != '':
-        load_dict = json.loads(def_str)
-        if node != '':
-            temp_dict = load_dict[node]
+# whatever is still waiting when we shut down goes to disk
+atexit.register(file_writer.stop)
 
-    return temp_dict
+# metrics report fields which are different every time, so they don't count as something new to save
+# FILE_WRITES counts the metrics writes themselves
+VOLATILE_METRICS = ('UPTIME', 'FILE_WRITES')
 
+# the last metrics report saved, less VOLATILE_METRICS
+_last_metrics = None
 
-def _save_dict(filename, data):
+
+def _save_dict(filename, data, window=None):
     """
     Private function
-    Saves to a file
+    Saves to a file, by way of file_writer. The write happens on a later flush_writes()
     :param filename: File path (will overwrite all data in file)
     :type filename: str
     :param data: object to save as json
+    :param window: seconds to let further changes pile up, see FileWriter.write()
+    :type window: float
     """
-    definition_json_str = json.dumps(data, indent=4)
-    with open(filename, 'w') as f:
-        f.write(definition_json_str)
+    definition_json_str = json.dumps(data, separators=(',', ':'))
+    _save_json_str(filename, definition_json_str, window)
 
 
-def _create_events_definition(current_events):
+def _save_json_str(filename, json_str, window=None):
     """
     Private function
-    Puts together a list of save-able event definitions
-    :type current_events: list[Event]
-    :rtype: list
+    Same as _save_dict(), for JSON which is already encoded
+    :type filename: str
+    :type json_str: str
+    :type window: float
     """
-    event_definitions = []
+    file_writer.write(filename, json_str, window)
 
-    for event in current_events:
-        ev_def = event.get_definition()
-        event_definitions.append(ev_def)
 
-    return event_definitions
+def flush_writes(force=False):
+    """
+    Puts any saves whose coalescing window is up on disk
+    Once file_writer.start() is called its own thread does this, only call it for saves that can't wait
+    :param force: write everything now
+    :type force: bool
+    :return: number of files written
+    :rtype: int
+    """
+    return file_writer.flush(force)
 
 
-def _create_components_definition(current_comps):
+def _join_by_type(components, fragment):
     """
     Private function
-    Puts together a list of save-able component definitions
-    :type current_comps: list[Component]
-    :rtype: dict
+    Stitches JSON fragments into an object of lists, one list per component type
+    :type components: ComponentRegistry
+    :param fragment: function giving a Component's JSON fragment
+    :rtype: str
     """
-    comp_definitions = {}
+    type_lists = []
+    for comp_type, comps in components.by_type.items():
+        type_lists.append(json.dumps(comp_type) + ':[' + ','.join([fragment(comp) for comp in comps]) + ']')
+    return '{' + ','.join(type_lists) + '}'
 
-    for comp in current_comps:
-        comp_type, comp_def = comp.get_definition()
-        if comp_type not in comp_definitions:
-            comp_definitions[comp_type] = []
-        comp_definitions[comp_type].append(comp_def)
 
-    return comp_definitions
+def _create_events_definition(current_events):
+    """
+    Private function
+    Puts together the save-able event definitions, as a JSON list
+    Each Event keeps its own encoded definition, so this is mostly string joining
+    :type current_events: list[Event]
+    :rtype: str
+    """
+    return '[' + ','.join([event.get_definition_json() for event in current_events]) + ']'
 
 
-def load_events_definition(all_components):
+def _create_components_definition(current_comps):
     """
-    Creates the events list from the definitions.json save file
-    :type all_components: list[Component]
-    :return: either a list of events, or None if there was nothing in the file
+    Private function
+    Puts together the save-able component definitions, as a JSON object
+    Each Component keeps its own encoded definition, so this is mostly string joining
+    :type current_comps: ComponentRegistry
+    :rtype: str
     """
-    evs_dict = _load_object_from_json('definitions.json', 'EVENTS')
-    events = None
-    if evs_dict is not None:
-        events = create_events(all_components, events_list=evs_dict)
-    return events
+    return _join_by_type(current_comps, Component.get_definition_json)
 
 
-def load_components_definition():
+def load_definition():
     """
-    Creates components from the definitions.json save file
-    :return: either a list of Componetns or None if there's nothing in the file
+    Creates components and events from definitions.json, by way of the snapshot if it was made from the same file.
+    Otherwise the JSON gets parsed, and a fresh snapshot gets saved for next time
+    :return: ComponentRegistry, [Event], or None, None if there was nothing in the file
     """
-    comp_dict = _load_object_from_json('definitions.json', 'COMPONENTS')
-    components = None
-    if comp_dict is not None:
-        components = create_components(components_dict=comp_dict)
-    return components
+    with open('definitions.json', 'rb') as f:
+        data = f.read()
+    if not data.strip():
+        return None, None
 
+    definitions_digest = Snapshot.digest(data)
+    components, events = Snapshot.load(SNAPSHOT_FILE, definitions_digest)
+    if components is not None:
+        return components, events
 
-def load_client_updates(all_components):
+    load_dict = json.loads(data.decode('utf-8'))
+    components = create_components(components_dict=load_dict['COMPONENTS'])
+    events = create_events(components, events_list=load_dict['EVENTS'], skip_invalid=True)
+    _save_snapshot(definitions_digest, components, events, 0)
+    return components, events
+
+
+def _save_snapshot(definitions_digest, current_comps, current_events, window):
     """
-    Grabs updates from the web-app, such as new Components
-    In the future there may also be commands and such
-    :type all_components: [Component]
-    :return: [Component], [Event] or None if there's nothing new
+    Private function
+    Saves a snapshot of current_comps and current_events, by way of file_writer
+    :param definitions_digest: Snapshot.digest() of the definitions.json they match
+    :type definitions_digest: bytes
+    :type current_comps: ComponentRegistry
+    :type current_events: list[Event]
+    :type window: float
     """
-    updates_dict = _load_object_from_json('../Front End/json-server-api/db.json')
+    # compiling and marshalling wait for the write window, on the writer's thread
+    # if it turns out something can't be marshalled there's no harm done, the next boot just goes by the JSON
+    file_writer.write(SNAPSHOT_FILE, Snapshot.encode_later(definitions_digest, current_comps, current_events),
+                      window)
+
 
-    new_events = None
-    new_comps = None
+def _validate_client_updates(updates_dict):
+    """
+    Private function
+    Makes sure updates from the web-app are shaped right before anything gets built from them
+    :type updates_dict: dict
+    :raises ValueError: if something is off
+    """
+    if not isinstance(updates_dict, dict):
+        raise ValueError('updates must be a JSON object')
+
+    comps_dict = updates_dict.get('COMPONENTS', {})
+    if not isinstance(comps_dict, dict):
+        raise ValueError('COMPONENTS must be an object of component lists')
+    for comp_type, entries in comps_dict.items():
+        if comp_type not in COMPONENT_CLASSES:
+            raise ValueError('unknown component type ' + str(comp_type))
+        for entry in entries:
+            if 'LABEL' not in entry or 'VALUE' not in entry:
+                raise ValueError(str(comp_type) + ' entries need a LABEL and a VALUE')
+
+    for event in updates_dict.get('EVENTS', []):
+        for key in ('LABEL', 'CONDITIONS', 'EFFECTS'):
+            if key not in event:
+                raise ValueError('events need ' + key)
+
+
+def prepare_client_updates(all_components, all_events, updates_dict, metrics=None):
+    """
+    Works out everything needed to apply already-loaded updates from the web-app, without touching what's running
+    Components and Events get made (and the EventIndex for them) so all the loop has left to do is commit()
+    :type all_components: ComponentRegistry
+    :type all_events: list[Event]
+    :type updates_dict: dict
+    :param metrics: for the EventIndex, see Metrics
+    :rtype: Reconciliation
+    :raises ValueError: if the updates can't be applied, nothing is left behind
+    """
+    reconciliation = prepare(all_components, all_events, updates_dict)
+    if reconciliation.events_changed:
+        reconciliation.event_index = EventIndex(reconciliation.events, metrics)
+    return reconciliation
 
-    if 'COMPONENTS' in updates_dict:
-        comps_dict = updates_dict['COMPONENTS']
-        new_comps = create_components(components_dict=comps_dict)
 
-    if 'EVENTS' in updates_dict:
-        evs_dict = updates_dict['EVENTS']
-        new_events = create_events(all_components, events_list=evs_dict)
+class ClientUpdateWatcher(object):
+    """
+    Keeps an eye on the web-app's updates file from a background thread, so the control loop never stalls on
+    reading or parsing it. Unchanged files cost a stat():
+        - same mtime and size as last time: nothing to do
+        - otherwise the file gets read and hashed, same hash as last time: still nothing to do
+        - otherwise it gets parsed and validated, and the result is held until the loop picks it up with poll()
+    Given a prepare function, the result is whatever that makes of the updates, so building Components and Events
+    (and finding out they can't be built) happens here rather than on the loop
+    """
 
-    return new_comps, new_events
+    def __init__(self, filename=CLIENT_UPDATES_FILE, on_ready=None, prepare=None, discard=None):
+        """
+        :param filename: path to the updates file
+        :type filename: str
+        :param on_ready: called with no arguments, from the watcher thread, whenever new updates are waiting
+        :param prepare: called with the updates dict, from the watcher thread, returns what poll() hands out
+                        anything it raises means the updates get ignored
+        :param discard: called with a prepared result which got replaced before anybody polled it
+        """
+        self.filename = filename
+        self.on_ready = on_ready
+        self.prepare = prepare
+        self.discard = discard
+
+        self._stat = None
+        self._digest = None
+
+        self._lock = threading.Lock()
+        self._ready = None
+        self._ready_event = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def check(self):
+        """
+        Looks at the file once
+        :return: whether there are new updates waiting
+        :rtype: bool
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+
+        stat_key = (stat.st_mtime, stat.st_size)
+        if stat_key == self._stat:
+            return False
+        self._stat = stat_key
+
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == self._digest:
+            return False
+
+        # remember the hash even if the contents are no good, so a broken file only gets complained about once
+        self._digest = digest
+
+        if not data.strip():
+            return False
+
+        try:
+            updates = json.loads(data.decode('utf-8'))
+            _validate_client_updates(updates)
+            if self.prepare is not None:
+                updates = self.prepare(updates)
+        except Exception as e:
+            print('Ignoring bad client updates in ' + self.filename + ': ' + str(e))
+            return False
+
+        with self._lock:
+            replaced = self._ready
+            self._ready = updates
+        self._ready_event.set()
+        if replaced is not None and self.discard is not None:
+            self.discard(replaced)
+
+        if self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def poll(self):
+        """
+        Takes the latest parsed updates, if there are any. Doesn't block
+        :return: the updates dict, or what prepare made of it, or None
+        """
+        with self._lock:
+            updates_dict = self._ready
+            self._ready = None
+            self._ready_event.clear()
+        return updates_dict
+
+    def wait(self, timeout=None):
+        """
+        Blocks until there are updates to take (or timeout seconds go by), then takes them
+        :rtype: dict
+        """
+        self._ready_event.wait(timeout)
+        return self.poll()
+
+    def retry(self):
+        """
+        Has the file read and prepared again on the next check, even if it hasn't changed
+        For when a prepared result is out of date by the time it's polled
+        """
+        self._stat = None
+        self._digest = None
+
+    def start(self, period):
+        """
+        Starts checking the file every period seconds on a background thread
+        :type period: float
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(period,), name='ClientUpdateWatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, period):
+        while self._running:
+            try:
+                self.check()
+            except Exception as e:
+                print('Could not check client updates: ' + str(e))
+            time.sleep(period)
 
 
 def save_definition(current_comps=None, current_events=None):
@@ -123,22 +328,26 @@ def save_definition(current_comps=None, current_events=None):
     Save the master file, definitions.json
     ** This function overwrites everything in definitions.json
     ** Make sure you give all necessary information, lest your progress be lost forever
-    :type current_comps: list[Component]
+    :type current_comps: ComponentRegistry
     :type current_events: list[Event]
     """
     comp_definitions = _create_components_definition(current_comps)
     event_definitions = _create_events_definition(current_events)
-    definition_dict = {'EVENTS': event_definitions, 'COMPONENTS': comp_definitions}
-    _save_dict('definitions.json', definition_dict)
+    definition_json_str = '{"EVENTS":' + event_definitions + ',"COMPONENTS":' + comp_definitions + '}'
+    _save_json_str('definitions.json', definition_json_str, DEFINITION_WRITE_WINDOW)
+
+    # if only one of these makes it to disk, the hashes won't match and the next boot goes by the JSON
+    _save_snapshot(Snapshot.digest(definition_json_str.encode('utf-8')), current_comps, current_events,
+                   DEFINITION_WRITE_WINDOW)
 
 
 def send_client_components(current_comps):
     """
     Saves components to current_components.json for use by web-app
-    :type current_comps: list[Component]
+    :type current_comps: ComponentRegistry
     """
     comp_definitions = _create_components_definition(current_comps)
-    _save_dict('current_components.json', comp_definitions)
+    _save_json_str('current_components.json', comp_definitions, 0)
 
 
 def send_client_events(current_events):
@@ -148,18 +357,30 @@ def send_client_events(current_events):
     :return:
     """
     event_definitions = _create_events_definition(current_events)
-    _save_dict('current_events.json', event_definitions)
+    _save_json_str('current_events.json', event_definitions, 0)
 
 
 def save_live_feed(all_components):
     """
     Saves components' display data to live_feed.json for web-app
-    :type all_components: list[Component]
-    """
-    live_feed_dict = {}
-    for component in all_components:
-        c_type, display_dict = component.get_display()
-        if c_type not in live_feed_dict:
-            live_feed_dict[c_type] = []
-        live_feed_dict[c_type].append(display_dict)
-    _save_dict('live_feed.json', live_feed_dict)
+    :type all_components: ComponentRegistry
+    """
+    live_feed_json_str = _join_by_type(all_components, Component.get_display_json)
+    _save_json_str('live_feed.json', live_feed_json_str, 0)
+
+
+def save_metrics(report):
+    """
+    Saves the engine's instrumentation to metrics.json, unless nothing but VOLATILE_METRICS changed since last time
+    :param report: see Metrics.get_report()
+    :type report: dict
+    :return: whether it's being saved
+    :rtype: bool
+    """
+    global _last_metrics
+    steady = dict((key, value) for key, value in report.items() if key not in VOLATILE_METRICS)
+    if steady == _last_metrics:
+        return False
+    _last_metrics = steady
+    _save_dict('metrics.json', report, 0)
+    return True
@@ -0,0 +1,367 @@
+import os
+import time
+
+import Libraries
+from Sampler import FakeADC
+from SimulatedGPIO import SimulatedGPIO
+
+
+class Backend(object):
+    """
+    Everything Components need from the hardware:
+        gpio                        - module-like object with the RPi.GPIO interface
+        create_adc()                - object with read_adc(channel), like Adafruit_MCP3008.MCP3008
+        create_pwm(channel, freq)   - object with the RPi.GPIO.PWM interface
+        create_video_player(...)    - object with the omxplayer OMXPlayer interface
+        get_music_player()          - object with the pygame.mixer.music interface
+        load_sound(path)            - a decoded sound, like pygame.mixer.Sound
+        sound_bytes(sound)          - how much memory a decoded sound takes up
+        get_channel(index)          - a mixer channel, like pygame.mixer.Channel
+        PlayerDeadError             - raised by video players whose process has gone away
+    """
+
+    NAME = 'BACKEND'
+
+    class PlayerDeadError(Exception):
+        pass
+
+    gpio = None
+
+    def create_adc(self):
+        raise NotImplementedError
+
+    def create_pwm(self, channel, frequency):
+        """
+        :type channel: int
+        :param frequency: in Hz
+        """
+        return self.gpio.PWM(channel, frequency)
+
+    def create_video_player(self, source, args):
+        """
+        Creates a player which starts playing source straight away
+        :param source: path or url of the video
+        :type source: str
+        :param args: command line arguments for the player
+        :type args: list[str]
+        """
+        raise NotImplementedError
+
+    def get_music_player(self):
+        raise NotImplementedError
+
+    def load_sound(self, path):
+        """
+        Reads and decodes a whole audio file into memory
+        :type path: str
+        """
+        raise NotImplementedError
+
+    def sound_bytes(self, sound):
+        """
+        :param sound: something load_sound() returned
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def get_channel(self, index):
+        """
+        :param index: which mixer channel, there are as many as are asked for
+        :type index: int
+        """
+        raise NotImplementedError
+
+
+class PiBackend(Backend):
+    """
+    The real deal: RPi.GPIO, an MCP3008 over SPI, OMXPlayer and pygame
+    Each library gets imported (and initialized) the first time a Component needs it, so a setup without
+    audio, video or analog inputs never pays for loading them, see Libraries
+    """
+
+    NAME = 'PI'
+
+    # the library which decides whether this is a Pi at all, see get_backend()
+    REQUIRED_LIBRARY = 'RPi.GPIO'
+
+    @property
+    def gpio(self):
+        # https://sourceforge.net/p/raspberry-gpio-python/wiki/Home/
+        # pip install RPi.GPIO
+        # I think only one instance of RPi.GPIO can be instantiated per machine
+        # so make sure you don't have another script running this if you get errors
+        try:
+            # pin numbers throughout are BCM numbers
+            return Libraries.load('RPi.GPIO', lambda GPIO: GPIO.setmode(GPIO.BCM))
+        except RuntimeError:
+            print('Error importing RPi.GPIO!  ' +
+                  'This is probably because you need superuser privileges.' +
+                  'You can achieve this by using \'sudo\' to run your script')
+            raise
+
+    @property
+    def mcp3008(self):
+        # https://github.com/adafruit/Adafruit_Python_MCP3008
+        # sudo pip install adafruit-mcp3008
+        return Libraries.load('Adafruit_MCP3008')
+
+    @property
+    def omx_player(self):
+        # http://python-omxplayer-wrapper.readthedocs.io/en/latest/
+        # pip install omxplayer-wrapper
+        return Libraries.load('omxplayer.player').OMXPlayer
+
+    @property
+    def PlayerDeadError(self):
+        return Libraries.load('omxplayer.player').OMXPlayerDeadError
+
+    @property
+    def pygame(self):
+        # should come pre-installed on RPi
+        # only the mixer gets initialized, the rest of pygame (display, joysticks...) isn't used
+        return Libraries.load('pygame', lambda pygame: pygame.mixer.init())
+
+    def create_adc(self):
+        return self.mcp3008.MCP3008(clk=2, cs=3, miso=17, mosi=4)
+
+    def create_video_player(self, source, args):
+        return self.omx_player(source, args)
+
+    def get_music_player(self):
+        return self.pygame.mixer.music
+
+    def load_sound(self, path):
+        return self.pygame.mixer.Sound(path)
+
+    def sound_bytes(self, sound):
+        # mixer format is bits per sample, negative for signed
+        frequency, size, channels = self.pygame.mixer.get_init()
+        return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+    def get_channel(self, index):
+        mixer = self.pygame.mixer
+        if mixer.get_num_channels() <= index:
+            mixer.set_num_channels(index + 1)
+        return mixer.Channel(index)
+
+
+class SimulatedVideoPlayer(object):
+    """
+    Stand-in for OMXPlayer. Plays for duration seconds, then reports that it has stopped
+    With exit_at_end it goes away at the end instead, like OMXPlayer does, and raises PlayerDeadError from then on
+    """
+
+    def __init__(self, source, args=None, duration=10.0, latency=0.0, exit_at_end=False):
+        time.sleep(latency)
+        self.source = source
+        self.args = args
+        self.duration = duration
+        self.latency = latency
+        self.exit_at_end = exit_at_end
+        self.position = 0.0
+        self.started = time.time()
+        self.paused = False
+        self.stopped = False
+        self.visible = True
+        self.quit_called = False
+
+    def _check_alive(self):
+        if self.quit_called or (self.exit_at_end and self.position_now() >= self.duration):
+            raise Backend.PlayerDeadError('player has quit')
+
+    def get_source(self):
+        self._check_alive()
+        return self.source
+
+    def load(self, source, pause=False):
+        self._check_alive()
+        time.sleep(self.latency)
+        self.source = source
+        self.stopped = False
+        self.paused = False
+        self.set_position(0.0)
+        if pause:
+            self.pause()
+
+    def position_now(self):
+        if self.paused or self.stopped:
+            return self.position
+        return self.position + time.time() - self.started
+
+    def is_playing(self):
+        self._check_alive()
+        return not self.paused and not self.stopped and self.position_now() < self.duration
+
+    def play(self):
+        self._check_alive()
+        if self.paused or self.stopped:
+            self.started = time.time()
+        self.paused = False
+        self.stopped = False
+
+    def pause(self):
+        self._check_alive()
+        self.position = self.position_now()
+        self.paused = True
+
+    def set_position(self, position):
+        self._check_alive()
+        self.position = position
+        self.started = time.time()
+
+    def hide_video(self):
+        self.visible = False
+
+    def show_video(self):
+        self.visible = True
+
+    def stop(self):
+        self.position = 0.0
+        self.stopped = True
+
+    def quit(self):
+        self.stop()
+        self.quit_called = True
+
+
+class SimulatedMusicPlayer(object):
+    """
+    Stand-in for pygame.mixer.music
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.track = None
+        self.playing = False
+
+    def load(self, track):
+        time.sleep(self.latency)
+        self.track = track
+
+    def play(self, loops=0):
+        self.playing = self.track is not None
+
+    def stop(self):
+        self.playing = False
+
+    def get_busy(self):
+        return self.playing
+
+
+class SimulatedSound(object):
+    """
+    Stand-in for pygame.mixer.Sound
+    """
+
+    # 44.1 kHz, 16 bit stereo, like the mixer's default
+    BYTES_PER_SECOND = 44100 * 2 * 2
+
+    def __init__(self, path, length=1.0, latency=0.0):
+        time.sleep(latency)
+        self.path = path
+        self.length = length
+
+    def get_length(self):
+        return self.length
+
+
+class SimulatedChannel(object):
+    """
+    Stand-in for pygame.mixer.Channel
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.sound = None
+        self.started = 0.0
+
+    def play(self, sound, loops=0):
+        self.sound = sound
+        self.started = time.time()
+
+    def stop(self):
+        self.sound = None
+
+    def get_sound(self):
+        return self.sound if self.get_busy() else None
+
+    def get_busy(self):
+        return self.sound is not None and time.time() - self.started < self.sound.get_length()
+
+
+class SimulatedBackend(Backend):
+    """
+    Everything in-process, for running the engine on an ordinary computer
+    Every hardware operation can be given an artificial latency, to get a feel for how the engine copes with slow I/O
+    """
+
+    NAME = 'SIMULATED'
+
+    def __init__(self, latency=0.0, adc_values=None):
+        """
+        :param latency: seconds added to every simulated hardware operation
+        :type latency: float
+        :param adc_values: channel -> value for the simulated ADC
+        :type adc_values: dict
+        """
+        self.latency = latency
+        self.gpio = SimulatedGPIO(latency=latency)
+        self.adc = FakeADC(values=adc_values, latency=latency)
+        self.music_player = SimulatedMusicPlayer(latency=latency)
+        self.video_players = []
+        self.channels = {}
+
+    def create_adc(self):
+        # one chip, however many times it gets asked for
+        return self.adc
+
+    def create_video_player(self, source, args):
+        player = SimulatedVideoPlayer(source, args, latency=self.latency)
+        self.video_players.append(player)
+        return player
+
+    def get_music_player(self):
+        return self.music_player
+
+    def load_sound(self, path):
+        return SimulatedSound(path, latency=self.latency)
+
+    def sound_bytes(self, sound):
+        return int(sound.get_length() * SimulatedSound.BYTES_PER_SECOND)
+
+    def get_channel(self, index):
+        if index not in self.channels:
+            self.channels[index] = SimulatedChannel(index)
+        return self.channels[index]
+
+
+_backend = None
+
+
+def set_backend(backend):
+    """
+    Picks the backend Components get created with
+    Switch before creating any Components, existing ones hang on to the backend they were made with
+    :type backend: Backend
+    """
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    """
+    The current backend. Chosen the first time around by the PILC_BACKEND environment variable ('pi' or 'simulated'),
+    otherwise the Pi backend if RPi.GPIO is installed, otherwise the simulated one
+    :rtype: Backend
+    """
+    global _backend
+    if _backend is None:
+        choice = os.environ.get('PILC_BACKEND', '').lower()
+        if choice == 'simulated':
+            _backend = SimulatedBackend()
+        elif choice == 'pi' or Libraries.available(PiBackend.REQUIRED_LIBRARY):
+            _backend = PiBackend()
+        else:
+            print(PiBackend.REQUIRED_LIBRARY + ' unavailable, using the simulated backend')
+            _backend = SimulatedBackend()
+    return _backend
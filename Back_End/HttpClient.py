@@ -0,0 +1,157 @@
+import threading
+import time
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+import Libraries
+
+# seconds to wait on a server before giving up
+REQUEST_TIMEOUT = 5.0
+
+# responses younger than this (in seconds) are served straight from the cache
+CACHE_TTL = 1.0
+
+# kept-alive connections per host
+POOL_SIZE = 4
+
+
+class CachedResponse(object):
+    def __init__(self, text, etag, last_modified):
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.time()
+
+
+class HttpClient(object):
+    """
+    Shared HTTP client for URIComponents
+        - one requests.Session per host for each thread, so connections (and TLS sessions) get kept alive and reused.
+          requests doesn't promise a Session is safe to share between threads, so they each keep their own
+        - every request has a timeout
+        - GET responses are cached for CACHE_TTL seconds, and after that revalidated with
+          If-None-Match / If-Modified-Since, so an unchanged resource costs a 304 and no body
+        - callers get the decoded body text
+    Safe to use from several threads at once
+    """
+
+    def __init__(self, timeout=REQUEST_TIMEOUT, ttl=CACHE_TTL, pool_size=POOL_SIZE):
+        """
+        :param timeout: seconds to wait on a server
+        :type timeout: float
+        :param ttl: seconds a cached response is used without asking the server
+        :type ttl: float
+        :param pool_size: connections kept alive per host
+        :type pool_size: int
+        """
+        self.timeout = timeout
+        self.ttl = ttl
+        self.pool_size = pool_size
+
+        # guards the cache, the counters and hosts
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.hosts = set()
+
+        # each thread's host -> requests.Session
+        self._local = threading.local()
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.not_modified = 0
+
+    def _session(self, url):
+        """
+        This thread's Session for url's host
+        """
+        host = urlparse(url).netloc
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        session = sessions.get(host)
+        if session is None:
+            # requests takes a while to import, so it waits until somebody actually makes a request
+            requests = Libraries.load('requests')
+            adapters = Libraries.load('requests.adapters')
+            session = requests.Session()
+            adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            sessions[host] = session
+            with self._lock:
+                self.hosts.add(host)
+        return session
+
+    def get(self, url):
+        """
+        :type url: str
+        :return: the body of the response, decoded
+        :rtype: str
+        :raises requests.RequestException: if the request fails or the server answers with an error
+        """
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None and time.time() - cached.fetched < self.ttl:
+                self.cache_hits += 1
+                return cached.text
+            self.requests += 1
+
+        headers = {}
+        if cached is not None:
+            if cached.etag is not None:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified is not None:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = self._session(url).get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.not_modified += 1
+                cached.fetched = time.time()
+            return cached.text
+
+        response.raise_for_status()
+        cached = CachedResponse(response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        with self._lock:
+            self._cache[url] = cached
+        return cached.text
+
+    def post(self, url, data):
+        """
+        :type url: str
+        :param data: form data or body to send
+        :return: the body of the response, decoded
+        :rtype: str
+        :raises requests.RequestException: if the request fails or the server answers with an error
+        """
+        with self._lock:
+            self.requests += 1
+        response = self._session(url).post(url, data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        with self._lock:
+            return {'REQUESTS': self.requests, 'CACHE_HITS': self.cache_hits, 'NOT_MODIFIED': self.not_modified,
+                    'HOSTS': len(self.hosts)}
+
+
+_client = None
+
+
+def get_client():
+    """
+    The HttpClient shared by every URIComponent
+    :rtype: HttpClient
+    """
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
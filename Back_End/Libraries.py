@@ -0,0 +1,63 @@
+import importlib
+import threading
+
+from Scheduler import clock
+
+# (module name, seconds it took to import and initialize) in the order they were loaded
+_load_times = []
+_modules = {}
+_lock = threading.RLock()
+
+
+def available(name):
+    """
+    Whether a module could be imported, without importing it
+    :param name: e.g. 'RPi.GPIO', only the top level package gets looked for
+    :type name: str
+    :rtype: bool
+    """
+    top_level = name.split('.')[0]
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        import imp
+        try:
+            imp.find_module(top_level)
+            return True
+        except ImportError:
+            return False
+    return find_spec(top_level) is not None
+
+
+def load(name, initialize=None):
+    """
+    Imports a heavy library the first time something needs it, and keeps track of how long that took
+    :param name: module to import, e.g. 'omxplayer.player'
+    :type name: str
+    :param initialize: called with the module right after the first import, counted as part of loading it
+    :return: the module
+    :raises ImportError: if it isn't installed
+    """
+    module = _modules.get(name)
+    if module is not None:
+        return module
+
+    with _lock:
+        if name in _modules:
+            return _modules[name]
+        start = clock()
+        module = importlib.import_module(name)
+        if initialize is not None:
+            initialize(module)
+        _load_times.append((name, clock() - start))
+        _modules[name] = module
+    return module
+
+
+def get_report():
+    """
+    :return: seconds taken loading each library so far
+    :rtype: dict
+    """
+    with _lock:
+        return dict(_load_times)
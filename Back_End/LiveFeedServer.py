@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+# the web-app's json-server already has 3001
+LIVE_FEED_PORT = 3002
+
+# only browsers on the Pi itself by default, give '' to take connections from anywhere
+LIVE_FEED_HOST = '127.0.0.1'
+
+# pages allowed to read the feed from another origin, i.e. the web-app's dev server
+# '*' lets any page read it, which only makes sense along with a host that's not reachable from outside
+LIVE_FEED_ORIGINS = ('http://localhost:3000', 'http://127.0.0.1:3000')
+
+# no client gets more than one update per this many seconds, changes in between get merged
+MIN_PUSH_INTERVAL = 0.1
+
+# how often to send something down an idle connection, so proxies and browsers don't give up on it
+KEEPALIVE_PERIOD = 15.0
+
+
+def _group_by_type(displays):
+    """
+    Private function
+    Stitches display fragments together in the same shape as live_feed.json
+    :param displays: label -> (COMPONENT_TYPE, encoded display fragment)
+    :type displays: dict
+    :rtype: str
+    """
+    feed = {}
+    for c_type, fragment in displays.values():
+        if c_type not in feed:
+            feed[c_type] = []
+        feed[c_type].append(fragment)
+    return '{' + ','.join([json.dumps(c_type) + ':[' + ','.join(fragments) + ']'
+                           for c_type, fragments in feed.items()]) + '}'
+
+
+class LiveFeedClient(object):
+    """
+    One connected browser. Changes pile up here until the client is due its next push
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.snapshot = None
+        self.last_push = 0.0
+        self.closed = False
+
+    def send_snapshot(self, displays):
+        """
+        Replaces anything pending with a whole new picture of every Component
+        :param displays: label -> (COMPONENT_TYPE, encoded display fragment)
+        """
+        with self.condition:
+            self.snapshot = dict(displays)
+            self.pending = {}
+            self.condition.notify()
+
+    def send_changes(self, displays):
+        """
+        :param displays: label -> (COMPONENT_TYPE, encoded display fragment) for the Components that changed
+        """
+        with self.condition:
+            if self.snapshot is not None:
+                self.snapshot.update(displays)
+            else:
+                self.pending.update(displays)
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def take(self, timeout):
+        """
+        Waits until there's something to send and the client is due for it
+        :param timeout: longest time to wait, in seconds
+        :return: ('snapshot' or 'update', JSON in live_feed.json format), or None if there was nothing
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            while not self.closed:
+                now = time.time()
+                if self.snapshot is not None or self.pending:
+                    wait_until = self.last_push + self.min_interval
+                    if now >= wait_until:
+                        break
+                else:
+                    wait_until = deadline
+                if now >= deadline:
+                    return None
+                self.condition.wait(min(wait_until, deadline) - now)
+
+            if self.closed:
+                return None
+
+            self.last_push = time.time()
+            if self.snapshot is not None:
+                kind, displays = 'snapshot', self.snapshot
+            else:
+                kind, displays = 'update', self.pending
+            self.snapshot = None
+            self.pending = {}
+
+        return kind, _group_by_type(displays)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LiveFeedServer(object):
+    """
+    Tiny HTTP server which streams component values to browsers with Server-Sent Events, as they change
+        GET /live_feed
+    A new connection starts off with a 'snapshot' event holding every Component (same format as live_feed.json),
+    after that come 'update' events with just the Components that changed, at most one per MIN_PUSH_INTERVAL
+
+    Only listens on the Pi itself unless it's given another host, see LIVE_FEED_HOST and LIVE_FEED_ORIGINS
+
+    In the browser:
+        var feed = new EventSource('http://localhost:3002/live_feed');
+        feed.addEventListener('update', function (e) { ... JSON.parse(e.data) ... });
+    """
+
+    PATH = '/live_feed'
+
+    def __init__(self, host=LIVE_FEED_HOST, port=LIVE_FEED_PORT, min_interval=MIN_PUSH_INTERVAL,
+                 allowed_origins=LIVE_FEED_ORIGINS):
+        """
+        :param host: interface to listen on, '' for all of them
+        :type host: str
+        :type port: int
+        :type min_interval: float
+        :param allowed_origins: origins whose pages may read the feed, see LIVE_FEED_ORIGINS
+        :type allowed_origins: tuple[str]
+        """
+        self.address = (host, port)
+        self.min_interval = min_interval
+        self.allowed_origins = allowed_origins
+
+        # label -> (COMPONENT_TYPE, encoded display fragment), the latest of everything
+        self.displays = {}
+        self.clients = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        feed = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                feed._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer(self.address, Handler)
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name='LiveFeedServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
+
+    def publish_snapshot(self, components):
+        """
+        Starts over with a whole new set of Components, e.g. after an update from the client
+        Must be called from the thread which owns the Components
+        :type components: ComponentRegistry
+        """
+        displays = {}
+        for component in components:
+            displays[component.get_label()] = (component.get_type(), component.get_display_json())
+
+        with self._lock:
+            self.displays = displays
+            clients = list(self.clients)
+        for client in clients:
+            client.send_snapshot(displays)
+
+    def publish(self, changed_components):
+        """
+        Sends out the latest values of Components which have changed
+        Must be called from the thread which owns the Components
+        :type changed_components: set[Component]
+        """
+        if not changed_components:
+            return
+
+        changes = {}
+        for component in changed_components:
+            display = (component.get_type(), component.get_display_json())
+            # already sent, e.g. published right after the effect that changed it
+            if self.displays.get(component.get_label()) != display:
+                changes[component.get_label()] = display
+        if not changes:
+            return
+
+        with self._lock:
+            self.displays.update(changes)
+            clients = list(self.clients)
+        for client in clients:
+            client.send_changes(changes)
+
+    def _handle(self, request):
+        if request.path.split('?')[0] != self.PATH:
+            request.send_error(404)
+            return
+
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/event-stream')
+        request.send_header('Cache-Control', 'no-cache')
+        origin = request.headers.get('Origin')
+        if '*' in self.allowed_origins:
+            request.send_header('Access-Control-Allow-Origin', '*')
+        elif origin in self.allowed_origins:
+            request.send_header('Access-Control-Allow-Origin', origin)
+            request.send_header('Vary', 'Origin')
+        request.end_headers()
+
+        client = LiveFeedClient(self.min_interval)
+        with self._lock:
+            client.send_snapshot(self.displays)
+            self.clients.append(client)
+
+        try:
+            while not client.closed:
+                message = client.take(KEEPALIVE_PERIOD)
+                if message is None:
+                    chunk = ': keepalive\n\n'
+                else:
+                    kind, data = message
+                    chunk = 'event: ' + kind + '\ndata: ' + data + '\n\n'
+                request.wfile.write(chunk.encode('utf-8'))
+                request.wfile.flush()
+        except (IOError, OSError):
+            # browser went away
+            pass
+        finally:
+            with self._lock:
+                if client in self.clients:
+                    self.clients.remove(client)
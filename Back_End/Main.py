@@ -1,14 +1,116 @@
+import os
 import time
+import traceback
+
+# everything from here to the first scan counts towards startup time, see report_startup()
+BOOT_STARTED = time.time()
 
 import FileHandler
+import Libraries
+from BatchEvaluator import create_batch_evaluator
+from Components import AnalogInput, DigitalInput, FileQueue, Timer, peek_dirty_components, pop_dirty_components
+from EffectPool import EffectPool
+from Events import (Effect, EventIndex, prune_code_cache, prune_event_timings, register_timer_thresholds,
+                    register_windowed_inputs)
+from LiveFeedServer import LiveFeedServer
+from Metrics import Metrics
+from ProcessImage import ProcessImage
+from Scheduler import Scheduler, clock
+from SoundBank import get_sound_bank
+
+IMPORTS_DONE = time.time()
+
+# how many times per second the ADC channels get sampled in the background
+ANALOG_SAMPLE_RATE = 1000
+
+# the sampler starts along with the first AnalogInput, which saves loading the ADC's library when there isn't one
+AnalogInput.use_sampler(rate=ANALOG_SAMPLE_RATE)
+
+scheduler = Scheduler()
+
+# where the scan time goes, see Metrics
+metrics = Metrics()
+scheduler.jitter.histogram = metrics.histogram('tick.jitter')
+
+
+def request_scan():
+    """
+    Gets a scan going right away rather than waiting for the next SCAN_PERIOD. Safe to call from any thread
+    """
+    scheduler.call_later(0, scan_events, label='EDGE_SCAN')
+
+
+# running Timers keep their next threshold in the scheduler's heap, and get a scan going when they cross it
+Timer.scheduler = scheduler
+Timer.on_threshold = request_scan
+
+# DigitalInputs queue up edges as they happen, so even a blip shorter than a scan gets seen
+DigitalInput.use_edge_detection(on_edge=request_scan)
+
+# slow effects (network, files) run on worker threads so they never hold up the scan
+effect_pool = EffectPool(on_complete=request_scan)
+effect_pool.start()
+Effect.pool = effect_pool
+Effect.metrics = metrics
+
+# FileQueue read cursors get saved along with everything else, rather than a write per message
+FileQueue.cursor_writer = FileHandler.file_writer
+
+# how often to check for updates from the client
+UPDATE_PERIOD = 2
+
+# nothing's running until the definitions are loaded
+all_components = None
+all_events = None
+
+
+def prepare_updates(updates):
+    """
+    Builds everything the client's updates need, on the watcher's thread, against whatever's running right then
+    """
+    return FileHandler.prepare_client_updates(all_components, all_events, updates, metrics)
+
+
+def take_updates(reconciliation):
+    """
+    Swaps in a rule set the watcher prepared, unless what's running changed since it was worked out
+    :type reconciliation: Reconciliation
+    :return: whether it went in
+    :rtype: bool
+    """
+    global all_components, all_events
+
+    if not reconciliation.is_current(all_components, all_events):
+        reconciliation.discard()
+        update_watcher.retry()
+        return False
+
+    try:
+        all_components, all_events = reconciliation.commit()
+    except Exception as e:
+        # commit() has already put everything back the way it was
+        print('Could not apply client updates, carrying on as before: ' + str(e))
+        traceback.print_exc()
+        return False
+    return True
 
-# start off by getting saved data
-all_components = FileHandler.load_components_definition()
-all_events = FileHandler.load_events_definition(all_components)
+
+# reads the client's updates and builds Components and Events from them on its own thread,
+# the loop just swaps in the results
+update_watcher = FileHandler.ClientUpdateWatcher(prepare=prepare_updates, discard=lambda ready: ready.discard())
+update_watcher.start(UPDATE_PERIOD)
+
+# start off by getting saved data, straight from the snapshot if definitions.json hasn't changed since it was made
+all_components, all_events = FileHandler.load_definition()
 
 # or wait for the first data from the client
 while all_components is None or all_events is None:
-    all_components, all_events = FileHandler.load_client_updates(all_components)
+    prepared = update_watcher.wait()
+    if prepared is not None:
+        take_updates(prepared)
+
+# SimpleAudioPlayers have decoded their sounds by now, see how much memory that took
+print('Sound bank: ' + str(get_sound_bank().get_report()))
 
 # live_feed.json, current_components.json, and current_events.json are all temp files
 # they must be loaded when Main begins
@@ -16,59 +118,159 @@ FileHandler.save_live_feed(all_components)
 FileHandler.send_client_components(all_components)
 FileHandler.send_client_events(all_events)
 
-# timer for next update
-next_update = 0.0
-UPDATE_PERIOD = 2
+# browsers get component values pushed to them as they change
+live_feed_server = LiveFeedServer()
+live_feed_server.publish_snapshot(all_components)
+live_feed_server.start()
+
+# keeps track of which events need evaluating each tick
+event_index = EventIndex(all_events, metrics)
+register_timer_thresholds(all_components, all_events)
+register_windowed_inputs(all_components, all_events)
+
+# numeric checks all get done in one go with NumPy, or None if it isn't installed
+batch_evaluator = create_batch_evaluator(all_events)
+
+# whatever the snapshot brought along that these Events don't use
+prune_code_cache(all_events)
+
+# snapshot of all of the inputs and outputs for each scan
+process_image = ProcessImage(all_components)
+
+# how often to write live_feed.json
+# it's only a fallback for clients polling through json-server, LiveFeedServer streams changes as they happen
+LIVE_FEED_PERIOD = 60
+
+# how often pending file writes get checked on, each file has its own coalescing window on top of this
+WRITE_PERIOD = 0.5
+
+# saves go to disk from the writer's own thread, fsyncs and all, so they never hold up a scan
+FileHandler.file_writer.histogram = metrics.histogram('file.write')
+FileHandler.file_writer.start(WRITE_PERIOD)
+
+# how often to report on flash wear
+WEAR_REPORT_PERIOD = 3600
 
-# timer for next live_feed write
-next_live_feed = 0.0
-LIVE_FEED_PERIOD = 1
+# how often to write metrics.json, only done when the PILC_METRICS environment variable is set
+# it's for working out where scan time goes, not something to wear the SD card out with all day
+METRICS_PERIOD = 600
+EXPORT_METRICS = bool(os.environ.get('PILC_METRICS'))
 
-# how fast the loop should run
-LOOP_PERIOD = 0.1
+# how often the events get evaluated
+# the scheduler sleeps right up until something is due, so this can be small without pinning the processor
+SCAN_PERIOD = 0.01
 
 
-while True:
-    # Start off by handling timed file management
-    if next_update < time.time():
-        new_components, new_events = FileHandler.load_client_updates(all_components)
+def sync_files():
+    """
+    Picks up changes from the client, once the watcher has them built and ready
+    """
+    global event_index, batch_evaluator, process_image
 
-        new_c = new_components is not None
-        new_e = new_events is not None
+    prepared = update_watcher.poll()
+    if prepared is None or not take_updates(prepared):
+        return
 
-        # make sure the client-facing files always have the latest and greatest
-        if new_c:
-            all_components = new_components
-            FileHandler.send_client_components(all_components)
-        if new_e:
-            all_events = new_events
-            FileHandler.send_client_events(all_events)
+    # only what changed got rebuilt, everything else carries on untouched
+    new_c = prepared.components_changed
+    new_e = prepared.events_changed
 
-        # only save definitions if there's something new
-        # otherwise, frequent writes will jack up the SD card
-        if new_c or new_e:
-            FileHandler.save_definition(all_components, all_events)
+    # make sure the client-facing files always have the latest and greatest
+    if new_c:
+        process_image.detach()
+        process_image = ProcessImage(all_components)
+        live_feed_server.publish_snapshot(all_components)
+        FileHandler.send_client_components(all_components)
+    if new_e:
+        event_index = prepared.event_index or EventIndex(all_events, metrics)
+        batch_evaluator = create_batch_evaluator(all_events)
+        prune_code_cache(all_events)
+        prune_event_timings(metrics, all_events)
+        FileHandler.send_client_events(all_events)
 
-        next_update = time.time() + UPDATE_PERIOD
+    # only save definitions if there's something new
+    # otherwise, frequent writes will jack up the SD card
+    if new_c or new_e:
+        register_timer_thresholds(all_components, all_events)
+        register_windowed_inputs(all_components, all_events)
+        FileHandler.save_definition(all_components, all_events)
 
-    if next_live_feed < time.time():
-        FileHandler.save_live_feed(all_components)
-        next_live_feed = time.time() + LIVE_FEED_PERIOD
 
-    # And now, for the event you've all been waiting for!
-    # This is where stuff actually happens
+def live_feed():
+    FileHandler.save_live_feed(all_components)
+
+
+def report_wear():
+    print('File writes: ' + str(FileHandler.file_writer.get_report()))
+
+
+def report_startup():
+    """
+    How long it took to get scanning, and which hardware and media libraries that took loading
+    """
+    print('Imports took ' + str(round(IMPORTS_DONE - BOOT_STARTED, 3)) + 's, first scan after ' +
+          str(round(time.time() - BOOT_STARTED, 3)) + 's')
+    print('Libraries loaded: ' + str(Libraries.get_report()))
+
+
+def export_metrics():
+    report = metrics.get_report(all_events)
+    report['FILE_WRITES'] = FileHandler.file_writer.get_report()
+    report['EFFECT_POOL'] = effect_pool.get_report()
+    report['SOUND_BANK'] = get_sound_bank().get_report()
+    FileHandler.save_metrics(report)
+
+
+def scan_events():
+    """
+    And now, for the event you've all been waiting for!
+    This is where stuff actually happens
+    """
+    start = clock()
     try:
-        for event in all_events:
-            event.evaluate()
+        # read every input once, evaluate against that snapshot, then write every output once
+        # only events whose components changed (or which are still firing) get evaluated
+        process_image.read_inputs()
+        # whatever the slow effects came back with gets set, and looked at, this scan
+        for result in effect_pool.collect():
+            if result.status != result.REJECTED:
+                metrics.record('effect.' + result.component.get_type(), result.duration)
+            if result.status != result.DONE:
+                print('Effect ' + str(result))
+
+        changed = pop_dirty_components()
+        if batch_evaluator is not None:
+            batch_evaluator.evaluate(changed)
+        event_index.evaluate(changed)
+        process_image.flush_outputs()
+        # what the effects just did goes out now too, it stays dirty so its Events get a look next scan
+        live_feed_server.publish(changed | peek_dirty_components())
 
     # there may not have been any events in the file, so we got to wait
     except TypeError:
         pass
     except Exception as e:
-        with open('error_log.txt', 'w') as f:
-            err = 'Something went wrong while evaluating events.\n'
-            err += e.message
+        # keep every crash, not just the latest one
+        with open('error_log.txt', 'a') as f:
+            err = time.strftime('%Y-%m-%d %H:%M:%S') + ' Something went wrong while evaluating events.\n'
+            err += str(e) + '\n' + traceback.format_exc() + '\n'
             f.write(err)
-        raise e
+        raise
+    finally:
+        metrics.record('tick.duration', clock() - start)
+
+
+# the watcher lets us know when there's something to sync, no need to keep checking
+timed_sync_files = metrics.timed('file.sync', sync_files)
+update_watcher.on_ready = lambda: scheduler.call_later(0, timed_sync_files, label='FILE_SYNC')
+
+# and catch anything which came in while we were starting up
+scheduler.call_later(0, timed_sync_files, label='FILE_SYNC')
+scheduler.call_every(LIVE_FEED_PERIOD, metrics.timed('file.live_feed', live_feed), label='LIVE_FEED')
+scheduler.call_every(WEAR_REPORT_PERIOD, report_wear, label='WEAR_REPORT', delay=WEAR_REPORT_PERIOD)
+if EXPORT_METRICS:
+    scheduler.call_every(METRICS_PERIOD, export_metrics, label='METRICS', delay=METRICS_PERIOD)
+scheduler.call_every(SCAN_PERIOD, scan_events, label='EVENT_SCAN')
+scheduler.call_later(0, report_startup, label='STARTUP_REPORT')
 
-    time.sleep(LOOP_PERIOD)
+scheduler.run_forever()
@@ -0,0 +1,123 @@
+import threading
+import time
+
+
+class MediaCommandQueue(object):
+    """
+    Commands for one media player, carried out on a thread of its own so the scan loop never waits on media
+        - submit() never blocks and never drops anything, it just records what the player should end up doing
+        - only the latest intent matters: play -> stop -> play collapses into one play,
+          and a command identical to the one already waiting is merged into it
+        - players which can't take commands too quickly say how long until they're ready, the latest command
+          is carried out as soon as they are, instead of being ignored
+    """
+
+    def __init__(self, name, execute, ready_in=None):
+        """
+        :param name: for the thread, and reporting
+        :type name: str
+        :param execute: called from the worker thread with a command and the time it was first submitted,
+                        returns False if the player turned out not to be ready, and the command should wait
+        :param ready_in: returns how many seconds until the player can take the next command, 0 when it can
+        """
+        self.name = name
+        self.execute = execute
+        self.ready_in = ready_in
+
+        self._condition = threading.Condition()
+
+        # (command, time the oldest command it replaced was submitted), or None
+        self._pending = None
+        self._running = False
+        self._thread = None
+
+        self.submitted = 0
+        self.collapsed = 0
+        self.executed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='MediaCommands-' + self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the worker, anything still waiting is dropped
+        """
+        with self._condition:
+            self._running = False
+            self._pending = None
+            self._condition.notify()
+
+    def submit(self, command):
+        """
+        :param command: name of the player method to carry out, e.g. 'play'
+        :type command: str
+        """
+        with self._condition:
+            self.submitted += 1
+            if self._pending is None:
+                self._pending = (command, time.time())
+            else:
+                # whatever was waiting is superseded, but the wait counts from when it first came in
+                self.collapsed += 1
+                self._pending = (command, self._pending[1])
+            self._condition.notify()
+
+    def depth(self):
+        """
+        :return: commands waiting to be carried out, after collapsing
+        :rtype: int
+        """
+        with self._condition:
+            return 0 if self._pending is None else 1
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+                delay = self.ready_in() if self.ready_in is not None else 0
+                if delay > 0:
+                    # a newer command may turn up in the meantime, it'll replace this one
+                    self._condition.wait(delay)
+                    continue
+
+                pending = self._pending
+                self._pending = None
+
+            command, submitted = pending
+            try:
+                done = self.execute(command, submitted) is not False
+            except Exception as e:
+                print('Media command ' + self.name + '.' + command + ' failed: ' + str(e))
+                done = True
+
+            with self._condition:
+                if not done:
+                    if self._pending is None:
+                        self._pending = pending
+                    continue
+                latency = time.time() - submitted
+                self.executed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        with self._condition:
+            mean_latency = self.total_latency / self.executed if self.executed else 0.0
+            return {'DEPTH': 0 if self._pending is None else 1, 'SUBMITTED': self.submitted,
+                    'COLLAPSED': self.collapsed, 'EXECUTED': self.executed,
+                    'MEAN_LATENCY': mean_latency, 'MAX_LATENCY': self.max_latency}
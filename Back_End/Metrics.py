@@ -0,0 +1,189 @@
+import threading
+
+from Scheduler import clock
+
+# each power of two gets 2 ** SUB_BUCKET_BITS buckets, which keeps every value within about 6%
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# values are kept in microseconds, anything from 1 us up to about 2 ** (MAX_SHIFT + 5) us (a couple of days) fits
+MAX_SHIFT = 32
+BUCKET_COUNT = (MAX_SHIFT + 2) * SUB_BUCKETS
+
+# percentiles every histogram reports
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _bucket_index(micros):
+    """
+    Private function
+    HDR-style log-linear bucketing: exact below SUB_BUCKETS, then SUB_BUCKETS even steps per power of two
+    :type micros: int
+    :rtype: int
+    """
+    if micros < SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    if shift > MAX_SHIFT:
+        return BUCKET_COUNT - 1
+    return (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+
+def _bucket_top(index):
+    """
+    Private function
+    :return: the largest value (in microseconds) which lands in bucket index
+    :rtype: int
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram(object):
+    """
+    Fixed-size histogram of durations. Recording is a handful of integer operations and never allocates,
+    so it can sit on the scan loop. Percentiles come out rounded up to the top of their bucket
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """
+        :type seconds: float
+        """
+        micros = int(seconds * 1000000)
+        if micros < 0:
+            micros = 0
+        self.counts[_bucket_index(micros)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+        :param percent: e.g. 99 for the 99th percentile
+        :type percent: float
+        :return: in seconds
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        target = self.count * percent / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= target:
+                return min(_bucket_top(index) / 1000000.0, self.max)
+        return self.max
+
+    def get_report(self):
+        """
+        Summary in seconds
+        :rtype: dict
+        """
+        report = {'COUNT': self.count, 'MEAN': self.total / self.count if self.count else 0.0, 'MAX': self.max}
+        for percent in PERCENTILES:
+            report['P' + str(percent).replace('.', '_')] = self.percentile(percent)
+        return report
+
+    def reset(self):
+        self.__init__()
+
+
+class Metrics(object):
+    """
+    Named histograms of how long things take, for working out where scan time goes:
+        event.<label>.evaluate  - each Event's evaluate(), see EventIndex
+        effect.<COMPONENT_TYPE> - each effect action, whether it ran inline or on the EffectPool
+        tick.duration           - each scan
+        tick.jitter             - how late the Scheduler ran its tasks
+        file.*                  - file syncing and writing
+    get_report() puts them all together, along with each Event's condition hit rate
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.started = clock()
+
+    def histogram(self, name):
+        """
+        The histogram called name, made on first use. Hang on to it to skip the lookup next time
+        :type name: str
+        :rtype: Histogram
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def prune(self, prefix, keep):
+        """
+        Drops the histograms whose name starts with prefix, apart from those in keep,
+        so histograms for things which are gone don't hang around
+        :type prefix: str
+        :param keep: names to hold on to
+        :type keep: list[str]
+        """
+        keep = set(keep)
+        with self._lock:
+            for name in list(self.histograms):
+                if name.startswith(prefix) and name not in keep:
+                    del self.histograms[name]
+
+    def record(self, name, seconds):
+        """
+        :type name: str
+        :type seconds: float
+        """
+        self.histogram(name).record(seconds)
+
+    def timed(self, name, function):
+        """
+        Wraps function so every call gets recorded under name
+        :type name: str
+        :return: the wrapped function
+        """
+        histogram = self.histogram(name)
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.record(clock() - start)
+        return timed_function
+
+    def get_report(self, events=None):
+        """
+        :param events: Events whose condition hit rates to include
+        :type events: list[Event]
+        :rtype: dict
+        """
+        with self._lock:
+            histograms = dict(self.histograms)
+        report = {'UPTIME': clock() - self.started,
+                  'HISTOGRAMS': dict([(name, histogram.get_report()) for name, histogram in histograms.items()])}
+
+        if events is not None:
+            hit_rates = {}
+            for event in events:
+                hit_rates[event.get_label()] = \
+                    {'EVALUATIONS': event.evaluations, 'HITS': event.hits,
+                     'HIT_RATE': float(event.hits) / event.evaluations if event.evaluations else 0.0}
+            report['EVENTS'] = hit_rates
+        return report
+
+    def reset(self):
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+            self.started = clock()
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+# how long a burst of changes to the same file gets to settle before it's written, in seconds
+COALESCE_WINDOW = 2.0
+
+# how far back bytes_per_hour() looks
+HOUR = 3600.0
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def write_atomic(filename, data):
+    """
+    Replaces filename with data by way of a temp file, fsync and rename, so a power cut leaves either the old file
+    or the new one, never half of each
+    :type filename: str
+    :type data: bytes
+    """
+    temp_name = filename + '.tmp'
+    with open(temp_name, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temp_name, filename)
+
+    # make sure the rename itself survives a power cut
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class FileWriter(object):
+    """
+    Gentle on the SD card:
+        - write() only queues the data. Further writes to the same file within its window replace it,
+          so a burst of changes turns into one write when flush() comes around
+        - data identical to what's already on disk doesn't get written at all
+        - writes are atomic: temp file, fsync, rename. A power cut leaves either the old file or the new one
+        - every byte written is counted, so flash wear can be budgeted
+    start() hands flushing to a background thread, so the fsyncs never hold up whoever is calling write()
+    """
+
+    def __init__(self, coalesce_window=COALESCE_WINDOW):
+        """
+        :param coalesce_window: default number of seconds to hold on to a write before it goes to disk
+        :type coalesce_window: float
+        """
+        self.coalesce_window = coalesce_window
+
+        # filename -> [data, time the first unwritten change came in, window]
+        self._pending = {}
+
+        # filename -> digest of what's on disk
+        self._digests = {}
+
+        # (time, bytes) for each write within the last hour
+        self._history = deque()
+
+        self._lock = threading.Lock()
+
+        # held while files go to disk, so the writer thread and write_now() take turns
+        self._write_lock = threading.Lock()
+
+        self._running = False
+        self._wake = threading.Event()
+        self._thread = None
+
+        # Histogram the writer thread records each flush's duration in, see Metrics
+        self.histogram = None
+
+        self.bytes_written = 0
+        self.writes = 0
+        self.skipped_identical = 0
+        self.coalesced = 0
+
+    def write(self, filename, data, window=None):
+        """
+        Queues data to be written to filename
+        :type filename: str
+        :param data: the whole new contents of the file, or a function taking no arguments which makes them.
+                     A function only gets called when the write is due, from whichever thread flushes,
+                     so a burst of changes only pays for making the data once
+        :type data: str
+        :param window: seconds to wait for more changes, None for the default window, 0 for the next flush()
+        :type window: float
+        """
+        if not isinstance(data, bytes) and not callable(data):
+            data = data.encode('utf-8')
+        if window is None:
+            window = self.coalesce_window
+
+        with self._lock:
+            if filename in self._pending:
+                # the earlier data never made it to disk, which is the whole point
+                pending = self._pending[filename]
+                pending[0] = data
+                pending[2] = min(pending[2], window)
+                self.coalesced += 1
+            else:
+                self._pending[filename] = [data, time.time(), window]
+
+    def flush(self, force=False):
+        """
+        Writes out everything whose window is up
+        :param force: write everything that's pending regardless of windows
+        :type force: bool
+        :return: how many files were written
+        :rtype: int
+        """
+        now = time.time()
+        due = []
+        with self._lock:
+            for filename, pending in list(self._pending.items()):
+                if force or now - pending[1] >= pending[2]:
+                    due.append((filename, pending))
+                    del self._pending[filename]
+
+        written = 0
+        with self._write_lock:
+            for filename, (data, requested, window) in due:
+                if callable(data):
+                    try:
+                        data = data()
+                    except ValueError as e:
+                        # nothing to write, the next change to the file queues it again
+                        print('Could not make ' + filename + ': ' + str(e))
+                        continue
+                    if not isinstance(data, bytes):
+                        data = data.encode('utf-8')
+                try:
+                    if self._write_if_changed(filename, data):
+                        written += 1
+                except (IOError, OSError) as e:
+                    # the other files still go, this one gets another go at the next flush
+                    print('Could not write ' + filename + ': ' + str(e))
+                    self._requeue(filename, data, requested, window)
+        return written
+
+    def _requeue(self, filename, data, requested, window):
+        """
+        Puts a write that failed back in the queue, unless newer data for the file came in meanwhile
+        """
+        with self._lock:
+            if filename not in self._pending:
+                self._pending[filename] = [data, requested, window]
+
+    def write_now(self, filename, data):
+        """
+        Writes data to filename straight away, replacing anything still waiting for that file
+        :type filename: str
+        :type data: str
+        :return: whether the file was written, False if it already held data
+        :rtype: bool
+        """
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        with self._lock:
+            self._pending.pop(filename, None)
+        with self._write_lock:
+            return self._write_if_changed(filename, data)
+
+    def pending(self):
+        """
+        :return: names of files with writes waiting
+        :rtype: list[str]
+        """
+        with self._lock:
+            return list(self._pending.keys())
+
+    def start(self, period):
+        """
+        Flushes every period seconds on a background thread
+        :type period: float
+        """
+        if self._running:
+            return
+        self._running = True
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, args=(period,), name='FileWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread, and writes out everything still pending
+        """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush(True)
+
+    def _run(self, period):
+        while self._running:
+            self._wake.wait(period)
+            start = time.time()
+            try:
+                self.flush()
+            except Exception as e:
+                # files that failed to write are back in the queue, see flush()
+                print('Could not write files: ' + str(e))
+            if self.histogram is not None:
+                self.histogram.record(time.time() - start)
+
+    def _write_if_changed(self, filename, data):
+        digest = _digest(data)
+
+        if filename not in self._digests:
+            # first time around, see what's already there so a restart doesn't rewrite identical files
+            try:
+                with open(filename, 'rb') as f:
+                    self._digests[filename] = _digest(f.read())
+            except (IOError, OSError):
+                self._digests[filename] = None
+
+        if self._digests[filename] == digest:
+            self.skipped_identical += 1
+            return False
+
+        self._write_atomic(filename, data)
+        self._digests[filename] = digest
+        self._record(len(data))
+        return True
+
+    @staticmethod
+    def _write_atomic(filename, data):
+        write_atomic(filename, data)
+
+    def _record(self, size):
+        now = time.time()
+        self.bytes_written += size
+        self.writes += 1
+        self._history.append((now, size))
+        while self._history and now - self._history[0][0] > HOUR:
+            self._history.popleft()
+
+    def bytes_per_hour(self):
+        """
+        :return: bytes written within the last hour
+        :rtype: int
+        """
+        now = time.time()
+        # a copy, the writer thread may be adding to it
+        return sum(size for written, size in list(self._history) if now - written <= HOUR)
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        return {'BYTES_LAST_HOUR': self.bytes_per_hour(),
+                'BYTES_TOTAL': self.bytes_written,
+                'WRITES': self.writes,
+                'SKIPPED_IDENTICAL': self.skipped_identical,
+                'COALESCED': self.coalesced}
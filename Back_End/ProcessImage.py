@@ -0,0 +1,114 @@
+from array import array
+
+# DigitalOutput levels get stored as small integer codes
+DIGITAL_OUTPUT_CODES = {'LOW': 0, 'HIGH': 1}
+
+
+class ProcessImage(object):
+    """
+    PLC-style process image. A scan cycle goes like this:
+        read_inputs()   - every input gets read from the hardware exactly once
+        (evaluate)      - Events only see the snapshot, so every check within a scan agrees on the values
+        flush_outputs() - every output write that was requested during evaluation goes out in one go
+
+    The input snapshot is each input Component's own value: while it has a process image, reading it doesn't
+    go back to the hardware. What was last written to the outputs lives in compact typed arrays,
+    indexed by each Component's image_slot:
+        digital_outputs - array('B') of DIGITAL_OUTPUT_CODES
+        pwm_outputs     - array('d') of duty cycles
+    FILE_QUEUEs hold strings, so they get no array, but they still pop their next message in the input phase
+    """
+
+    def __init__(self, components):
+        """
+        :param components: every Component in play, the ones that aren't I/O are ignored
+        :type components: list[Component]
+        """
+        self.numeric_components = []
+        self.digital_components = []
+        self.digital_output_components = []
+        self.pwm_components = []
+        self.queue_components = []
+
+        for component in components:
+            comp_type = component.COMPONENT_TYPE
+            if comp_type == 'ANALOG_INPUT' or comp_type == 'TIMER':
+                self._attach(component, self.numeric_components)
+            elif comp_type == 'DIGITAL_INPUT':
+                self._attach(component, self.digital_components)
+            elif comp_type == 'DIGITAL_OUTPUT':
+                self._attach(component, self.digital_output_components)
+            elif comp_type == 'PWM_OUTPUT':
+                self._attach(component, self.pwm_components)
+            elif comp_type == 'FILE_QUEUE':
+                self.queue_components.append(component)
+
+        self.digital_outputs = array('B', [DIGITAL_OUTPUT_CODES.get(c.value, 0)
+                                           for c in self.digital_output_components])
+        self.pwm_outputs = array('d', [float(c.duty_cycle) for c in self.pwm_components])
+
+        # outputs which have been written to since the last flush
+        self._staged = set()
+
+    def _attach(self, component, slots):
+        component.process_image = self
+        component.image_slot = len(slots)
+        slots.append(component)
+
+    def detach(self):
+        """
+        Hands the Components back to reading and writing the hardware directly
+        """
+        for slots in (self.numeric_components, self.digital_components,
+                      self.digital_output_components, self.pwm_components):
+            for component in slots:
+                component.process_image = None
+                component.image_slot = None
+        self._staged = set()
+
+    def read_inputs(self):
+        """
+        Input phase of the scan: read every input once and take a snapshot
+        """
+        for component in self.numeric_components:
+            component.update()
+
+        for component in self.digital_components:
+            component.update()
+
+        for component in self.queue_components:
+            component.update()
+
+    def stage_output(self, component):
+        """
+        Called by output Components instead of writing to the hardware straight away
+        :type component: Component
+        """
+        self._staged.add(component)
+
+    def flush_outputs(self):
+        """
+        Output phase of the scan: every output that changed during evaluation gets written once
+        :return: how many hardware writes happened
+        :rtype: int
+        """
+        staged = self._staged
+        self._staged = set()
+
+        writes = 0
+        for component in staged:
+            slot = component.image_slot
+            if component.COMPONENT_TYPE == 'PWM_OUTPUT':
+                new_value = float(component.duty_cycle)
+                image = self.pwm_outputs
+            else:
+                new_value = DIGITAL_OUTPUT_CODES.get(component.value, 0)
+                image = self.digital_outputs
+
+            # a HIGH -> LOW -> HIGH within one scan doesn't need to touch the pin at all
+            if image[slot] != new_value:
+                image[slot] = new_value
+                component.write_output()
+                writes += 1
+
+        return writes
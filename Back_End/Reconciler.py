@@ -0,0 +1,281 @@
+from Components import COMPONENT_CLASSES, ComponentRegistry
+from Events import create_event
+
+
+def _same_value(current, wanted):
+    """
+    Private function
+    Definitions from the web-app don't always agree with ours on types, e.g. "3" and 3
+    """
+    return current == wanted or str(current) == str(wanted)
+
+
+def _referenced_labels(event_definition):
+    """
+    Private function
+    :param event_definition: as made by Event.get_definition()
+    :type event_definition: dict
+    :return: labels of every Component the Event checks on or acts on
+    :rtype: set[str]
+    """
+    labels = set()
+    for key in ('CONDITIONS', 'EFFECTS', 'ACTIVATE', 'DEACTIVATE'):
+        for entry in event_definition.get(key, []):
+            labels.add(entry['LABEL'])
+    return labels
+
+
+def plan_components(registry, components_dict):
+    """
+    Works out what it takes to bring registry in line with components_dict, touching only what actually changed:
+        - same label, type and configuration: left alone, hardware and current value and all
+        - same label and type, new configuration: reconfigured in place if the Component can manage it,
+          otherwise replaced
+        - new label, or a change of type: made from scratch
+        - label no longer there: removed
+    registry itself is left alone. New Components get made, but don't take hold of their hardware until
+    Reconciliation.commit()
+    :param registry: Components currently in play
+    :type registry: ComponentRegistry
+    :param components_dict: component definitions, formatted like create_components() takes
+    :type components_dict: dict
+    :return: what the registry will hold afterwards, Components to add, Components to remove,
+             and (Component, configuration) for the ones to reconfigure in place
+    :rtype: (ComponentRegistry, list[Component], list[Component], list[(Component, object)])
+    :raises ValueError: if a Component can't be made, the new ones made so far are torn down again
+    """
+    wanted = {}
+    for comp_type, entries in components_dict.items():
+        for entry in entries:
+            wanted[entry['LABEL']] = (comp_type, entry['VALUE'])
+
+    planned = registry.copy()
+    removed = []
+    reconfigured = []
+    for component in list(registry):
+        label = component.get_label()
+        if label in wanted:
+            comp_type, value = wanted[label]
+            if comp_type == component.get_type():
+                current_value = component.get_definition()[1]['VALUE']
+                if _same_value(current_value, value):
+                    del wanted[label]
+                    continue
+                if component.can_reconfigure(value):
+                    del wanted[label]
+                    reconfigured.append((component, value))
+                    continue
+
+        planned.remove(label)
+        removed.append(component)
+
+    added = []
+    try:
+        for label, (comp_type, value) in wanted.items():
+            component = COMPONENT_CLASSES[comp_type](label, value)
+            added.append(component)
+            planned.add(component)
+    except Exception:
+        for component in added:
+            component.teardown()
+        raise
+
+    return planned, added, removed, reconfigured
+
+
+def reconcile_events(events, events_list, registry, rebound_labels, skip_invalid=False):
+    """
+    Works out the new list of Events, reusing existing Event objects (and with them their ACTIVE/DEACTIVATED state)
+    wherever the definition hasn't changed and none of their Components were rebound
+    :param events: Events currently in play
+    :type events: list[Event]
+    :param events_list: event definitions, formatted like create_events() takes
+    :type events_list: list[dict]
+    :type registry: ComponentRegistry
+    :param rebound_labels: labels of Components which were made, replaced or removed
+    :type rebound_labels: set[str]
+    :param skip_invalid: leave out Events which can no longer be made, rather than raising
+    :type skip_invalid: bool
+    :return: the new list of Events, and how many of them are new or rebuilt
+    :rtype: (list[Event], int)
+    :raises ValueError: if an Event refers to a Component or method which doesn't exist, unless skip_invalid
+    """
+    current = {}
+    for event in events or []:
+        current[event.get_label()] = event
+
+    new_events = []
+    rebuilt = 0
+    for event_definition in events_list:
+        # building is cheap (no hardware involved) and gives a definition in the same shape as the old one's
+        try:
+            candidate = create_event(event_definition, registry)
+        except ValueError as e:
+            if not skip_invalid:
+                raise
+            print('Leaving out event ' + str(event_definition['LABEL']) + ': ' + str(e))
+            rebuilt += 1
+            continue
+        old_event = current.get(candidate.get_label())
+
+        if old_event is not None:
+            old_definition = old_event.get_definition()
+            if old_definition == candidate.get_definition() \
+                    and not _referenced_labels(old_definition) & rebound_labels:
+                new_events.append(old_event)
+                continue
+
+        new_events.append(candidate)
+        rebuilt += 1
+
+    return new_events, rebuilt
+
+
+class Reconciliation(object):
+    """
+    Updates from the web-app, worked out against a copy of what's running without changing any of it
+    By the time one of these exists everything that can go wrong without hardware already has: replacement
+    Components are made (but not attached) and every Event is built against them. commit() then hands the
+    hardware over in one go, and puts everything back the way it was if any of it fails
+    """
+
+    def __init__(self, base_registry, base_events, registry, events, added=(), removed=(), reconfigured=(),
+                 events_changed=False):
+        """
+        :param base_registry: what was running when this was worked out
+        :type base_registry: ComponentRegistry
+        :param base_events: likewise
+        :type base_events: list[Event]
+        :param registry: what will be running after commit()
+        :type registry: ComponentRegistry
+        :type events: list[Event]
+        :param added: new Components, not attached yet
+        :type added: list[Component]
+        :param removed: Components on their way out, still attached
+        :type removed: list[Component]
+        :param reconfigured: (Component, configuration) for Components which change in place
+        :type reconfigured: list[(Component, object)]
+        :type events_changed: bool
+        """
+        self.base_registry = base_registry
+        self.base_events = base_events
+        self.registry = registry
+        self.events = events
+        self.added = list(added)
+        self.removed = list(removed)
+        self.reconfigured = list(reconfigured)
+        self.components_changed = len(self.added) + len(self.removed) + len(self.reconfigured) > 0
+        self.events_changed = events_changed
+
+        # EventIndex for events, if whoever prepared this built one ahead of time
+        self.event_index = None
+
+    def is_current(self, registry, events):
+        """
+        :return: whether this was worked out against what's running now, otherwise it has to be worked out again
+        :rtype: bool
+        """
+        return registry is self.base_registry and events is self.base_events
+
+    def commit(self):
+        """
+        Hands the hardware over from the removed Components to the added ones and applies new configurations,
+        all or nothing. If any of it fails, whatever was done is undone and the exception carries on up
+        Call from the control loop, in between scans
+        :return: the registry and Events to run with from now on
+        :rtype: (ComponentRegistry, list[Event])
+        """
+        detached = []
+        attached = []
+        previous = []
+        try:
+            # the old ones let go first, so replacements can have the pins
+            for component in self.removed:
+                component.detach()
+                detached.append(component)
+            for component in self.added:
+                attached.append(component)
+                component.attach()
+            for component, value in self.reconfigured:
+                previous.append((component, component.INITIAL_VALUE))
+                component.reconfigure(value)
+        except Exception:
+            for component, value in reversed(previous):
+                component.reconfigure(value)
+            for component in reversed(attached):
+                component.detach()
+            for component in reversed(detached):
+                component.attach()
+            self.discard()
+            raise
+
+        for component in self.removed:
+            component.teardown()
+        return self.registry, self.events
+
+    def discard(self):
+        """
+        Gets rid of the Components made for this, for when it isn't going to be committed
+        """
+        for component in self.added:
+            component.teardown()
+        self.added = []
+
+
+def prepare(registry, events, updates_dict):
+    """
+    Works out how to apply updates from the web-app to what's currently running, without changing anything
+    Safe to call from off the control loop
+    :param registry: Components currently in play, or None if there aren't any yet
+    :type registry: ComponentRegistry
+    :param events: Events currently in play, or None
+    :type events: list[Event]
+    :param updates_dict: may hold COMPONENTS and/or EVENTS
+    :type updates_dict: dict
+    :rtype: Reconciliation
+    :raises ValueError: if a Component or Event can't be made, nothing is left behind
+    """
+    planned = registry if registry is not None else ComponentRegistry()
+    added = []
+    removed = []
+    reconfigured = []
+    if 'COMPONENTS' in updates_dict:
+        planned, added, removed, reconfigured = plan_components(planned, updates_dict['COMPONENTS'])
+    rebound = set(component.get_label() for component in added + removed)
+
+    new_events = events
+    events_changed = False
+    try:
+        if 'EVENTS' in updates_dict:
+            new_events, rebuilt = reconcile_events(events, updates_dict['EVENTS'], planned, rebound)
+            events_changed = events is None or rebuilt > 0 or len(new_events) != len(events) \
+                or any(new is not old for new, old in zip(new_events, events))
+        elif rebound and events is not None:
+            # no new event definitions, but some Events may be holding on to Components that are being swapped out
+            # the ones whose Components go away altogether can't be made any more, so they go too
+            new_events, rebuilt = reconcile_events(events, [event.get_definition() for event in events], planned,
+                                                   rebound, skip_invalid=True)
+            events_changed = rebuilt > 0
+    except Exception:
+        for component in added:
+            component.teardown()
+        raise
+
+    return Reconciliation(registry, events, planned, new_events, added, removed, reconfigured, events_changed)
+
+
+def reconcile(registry, events, updates_dict):
+    """
+    Applies updates from the web-app to what's currently running, prepare() and commit() in one go
+    :param registry: Components currently in play, or None if there aren't any yet. Left as it was if anything fails
+    :type registry: ComponentRegistry
+    :param events: Events currently in play, or None
+    :type events: list[Event]
+    :param updates_dict: may hold COMPONENTS and/or EVENTS
+    :type updates_dict: dict
+    :return: registry, events, whether the Components changed, whether the Events changed
+    :rtype: (ComponentRegistry, list[Event], bool, bool)
+    """
+    reconciliation = prepare(registry, events, updates_dict)
+    registry, events = reconciliation.commit()
+    return registry, events, reconciliation.components_changed, reconciliation.events_changed
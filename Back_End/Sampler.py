@@ -0,0 +1,234 @@
+import threading
+import time
+from array import array
+
+from Scheduler import clock
+
+
+class RingBuffer(object):
+    """
+    Fixed-size buffer of the most recent samples from one channel
+    Only the sampler thread writes to it, so readers never need a lock.
+    The write goes in before the count gets bumped, so a reader never sees a slot that hasn't been filled yet
+    """
+
+    def __init__(self, size):
+        """
+        :param size: how many samples to hold on to
+        :type size: int
+        """
+        self.size = size
+        self.samples = array('d', [0.0] * size)
+
+        # total number of samples ever written
+        self.count = 0
+
+    def append(self, value):
+        self.samples[self.count % self.size] = value
+        self.count += 1
+
+    def latest(self):
+        """
+        :return: most recent sample, or None if nothing has been sampled yet
+        """
+        count = self.count
+        if count == 0:
+            return None
+        return self.samples[(count - 1) % self.size]
+
+    def get_samples(self):
+        """
+        Copy of the samples currently held, in no particular order
+        :rtype: list[float]
+        """
+        count = self.count
+        if count < self.size:
+            return self.samples[:count].tolist()
+        return self.samples.tolist()
+
+
+class ChannelBuffer(RingBuffer):
+    """
+    RingBuffer which also keeps an exponential moving average of everything that's gone through it
+    """
+
+    def __init__(self, size, ema_alpha):
+        """
+        :param ema_alpha: weight of each new sample in the moving average, between 0 and 1
+        :type ema_alpha: float
+        """
+        super(ChannelBuffer, self).__init__(size)
+        self.ema_alpha = ema_alpha
+        self.ema = None
+
+    def append(self, value):
+        if self.ema is None:
+            self.ema = float(value)
+        else:
+            self.ema += self.ema_alpha * (value - self.ema)
+        super(ChannelBuffer, self).append(value)
+
+
+class FakeADC(object):
+    """
+    Stand-in for Adafruit_MCP3008.MCP3008, for running without the chip
+    Either set values per channel, or hand over a function of (channel, time) to generate them
+    """
+
+    def __init__(self, values=None, generator=None, latency=0.0):
+        """
+        :param values: channel -> value
+        :type values: dict
+        :param generator: called as generator(channel, time) to produce a reading
+        :param latency: seconds each read takes, to mimic the SPI transaction
+        :type latency: float
+        """
+        self.values = values if values is not None else {}
+        self.generator = generator
+        self.latency = latency
+        self.reads = 0
+
+    def set_value(self, channel, value):
+        self.values[channel] = value
+
+    def read_adc(self, channel):
+        """
+        Same signature as MCP3008.read_adc
+        :rtype: int
+        """
+        self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.generator is not None:
+            return int(self.generator(channel, time.time()))
+        return self.values.get(channel, 0)
+
+
+class ADCSampler(object):
+    """
+    Background thread which scans ADC channels at a fixed rate and keeps a ChannelBuffer for each of them
+    Keeps the slow SPI reads out of the event loop, and catches transients that happen between scans
+    """
+
+    def __init__(self, source, channels=(), rate=1000.0, window=256, ema_alpha=0.1):
+        """
+        :param source: anything with a read_adc(channel) method, like MCP3008 or FakeADC
+        :param channels: which channels to scan
+        :param rate: scans per second
+        :type rate: float
+        :param window: how many samples per channel are used for min/max/mean
+        :type window: int
+        :param ema_alpha: weight of each new sample in the moving average
+        :type ema_alpha: float
+        """
+        self.source = source
+        self.rate = rate
+        self.window = window
+        self.ema_alpha = ema_alpha
+        self.buffers = {}
+        self.channels = ()
+        self.set_channels(channels)
+
+        # channel -> how many AnalogInputs are reading it, see add_channel()
+        self._users = {}
+        self._lock = threading.Lock()
+
+        self.overruns = 0
+        self._running = False
+        self._thread = None
+
+    def set_channels(self, channels):
+        """
+        Changes which channels get scanned, safe to call while the sampler is running
+        :type channels: list[int]
+        """
+        channels = tuple(sorted(set(channels)))
+        for channel in channels:
+            if channel not in self.buffers:
+                self.buffers[channel] = ChannelBuffer(self.window, self.ema_alpha)
+
+        # swapping the whole tuple means the sampler thread never sees it half-changed
+        # buffers stay put even when their channel goes, the sampler thread may be half way through a scan
+        self.channels = channels
+
+    def add_channel(self, channel):
+        """
+        Signs a reader up for channel, scanning starts with the first one
+        :type channel: int
+        """
+        with self._lock:
+            self._users[channel] = self._users.get(channel, 0) + 1
+            self.set_channels(self.channels + (channel,))
+
+    def remove_channel(self, channel):
+        """
+        Takes a reader off channel, scanning stops once the last one is gone
+        :type channel: int
+        """
+        with self._lock:
+            users = self._users.get(channel, 0) - 1
+            if users > 0:
+                self._users[channel] = users
+                return
+            self._users.pop(channel, None)
+            self.set_channels([scanned for scanned in self.channels if scanned != channel])
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='ADCSampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def scan(self):
+        """
+        Reads every channel once
+        """
+        for channel in self.channels:
+            self.buffers[channel].append(self.source.read_adc(channel))
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_scan = clock()
+        while self._running:
+            self.scan()
+            next_scan += period
+            delay = next_scan - clock()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # the scan took longer than the period, start again from now rather than bursting to catch up
+                self.overruns += 1
+                next_scan = clock()
+
+    def latest(self, channel):
+        return self.buffers[channel].latest()
+
+    def sample_count(self, channel):
+        """
+        How many samples channel has had so far, so readers can tell whether anything new came in
+        :rtype: int
+        """
+        return self.buffers[channel].count
+
+    def minimum(self, channel):
+        samples = self.buffers[channel].get_samples()
+        return min(samples) if samples else None
+
+    def maximum(self, channel):
+        samples = self.buffers[channel].get_samples()
+        return max(samples) if samples else None
+
+    def mean(self, channel):
+        samples = self.buffers[channel].get_samples()
+        return sum(samples) / len(samples) if samples else None
+
+    def ema(self, channel):
+        return self.buffers[channel].ema
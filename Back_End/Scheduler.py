@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+# deadlines are measured on a clock that never jumps backwards, when one is available
+clock = getattr(time, 'monotonic', time.time)
+
+
+class JitterStats(object):
+    """
+    Keeps a running tally of how late the Scheduler was when running its tasks
+    Lateness is measured in seconds as (actual start time - deadline)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+        # optional Metrics Histogram which gets every lateness as well
+        self.histogram = None
+
+    def record(self, lateness):
+        """
+        :param lateness: how far past its deadline a task started, in seconds
+        :type lateness: float
+        """
+        self.count += 1
+        self.total += lateness
+        self.last = lateness
+        if lateness > self.max:
+            self.max = lateness
+        if self.histogram is not None:
+            self.histogram.record(lateness)
+
+    def get_mean(self):
+        """
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def get_report(self):
+        """
+        Summary of the loop jitter so far, in seconds
+        :rtype: dict
+        """
+        return {'COUNT': self.count, 'LAST': self.last, 'MEAN': self.get_mean(), 'MAX': self.max}
+
+    def reset(self):
+        histogram = self.histogram
+        self.__init__()
+        self.histogram = histogram
+
+
+class ScheduledTask(object):
+    """
+    Handle for a callback sitting in the Scheduler's queue
+    Keep it around if you want to cancel the callback later
+    """
+
+    def __init__(self, deadline, callback, period=None, label=''):
+        """
+        :param deadline: clock() time at which the callback should run
+        :type deadline: float
+        :param callback: called with no arguments
+        :param period: if given, the task is re-scheduled every period seconds
+        :type period: float
+        :param label: name used in reports
+        :type label: str
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.period = period
+        self.label = label
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(object):
+    """
+    Priority queue of deadlines. Rather than polling on a fixed period,
+    the Scheduler sleeps until the earliest deadline comes due or until wake() is called from another thread
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self.jitter = JitterStats()
+
+        # tasks which raised, they get rescheduled all the same
+        self.errors = 0
+
+    def call_at(self, deadline, callback, period=None, label=''):
+        """
+        Schedules callback to run at deadline
+        :param deadline: time on the clock() timeline
+        :type deadline: float
+        :param callback: called with no arguments
+        :param period: optionally repeat every period seconds
+        :type period: float
+        :type label: str
+        :rtype: ScheduledTask
+        """
+        task = ScheduledTask(deadline, callback, period, label)
+        self._push(task)
+        return task
+
+    def call_later(self, delay, callback, period=None, label=''):
+        """
+        Schedules callback to run delay seconds from now
+        :type delay: float
+        :rtype: ScheduledTask
+        """
+        return self.call_at(clock() + delay, callback, period, label)
+
+    def call_every(self, period, callback, label='', delay=0.0):
+        """
+        Runs callback every period seconds, the first time being delay seconds from now
+        :type period: float
+        :rtype: ScheduledTask
+        """
+        return self.call_later(delay, callback, period, label)
+
+    def _push(self, task):
+        with self._lock:
+            earliest = self._queue[0][0] if self._queue else None
+            heapq.heappush(self._queue, (task.deadline, next(self._counter), task))
+        # a new earliest deadline means whoever is sleeping needs to recalculate
+        if earliest is None or task.deadline < earliest:
+            self._wake_event.set()
+
+    def wake(self):
+        """
+        Interrupts the current sleep. Safe to call from any thread
+        """
+        self._wake_event.set()
+
+    def next_deadline(self):
+        """
+        :return: the earliest deadline in the queue, or None if nothing is scheduled
+        """
+        with self._lock:
+            while self._queue and self._queue[0][2].cancelled:
+                heapq.heappop(self._queue)
+            if self._queue:
+                return self._queue[0][0]
+        return None
+
+    def run_pending(self):
+        """
+        Runs every task whose deadline has passed
+        :return: how many tasks were run
+        :rtype: int
+        """
+        ran = 0
+        now = clock()
+        while True:
+            with self._lock:
+                if not self._queue or self._queue[0][0] > now:
+                    break
+                deadline, _, task = heapq.heappop(self._queue)
+            if task.cancelled:
+                continue
+
+            self.jitter.record(clock() - deadline)
+            try:
+                task.callback()
+            except Exception as e:
+                # the task is already off the heap, letting this through would drop it (and everything after it)
+                self.errors += 1
+                print('Scheduled task ' + task.label + ' failed: ' + str(e))
+                traceback.print_exc()
+            ran += 1
+
+            if task.period is not None and not task.cancelled:
+                task.deadline = deadline + task.period
+
+                # if we've fallen more than a whole period behind, don't try to catch up with a burst of calls
+                if task.deadline < now:
+                    task.deadline = now + task.period
+                self._push(task)
+
+        return ran
+
+    def run_once(self, timeout=None):
+        """
+        Sleeps until the next deadline (or a wake()), then runs whatever is due
+        :param timeout: longest time to sleep for, in seconds
+        :type timeout: float
+        :return: how many tasks were run
+        :rtype: int
+        """
+        # cleared before looking at the queue, so a wake() from here on cuts the sleep short rather than getting lost
+        self._wake_event.clear()
+        deadline = self.next_deadline()
+        if deadline is None:
+            delay = timeout
+        else:
+            delay = max(deadline - clock(), 0.0)
+            if timeout is not None:
+                delay = min(delay, timeout)
+
+        if delay is None or delay > 0:
+            self._wake_event.wait(delay)
+
+        return self.run_pending()
+
+    def run_forever(self):
+        while True:
+            self.run_once()
@@ -0,0 +1,129 @@
+import threading
+import time
+
+
+class SimulatedPWM(object):
+    """
+    Stand-in for RPi.GPIO.PWM
+    """
+
+    def __init__(self, channel, frequency):
+        self.channel = channel
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+
+class SimulatedGPIO(object):
+    """
+    In-process stand-in for the RPi.GPIO module, same names and constants, so it can be dropped in wherever GPIO is used
+    Pin levels are kept in a dict. Drive inputs from a test with set_input(), which fires edge callbacks like the real
+    thing would, on a separate thread if threaded_callbacks is set
+    """
+
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    PWM = SimulatedPWM
+
+    def __init__(self, threaded_callbacks=False, latency=0.0):
+        """
+        :param threaded_callbacks: run edge callbacks on their own thread rather than inside set_input()
+        :type threaded_callbacks: bool
+        :param latency: seconds each input() and output() takes, to mimic slow I/O
+        :type latency: float
+        """
+        self.threaded_callbacks = threaded_callbacks
+        self.latency = latency
+        self.mode = None
+        self.directions = {}
+        self.levels = {}
+        self.callbacks = {}
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=PUD_OFF, initial=None):
+        self.directions[channel] = direction
+        if direction == self.OUT:
+            self.levels[channel] = self.LOW if initial is None else initial
+        elif channel not in self.levels:
+            # floating inputs read whatever the pull resistor says
+            self.levels[channel] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def input(self, channel):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.levels.get(channel, self.LOW)
+
+    def output(self, channel, level):
+        if self.latency:
+            time.sleep(self.latency)
+        self.levels[channel] = level
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self.callbacks[channel] = (edge, [])
+        if callback is not None:
+            self.add_event_callback(channel, callback)
+
+    def add_event_callback(self, channel, callback):
+        self.callbacks[channel][1].append(callback)
+
+    def remove_event_detect(self, channel):
+        self.callbacks.pop(channel, None)
+
+    def cleanup(self, channel=None):
+        if channel is None:
+            self.directions = {}
+            self.levels = {}
+            self.callbacks = {}
+        else:
+            self.directions.pop(channel, None)
+            self.levels.pop(channel, None)
+            self.callbacks.pop(channel, None)
+
+    def set_input(self, channel, level):
+        """
+        Simulates something external driving an input pin
+        :type channel: int
+        :param level: HIGH or LOW
+        """
+        old_level = self.levels.get(channel)
+        self.levels[channel] = level
+        if channel not in self.callbacks or old_level == level:
+            return
+
+        edge, callbacks = self.callbacks[channel]
+        rising = level == self.HIGH
+        if edge == self.BOTH or (edge == self.RISING and rising) or (edge == self.FALLING and not rising):
+            for callback in callbacks:
+                if self.threaded_callbacks:
+                    threading.Thread(target=callback, args=(channel,)).start()
+                else:
+                    callback(channel)
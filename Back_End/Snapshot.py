@@ -0,0 +1,190 @@
+"""
+Binary snapshots of the loaded Components and Events, so a boot can skip parsing definitions.json and compiling
+every Condition. A snapshot is a fixed-size header followed by a marshal payload:
+    MAGIC | FORMAT_VERSION | Python bytecode magic | sha1 of definitions.json | payload length
+The payload has the graph with labels already resolved, Components by position and Events referring to them,
+plus the compiled code of every Condition. Components can't be saved as they are (they hold on to pins, players
+and threads), so they still get made, just without any of the parsing and lookups
+A snapshot only gets used when its hash matches the definitions.json it was made from, anything else means JSON
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+
+import Events
+from Components import COMPONENT_CLASSES, ComponentRegistry
+from Events import Condition, Effect, Event, create_action, create_check
+
+try:
+    from importlib.util import MAGIC_NUMBER as PYTHON_MAGIC
+except ImportError:
+    import imp
+    PYTHON_MAGIC = imp.get_magic()
+
+MAGIC = b'PILCSNAP'
+
+# bump whenever the payload's layout changes
+FORMAT_VERSION = 1
+
+# magic, format version, Python's bytecode magic (marshalled code only works on the Python that made it),
+# sha1 digest of definitions.json, payload length
+HEADER = struct.Struct('>8sH4s20sI')
+
+
+def digest(data):
+    """
+    :param data: contents of definitions.json
+    :type data: bytes
+    :return: what snapshots are keyed by
+    :rtype: bytes
+    """
+    return hashlib.sha1(data).digest()
+
+
+def _condition_payload(condition, positions):
+    """
+    Private function
+    :return: ((position, method, value), ...) or None if there's no condition
+    """
+    if condition is None:
+        return None
+    return tuple((positions[entry['COMPONENT']], entry['METHOD'], entry['VALUE']) for entry in condition.checks)
+
+
+def _gather(all_components, all_events):
+    """
+    Private function
+    Everything the payload needs out of the live Components and Events, as plain tuples
+    :return: (components, events, condition sources)
+    """
+    components = []
+    positions = {}
+    for component in all_components:
+        positions[component] = len(components)
+        components.append((component.get_type(), component.get_label(), component.INITIAL_VALUE))
+
+    events = []
+    sources = set()
+    for event in all_events:
+        for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+            if condition is not None:
+                sources.update(condition.sources)
+
+        actions = tuple((positions[entry['COMPONENT']], entry['METHOD_NAME'], entry['ARG'])
+                        for entry in event.effect.actions)
+        events.append((event.get_label(), _condition_payload(event.condition, positions), actions,
+                       _condition_payload(event.activate_condition, positions),
+                       _condition_payload(event.deactivate_condition, positions)))
+
+    return components, events, sources
+
+
+def _pack(definitions_digest, gathered):
+    """
+    Private function
+    Compiles and marshals what _gather() got
+    :rtype: bytes
+    """
+    components, events, sources = gathered
+    codes = dict((source, Events.compile_source(source)) for source in sources)
+    payload = marshal.dumps((components, events, codes))
+    return HEADER.pack(MAGIC, FORMAT_VERSION, PYTHON_MAGIC, definitions_digest, len(payload)) + payload
+
+
+def encode(definitions_digest, all_components, all_events):
+    """
+    Makes a snapshot
+    :param definitions_digest: digest() of the definitions.json these came from
+    :type definitions_digest: bytes
+    :type all_components: ComponentRegistry
+    :type all_events: list[Event]
+    :return: the whole snapshot file
+    :rtype: bytes
+    :raises ValueError: if something in the definitions can't be marshalled
+    """
+    return _pack(definitions_digest, _gather(all_components, all_events))
+
+
+def encode_later(definitions_digest, all_components, all_events):
+    """
+    Same as encode(), except that only the cheap part happens now: what the snapshot needs gets copied out of
+    the Components and Events, so they can carry on changing. Compiling and marshalling wait until the returned
+    function is called, which can be from another thread, e.g. by Persistence.FileWriter when the write is due
+    :return: function taking no arguments which returns the whole snapshot file
+    :raises ValueError: from the returned function, if something in the definitions can't be marshalled
+    """
+    gathered = _gather(all_components, all_events)
+    return lambda: _pack(definitions_digest, gathered)
+
+
+def _read_payload(filename, definitions_digest):
+    """
+    Private function
+    :return: the unmarshalled payload, or None if the snapshot doesn't match
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            return None
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, python_magic, snapshot_digest, length = HEADER.unpack(data[:HEADER.size])
+            if magic != MAGIC or version != FORMAT_VERSION or python_magic != PYTHON_MAGIC or \
+                    snapshot_digest != definitions_digest or len(data) != HEADER.size + length:
+                return None
+            return marshal.loads(data[HEADER.size:])
+        finally:
+            data.close()
+
+
+def _condition(checks, components):
+    """
+    Private function
+    """
+    if checks is None:
+        return None
+    return Condition([create_check(components[position], method, value) for position, method, value in checks])
+
+
+def load(filename, definitions_digest):
+    """
+    Rebuilds Components and Events from a snapshot
+    :param filename: path to the snapshot
+    :type filename: str
+    :param definitions_digest: digest() of the current definitions.json
+    :type definitions_digest: bytes
+    :return: ComponentRegistry, [Event], or None, None if there's no snapshot or it doesn't match
+    """
+    try:
+        payload = _read_payload(filename, definitions_digest)
+    except (IOError, OSError):
+        return None, None
+    except (ValueError, EOFError, TypeError, struct.error) as e:
+        print('Ignoring broken snapshot ' + filename + ': ' + str(e))
+        return None, None
+    if payload is None:
+        return None, None
+
+    component_payload, event_payload, codes = payload
+    Events.code_cache.update(codes)
+
+    all_components = ComponentRegistry()
+    components = []
+    for comp_type, label, value in component_payload:
+        component = COMPONENT_CLASSES[comp_type](label, value)
+        all_components.add(component)
+        components.append(component)
+    for component in components:
+        component.attach()
+
+    all_events = []
+    for label, checks, actions, activate_checks, deactivate_checks in event_payload:
+        effect = Effect([create_action(components[position], method_name, arg)
+                         for position, method_name, arg in actions])
+        event = Event(label, _condition(checks, components), effect,
+                      _condition(activate_checks, components), _condition(deactivate_checks, components))
+        event.compile()
+        all_events.append(event)
+
+    return all_components, all_events
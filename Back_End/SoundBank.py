@@ -0,0 +1,162 @@
+import os
+import threading
+from collections import OrderedDict
+
+import Hardware
+
+# decoded sounds kept in memory at once, least recently played ones get dropped past this
+MAX_BYTES = 32 * 1024 * 1024
+
+# files bigger than this on disk aren't worth decoding up front, they get streamed
+STREAM_FILE_SIZE = 4 * 1024 * 1024
+
+# tracks longer than this (in seconds) get streamed, however small the file
+STREAM_LENGTH = 30.0
+
+
+class SoundBank(object):
+    """
+    Short sounds, decoded once and kept in memory, so a cue starts playing in a few ms instead of
+    being read and decoded from disk every time
+        - load() decodes a track into a Sound when the Component is created
+        - long tracks (big files, or longer than STREAM_LENGTH) aren't kept, get() returns None for them
+          and they stream through the music player like before
+        - the bank holds at most max_bytes of decoded audio, the least recently played sounds get
+          dropped to make room and decoded again next time they're needed
+        - every player gets a mixer channel of its own, so several cues can play over each other
+    Safe to use from several threads at once
+    """
+
+    def __init__(self, backend=None, max_bytes=MAX_BYTES):
+        """
+        :param backend: where Sounds and Channels come from, defaults to the current backend
+        :type backend: Hardware.Backend
+        :param max_bytes: decoded audio to keep at most
+        :type max_bytes: int
+        """
+        self.backend = Hardware.get_backend() if backend is None else backend
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+
+        # path -> (Sound, decoded size), least recently used first
+        self._sounds = OrderedDict()
+        self._streamed = set()
+        self._channels = 0
+
+        # channels handed back by torn down players, and id(channel) -> index for the ones handed out
+        self._free_channels = []
+        self._channel_indexes = {}
+
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def load(self, path):
+        """
+        Decodes a track into memory, unless it's one to be streamed
+        :param path: path to the audio file
+        :type path: str
+        :return: the Sound, or None if the track streams
+        """
+        with self._lock:
+            if path in self._sounds:
+                return self._touch(path)
+            if path in self._streamed:
+                return None
+
+        try:
+            streamed = os.path.getsize(path) > STREAM_FILE_SIZE
+        except OSError:
+            streamed = False
+
+        sound = None
+        size = 0
+        if not streamed:
+            try:
+                sound = self.backend.load_sound(path)
+                size = self.backend.sound_bytes(sound)
+                streamed = sound.get_length() > STREAM_LENGTH or size > self.max_bytes
+            except Exception as e:
+                print('could not decode ' + path + ', it will be streamed: ' + str(e))
+                streamed = True
+
+        with self._lock:
+            if streamed:
+                self._streamed.add(path)
+                return None
+            if path in self._sounds:
+                # somebody else got there first
+                return self._touch(path)
+
+            self._sounds[path] = (sound, size)
+            self.bytes += size
+            self.loads += 1
+            while self.bytes > self.max_bytes and len(self._sounds) > 1:
+                _, (_, dropped_size) = self._sounds.popitem(last=False)
+                self.bytes -= dropped_size
+                self.evictions += 1
+        return sound
+
+    def _touch(self, path):
+        """
+        Must hold self._lock
+        """
+        entry = self._sounds.pop(path)
+        self._sounds[path] = entry
+        return entry[0]
+
+    def get(self, path):
+        """
+        :type path: str
+        :return: the decoded Sound, loading it again if it was dropped, or None if the track streams
+        """
+        return self.load(path)
+
+    def reserve_channel(self):
+        """
+        A mixer channel nobody else plays on
+        """
+        with self._lock:
+            if self._free_channels:
+                index = self._free_channels.pop()
+            else:
+                index = self._channels
+                self._channels += 1
+        channel = self.backend.get_channel(index)
+        with self._lock:
+            self._channel_indexes[id(channel)] = index
+        return channel
+
+    def release_channel(self, channel):
+        """
+        Hands a channel from reserve_channel() back, once its player is done with it
+        """
+        channel.stop()
+        with self._lock:
+            index = self._channel_indexes.pop(id(channel), None)
+            if index is not None:
+                self._free_channels.append(index)
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        with self._lock:
+            return {'SOUNDS': len(self._sounds), 'STREAMED': len(self._streamed), 'BYTES': self.bytes,
+                    'MAX_BYTES': self.max_bytes, 'CHANNELS': self._channels, 'LOADS': self.loads,
+                    'EVICTIONS': self.evictions}
+
+
+_bank = None
+
+
+def get_sound_bank():
+    """
+    The SoundBank shared by every SimpleAudioPlayer
+    :rtype: SoundBank
+    """
+    global _bank
+    if _bank is None:
+        _bank = SoundBank()
+    return _bank
@@ -0,0 +1,213 @@
+import threading
+import time
+
+import Hardware
+
+# command line arguments every player gets started with
+PLAYER_ARGS = ['-b', '--no-osd']
+
+# how often to check that there's a warm player standing by, in seconds
+WARM_CHECK_PERIOD = 1.0
+
+
+class VideoPlayerManager(object):
+    """
+    Keeps a video player process warm, so a video starts in a few ms rather than after a process spawn
+    and a D-Bus handshake:
+        - a player is spawned ahead of time with a configured track loaded, paused and hidden
+        - playing the track it already has is a seek to zero and an unpause
+        - playing another track reuses the same player with load(), rather than making a new one
+        - stopping pauses, rewinds and hides the player rather than quitting it
+        - a player which went away (OMXPlayer quits at the end of a video) gets replaced in the background
+    The time from an Event firing to playback starting is kept for every play()
+    Safe to use from several threads at once
+    """
+
+    def __init__(self, backend=None, args=None, check_period=WARM_CHECK_PERIOD):
+        """
+        :param backend: where players come from, defaults to the current backend
+        :type backend: Hardware.Backend
+        :param args: command line arguments for the players
+        :type args: list[str]
+        :param check_period: seconds between checks on the warm player
+        :type check_period: float
+        """
+        self.backend = Hardware.get_backend() if backend is None else backend
+        self.args = PLAYER_ARGS if args is None else args
+        self.check_period = check_period
+
+        self._lock = threading.RLock()
+        self.player = None
+        self.tracks = []
+        self.last_track = None
+        self._thread = None
+        self._running = False
+        self._wake = threading.Event()
+
+        self.warm_starts = 0
+        self.loads = 0
+        self.spawns = 0
+        self.plays = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        """
+        Starts keeping a player warm on a background thread
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='VideoPlayerManager')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_all(self):
+        with self._lock:
+            self._running = False
+            self._wake.set()
+            if self.player is not None:
+                try:
+                    self.player.quit()
+                except Exception:
+                    pass
+                self.player = None
+
+    def preload(self, track):
+        """
+        Adds a track to the configured ones, the warm player gets made with the first of them
+        :type track: str
+        """
+        with self._lock:
+            if track not in self.tracks:
+                self.tracks.append(track)
+            if self.last_track is None:
+                self.last_track = track
+                self._wake.set()
+
+    def _run(self):
+        while self._running:
+            try:
+                self.warm_up()
+            except Exception as e:
+                print('Could not warm up a video player: ' + str(e))
+            self._wake.wait(self.check_period)
+            self._wake.clear()
+
+    def _alive(self):
+        """
+        Must hold self._lock
+        """
+        if self.player is None:
+            return False
+        try:
+            self.player.get_source()
+            return True
+        except self.backend.PlayerDeadError:
+            self.player = None
+            return False
+
+    def warm_up(self):
+        """
+        Makes sure there's a player standing by, spawning a paused one if there isn't
+        """
+        with self._lock:
+            if self._alive() or self.last_track is None:
+                return
+            self.player = self._spawn(self.last_track)
+            self._park(self.player)
+
+    def _spawn(self, track):
+        """
+        Must hold self._lock
+        """
+        self.spawns += 1
+        return self.backend.create_video_player(track, self.args)
+
+    @staticmethod
+    def _park(player):
+        player.pause()
+        player.set_position(0.0)
+        if hasattr(player, 'hide_video'):
+            player.hide_video()
+
+    def play(self, track, requested=None):
+        """
+        Starts playing track from the beginning, or does nothing if a video is already playing
+        :type track: str
+        :param requested: when the Event asking for this fired, defaults to now
+        :type requested: float
+        """
+        if requested is None:
+            requested = time.time()
+
+        with self._lock:
+            if self._alive():
+                try:
+                    if self.player.is_playing():
+                        return
+                    if self.player.get_source() == track:
+                        self.player.set_position(0.0)
+                        self.warm_starts += 1
+                    else:
+                        self.player.load(track, pause=True)
+                        self.loads += 1
+                    if hasattr(self.player, 'show_video'):
+                        self.player.show_video()
+                    self.player.play()
+                except self.backend.PlayerDeadError:
+                    self.player = None
+
+            if self.player is None:
+                # nothing warm to use, this is the slow way
+                self.player = self._spawn(track)
+
+            self.last_track = track
+            self._record(time.time() - requested)
+
+    def stop(self, track):
+        """
+        Stops track if it's the one playing, keeping the player around for next time
+        :type track: str
+        """
+        with self._lock:
+            if not self._alive():
+                return
+            try:
+                if self.player.get_source() == track:
+                    self._park(self.player)
+            except self.backend.PlayerDeadError:
+                self.player = None
+
+    def is_playing(self, track=None):
+        """
+        :param track: only count this track, or None for any
+        :rtype: bool
+        """
+        with self._lock:
+            if not self._alive():
+                return False
+            try:
+                return self.player.is_playing() and (track is None or self.player.get_source() == track)
+            except self.backend.PlayerDeadError:
+                self.player = None
+                return False
+
+    def _record(self, latency):
+        """
+        Must hold self._lock
+        """
+        self.plays += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        with self._lock:
+            mean_latency = self.total_latency / self.plays if self.plays else 0.0
+            return {'PLAYS': self.plays, 'WARM_STARTS': self.warm_starts, 'LOADS': self.loads,
+                    'SPAWNS': self.spawns, 'TRACKS': len(self.tracks), 'MEAN_LATENCY': mean_latency,
+                    'MAX_LATENCY': self.max_latency}
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# the back end's modules import each other by bare name, from the directory Main.py runs in
+BACK_END = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END not in sys.path:
+    sys.path.insert(0, BACK_END)
+
+import pytest
+
+import Hardware
+from Components import AnalogInput
+
+
+@pytest.fixture(autouse=True)
+def simulated_backend():
+    """
+    Every test gets a fresh simulated backend, so pins and ADC values don't leak between tests
+    """
+    backend = Hardware.SimulatedBackend()
+    Hardware.set_backend(backend)
+    yield backend
+
+    # AnalogInputs share the ADC and the sampler at class level
+    AnalogInput.stop_sampler()
+    AnalogInput.sampler_settings = None
+    AnalogInput.mcp = None
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from BatchEvaluator import create_batch_evaluator
+from Components import ComponentRegistry, Counter, pop_dirty_components
+from Events import Condition, create_events
+
+
+def _events(components, rng):
+    definitions = []
+    for index in range(40):
+        conditions = [{'LABEL': rng.choice(list(components.by_label)),
+                       'METHOD': rng.choice(['greater_than', 'less_than', 'equal_to']),
+                       'VALUE': rng.randint(0, 5)} for _ in range(rng.randint(1, 3))]
+        definitions.append({'LABEL': 'event_' + str(index), 'CONDITIONS': conditions,
+                            'EFFECTS': [{'LABEL': 'count_0', 'METHOD': 'increase_value', 'ARG': 0}]})
+    return create_events(components, events_list=definitions)
+
+
+def test_only_changed_rows_are_evaluated_and_results_match_the_scalar_path():
+    rng = random.Random(7)
+    components = ComponentRegistry([Counter('count_' + str(index), 0) for index in range(6)])
+    events = _events(components, rng)
+    batch = create_batch_evaluator(events)
+    pop_dirty_components()
+
+    for _ in range(200):
+        for component in rng.sample(list(components), rng.randint(0, 2)):
+            component.set_value(rng.randint(0, 5))
+        batch.evaluate(pop_dirty_components())
+        for event in events:
+            assert bool(event.condition.evaluate()) == bool(Condition.evaluate(event.condition)), event.get_label()
+
+
+def test_a_quiet_pass_reads_nothing():
+    components = ComponentRegistry([Counter('count_0', 0), Counter('count_1', 0)])
+    events = _events(components, random.Random(3))
+    batch = create_batch_evaluator(events)
+    reads = []
+    for component in components:
+        component.get_value = lambda component=component: reads.append(component) or component.value
+
+    batch.evaluate(set())
+    assert reads == []
+    batch.evaluate({components.get('count_1')})
+    assert reads == [components.get('count_1')]
@@ -0,0 +1,51 @@
+import json
+
+import FileHandler
+from Components import create_components
+from Events import EventIndex
+
+
+def _watcher(tmp_path, running, updates):
+    path = tmp_path / 'db.json'
+    path.write_text(json.dumps(updates))
+    registry, events = running
+    return FileHandler.ClientUpdateWatcher(
+        str(path), prepare=lambda ready: FileHandler.prepare_client_updates(registry, events, ready))
+
+
+def test_updates_come_out_of_the_watcher_ready_to_commit(tmp_path):
+    running = (create_components(components_dict={'COUNTER': [{'LABEL': 'count', 'VALUE': 0}]}), [])
+    watcher = _watcher(tmp_path, running, {
+        'COMPONENTS': {'COUNTER': [{'LABEL': 'count', 'VALUE': 0}], 'TIMER': [{'LABEL': 'clock', 'VALUE': 0}]},
+        'EVENTS': [{'LABEL': 'bump', 'CONDITIONS': [{'LABEL': 'clock', 'METHOD': 'greater_than', 'VALUE': 5}],
+                    'EFFECTS': [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}]}]})
+
+    assert watcher.check()
+    prepared = watcher.poll()
+    assert prepared.is_current(*running)
+    assert isinstance(prepared.event_index, EventIndex)
+    assert 'clock' not in running[0]
+
+    registry, events = prepared.commit()
+    assert registry.get('count') is running[0].get('count')
+    assert events[0].effect.actions[0]['COMPONENT'] is registry.get('count')
+
+
+def test_updates_which_cant_be_built_never_reach_the_loop(tmp_path):
+    running = (create_components(components_dict={'COUNTER': [{'LABEL': 'count', 'VALUE': 0}]}), [])
+    watcher = _watcher(tmp_path, running, {'COMPONENTS': {'ANALOG_INPUT': [{'LABEL': 'level', 'VALUE': 9}]}})
+
+    assert not watcher.check()
+    assert watcher.poll() is None
+    assert 'count' in running[0]
+
+
+def test_retry_prepares_an_unchanged_file_again(tmp_path):
+    running = (create_components(components_dict={}), [])
+    watcher = _watcher(tmp_path, running, {'COMPONENTS': {'COUNTER': [{'LABEL': 'count', 'VALUE': 0}]}})
+
+    assert watcher.check()
+    watcher.poll().discard()
+    assert not watcher.check()
+    watcher.retry()
+    assert watcher.check()
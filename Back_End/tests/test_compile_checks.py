@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+
+from Components import ComponentRegistry, Counter, Timer
+from Events import Condition, compile_checks, create_check
+
+
+@pytest.fixture
+def components():
+    return ComponentRegistry([Counter('count', 0), Counter('other', 0), Timer('clock', 0)])
+
+
+CHECKS = [('count', 'equal_to', 2), ('count', 'greater_than', 1), ('other', 'less_than', 3),
+          ('clock', 'greater_than', -1), ('clock', 'equal_to', 0.5)]
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 3])
+def test_compiled_checks_agree_with_evaluate(components, size):
+    for combination in itertools.combinations(CHECKS, size):
+        condition = Condition([create_check(components.get(label), method, value)
+                               for label, method, value in combination])
+        compiled = compile_checks(condition.checks)
+        for count, other in itertools.product(range(4), repeat=2):
+            components.get('count').set_value(count)
+            components.get('other').set_value(other)
+            assert bool(compiled()) == bool(condition.evaluate()), (combination, count, other)
+
+
+@pytest.mark.parametrize('value, method, expected', [
+    ('inf', 'less_than', True),
+    ('inf', 'greater_than', False),
+    ('-inf', 'greater_than', True),
+    ('nan', 'greater_than', False),
+    ('nan', 'equal_to', False),
+])
+def test_infinite_and_nan_thresholds_compile(components, value, method, expected):
+    condition = Condition([create_check(components.get('clock'), method, value)])
+    assert condition.evaluate() is expected
+    condition.compile()
+    assert condition.evaluate() is expected
+    # they can't be written into the source as literals, so they're passed in
+    assert all('inf' not in source and 'nan' not in source for source in condition.sources)
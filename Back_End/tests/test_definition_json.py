@@ -0,0 +1,26 @@
+import json
+
+from Components import ComponentRegistry, Counter, Timer
+from Events import create_events
+
+
+def test_component_fragments_follow_the_configuration_and_value():
+    count = Counter('count', 0)
+    assert json.loads(count.get_definition_json()) == count.get_definition()[1]
+
+    count.reconfigure(5)
+    assert json.loads(count.get_definition_json()) == {'LABEL': 'count', 'VALUE': 5}
+
+    count.set_value(3)
+    assert json.loads(count.get_display_json()) == {'count': 3}
+
+
+def test_event_fragments_match_their_definitions():
+    components = ComponentRegistry([Counter('count', 0), Timer('clock', 0)])
+    definition = {'LABEL': 'bump',
+                  'CONDITIONS': [{'LABEL': 'clock', 'METHOD': 'greater_than', 'VALUE': 5.0}],
+                  'EFFECTS': [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}],
+                  'ACTIVATE': [{'LABEL': 'count', 'METHOD': 'less_than', 'VALUE': 3}]}
+    event = create_events(components, events_list=[definition])[0]
+
+    assert json.loads(event.get_definition_json()) == event.get_definition() == definition
@@ -0,0 +1,168 @@
+import threading
+
+import pytest
+
+import Components
+from Components import DigitalInput
+
+
+class FakeTime(object):
+    """
+    Stands in for the time module inside Components, so debounce windows don't depend on how fast the test runs
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(Components, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def edge_detection():
+    DigitalInput.use_edge_detection(debounce_time=0.02)
+    yield
+    DigitalInput.use_edge_detection(False)
+
+
+def _press(gpio, button, fake_time, level):
+    gpio.set_input(button.channel, level)
+    fake_time.advance(0.05)
+
+
+def test_level_mode_goes_through_pressed_held_released(simulated_backend):
+    gpio = simulated_backend.gpio
+    button = DigitalInput('button', 1)
+    button.attach()
+    button.update()
+    assert button.value == 'HELD_UP'
+
+    gpio.set_input(button.channel, gpio.LOW)
+    button.update()
+    assert button.value == 'PRESSED'
+    button.update()
+    assert button.value == 'HELD_DOWN'
+
+    gpio.set_input(button.channel, gpio.HIGH)
+    button.update()
+    assert button.value == 'RELEASED'
+    button.update()
+    assert button.value == 'HELD_UP'
+
+
+def test_a_press_shorter_than_a_scan_is_still_seen(simulated_backend, fake_time, edge_detection):
+    gpio = simulated_backend.gpio
+    button = DigitalInput('button', 1)
+    button.attach()
+    button.update()
+    assert button.value == 'HELD_UP'
+
+    # press and release both happen between two scans
+    _press(gpio, button, fake_time, gpio.LOW)
+    _press(gpio, button, fake_time, gpio.HIGH)
+
+    button.update()
+    assert button.value == 'PRESSED'
+    button.update()
+    assert button.value == 'RELEASED'
+    button.update()
+    assert button.value == 'HELD_UP'
+
+
+def test_contact_bounce_is_ignored(simulated_backend, fake_time, edge_detection):
+    gpio = simulated_backend.gpio
+    button = DigitalInput('button', 1)
+    button.attach()
+    button.update()
+
+    # the contact chatters for a few ms before settling on LOW
+    gpio.set_input(button.channel, gpio.LOW)
+    for level in (gpio.HIGH, gpio.LOW, gpio.HIGH, gpio.LOW):
+        fake_time.advance(0.002)
+        gpio.set_input(button.channel, level)
+    assert len(button.edges) == 1
+
+    fake_time.advance(0.05)
+    button.update()
+    assert button.value == 'PRESSED'
+    button.update()
+    assert button.value == 'HELD_DOWN'
+
+
+def test_an_edge_hidden_by_bounce_is_picked_up_once_the_input_settles(simulated_backend, fake_time, edge_detection):
+    gpio = simulated_backend.gpio
+    button = DigitalInput('button', 1)
+    button.attach()
+    button.update()
+
+    gpio.set_input(button.channel, gpio.LOW)
+    fake_time.advance(0.002)
+    # the release comes within the debounce window, so its edge gets thrown away
+    gpio.set_input(button.channel, gpio.HIGH)
+    fake_time.advance(0.05)
+
+    button.update()
+    assert button.value == 'PRESSED'
+    button.update()
+    assert button.value == 'RELEASED'
+
+
+def test_edges_wake_the_engine(simulated_backend, fake_time):
+    woken = []
+    DigitalInput.use_edge_detection(on_edge=lambda: woken.append(True))
+    try:
+        gpio = simulated_backend.gpio
+        button = DigitalInput('button', 1)
+        button.attach()
+        _press(gpio, button, fake_time, gpio.LOW)
+        assert woken == [True]
+    finally:
+        DigitalInput.use_edge_detection(False)
+
+
+def test_teardown_stops_edge_detection(simulated_backend, edge_detection):
+    button = DigitalInput('button', 1)
+    button.attach()
+    assert button.channel in simulated_backend.gpio.callbacks
+    button.teardown()
+    assert button.channel not in simulated_backend.gpio.callbacks
+
+
+def test_an_edge_arriving_after_detach_is_dropped(simulated_backend, edge_detection):
+    button = DigitalInput('button', 1)
+    button.attach()
+    callback = simulated_backend.gpio.callbacks[button.channel][1][0]
+    button.detach()
+
+    # RPi.GPIO may already have been on its way into the callback when detach() came along
+    callback(button.channel)
+    assert button.edges is None
+
+
+def test_components_marked_from_another_thread_all_reach_the_scan(simulated_backend):
+    buttons = [DigitalInput('button' + str(number), 1) for number in range(2000)]
+    Components.pop_dirty_components()
+
+    def mark_all():
+        for button in buttons:
+            button.mark_dirty()
+    marker = threading.Thread(target=mark_all)
+    marker.start()
+
+    seen = set()
+    while marker.is_alive():
+        for component in Components.pop_dirty_components():
+            seen.add(component)
+    marker.join()
+    seen.update(Components.pop_dirty_components())
+    assert seen == set(buttons)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from Components import Counter, peek_dirty_components, pop_dirty_components
+from EffectPool import EffectPool, EffectResult
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def test_hung_workers_are_capped_and_new_effects_turned_away():
+    release = threading.Event()
+    pool = EffectPool(size=2, timeout=0.01, max_hung=1)
+    pool.start()
+    components = [Counter('count_' + str(index), 0) for index in range(4)]
+    try:
+        # three effects hang one after another, only the first gets its worker replaced
+        for component in components[:3]:
+            assert pool.submit(component, 'hang', release.wait)
+            _wait_for(lambda: pool.get_report()['RUNNING'] > 0)
+            time.sleep(0.02)
+            pool.collect()
+        _wait_for(lambda: pool.get_report()['HUNG_WORKERS'] == 3)
+        assert pool.get_report()['WORKERS'] == 0
+        assert len(pool._workers) == 3
+
+        assert not pool.submit(components[3], 'increase_by', lambda amount: amount + 1, 1)
+        assert [result.status for result in pool.collect()] == [EffectResult.REJECTED]
+
+        # once they come unstuck the pool is back to its size, and the spare one retires
+        release.set()
+        _wait_for(lambda: pool.get_report()['HUNG_WORKERS'] == 0)
+        assert pool.get_report()['WORKERS'] == 2
+        _wait_for(lambda: len(pool._workers) == 2)
+        assert pool.submit(components[3], 'increase_by', lambda amount: amount + 1, 1)
+        _wait_for(lambda: components[3] in [result.component for result in pool.collect()])
+        assert components[3].value == 2
+    finally:
+        release.set()
+        pool.stop()
+
+
+def test_effects_run_and_report_back():
+    done = threading.Event()
+    pool = EffectPool(size=1, on_complete=done.set)
+    pool.start()
+    count = Counter('count', 0)
+    pop_dirty_components()
+    try:
+        pool.submit(count, 'fetch', lambda: 2)
+        assert done.wait(2)
+
+        # the worker only hands the value back, it's set on the collecting thread
+        assert count.value == 0
+        assert not peek_dirty_components()
+        results = pool.collect()
+        assert [result.status for result in results] == [EffectResult.DONE]
+        assert count.value == 2
+        assert count in pop_dirty_components()
+    finally:
+        pool.stop()
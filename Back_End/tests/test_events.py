@@ -0,0 +1,83 @@
+import pytest
+
+from Components import ComponentRegistry, Counter, Timer
+from Events import EventIndex, create_events
+
+
+@pytest.fixture
+def components():
+    return ComponentRegistry([Counter('count', 0), Timer('clock', 0)])
+
+
+def _event(label, conditions, effects):
+    return {'LABEL': label, 'CONDITIONS': conditions, 'EFFECTS': effects}
+
+
+def test_events_resolve_labels_to_components(components):
+    events = create_events(components, events_list=[
+        _event('bump', [{'LABEL': 'clock', 'METHOD': 'greater_than', 'VALUE': '5'}],
+               [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}])])
+    check = events[0].condition.checks[0]
+    assert check['COMPONENT'] is components.get('clock')
+    assert check['VALUE'] == 5.0
+    assert events[0].effect.actions[0]['COMPONENT'] is components.get('count')
+
+
+def test_a_condition_on_an_unknown_component_rejects_the_event(components):
+    ghost_only = _event('ghost', [{'LABEL': 'ghost', 'METHOD': 'equal_to', 'VALUE': 1}],
+                        [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}])
+    with pytest.raises(ValueError):
+        create_events(components, events_list=[ghost_only])
+
+
+def test_an_effect_on_an_unknown_component_rejects_the_event(components):
+    event = _event('ghost', [{'LABEL': 'count', 'METHOD': 'equal_to', 'VALUE': 1}],
+                   [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1},
+                    {'LABEL': 'ghost', 'METHOD': 'increase_value', 'ARG': 1}])
+    with pytest.raises(ValueError):
+        create_events(components, events_list=[event])
+
+
+def test_unknown_methods_reject_the_event(components):
+    with pytest.raises(ValueError):
+        create_events(components, events_list=[
+            _event('bad', [{'LABEL': 'count', 'METHOD': 'shouts_louder_than', 'VALUE': 1}], [])])
+    with pytest.raises(ValueError):
+        create_events(components, events_list=[
+            _event('bad', [], [{'LABEL': 'count', 'METHOD': 'explode', 'ARG': None}])])
+
+
+def test_skip_invalid_leaves_out_only_the_broken_events(components):
+    events = create_events(components, skip_invalid=True, events_list=[
+        _event('ghost', [{'LABEL': 'ghost', 'METHOD': 'equal_to', 'VALUE': 1}], []),
+        _event('fine', [{'LABEL': 'count', 'METHOD': 'equal_to', 'VALUE': 1}], [])])
+    assert [event.get_label() for event in events] == ['fine']
+
+
+def test_the_index_only_evaluates_changed_or_hot_events():
+    registry = ComponentRegistry([Counter('left', 0), Counter('right', 0), Counter('fired', 0)])
+    events = create_events(registry, events_list=[
+        _event(side, [{'LABEL': side, 'METHOD': 'equal_to', 'VALUE': 1}],
+               [{'LABEL': 'fired', 'METHOD': 'increase_value', 'ARG': 1}])
+        for side in ('left', 'right')])
+    left_event, right_event = events
+    index = EventIndex(events)
+
+    # the first tick looks at everything, after that quiet events are left alone
+    assert index.evaluate(set()) == 2
+    assert index.evaluate(set()) == 0
+
+    # a change nobody's conditions look at wakes nothing
+    assert index.evaluate({registry.get('fired')}) == 0
+
+    registry.get('left').set_value(1)
+    assert index.evaluate({registry.get('left')}) == 1
+    assert (left_event.evaluations, right_event.evaluations) == (2, 1)
+
+    # left fired, so it's hot and gets another look with nothing changed
+    assert index.evaluate(set()) == 1
+    assert registry.get('fired').get_value() == 2
+    registry.get('left').set_value(0)
+    assert index.evaluate({registry.get('left')}) == 1
+    assert index.evaluate(set()) == 0
+    assert right_event.evaluations == 1
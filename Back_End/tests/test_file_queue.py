@@ -0,0 +1,81 @@
+import threading
+
+from Components import FileQueue
+
+
+def _pop_all(queue):
+    messages = []
+    while True:
+        before = queue.offset
+        queue.update()
+        if queue.offset != before:
+            messages.append(queue.get_value())
+            continue
+        # nothing gets popped while a compaction is going
+        compacting = queue._compact_thread
+        if compacting is None:
+            return messages
+        compacting.join()
+
+
+def test_messages_come_out_in_order(tmp_path):
+    path = str(tmp_path / 'commands.txt')
+    for message in ('one', 'two', '', 'three'):
+        FileQueue.append_message(path, message)
+    with open(path, 'ab') as f:
+        f.write(b'half a')
+
+    queue = FileQueue('commands', path)
+    assert _pop_all(queue) == ['one', 'two', 'three']
+
+    # the rest of the line turns up later
+    with open(path, 'ab') as f:
+        f.write(b' line\n')
+    assert _pop_all(queue) == ['half a line']
+
+
+def test_the_cursor_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'commands.txt')
+    for message in ('one', 'two'):
+        FileQueue.append_message(path, message)
+    assert _pop_all(FileQueue('commands', path)) == ['one', 'two']
+
+    FileQueue.append_message(path, 'three')
+    assert _pop_all(FileQueue('commands', path)) == ['three']
+
+
+def test_compact_keeps_only_unread_messages(tmp_path):
+    path = str(tmp_path / 'commands.txt')
+    for message in ('one', 'two', 'three'):
+        FileQueue.append_message(path, message)
+    queue = FileQueue('commands', path)
+    queue.update()
+
+    queue.compact()
+    assert queue.offset == 0
+    with open(path, 'rb') as f:
+        assert f.read() == b'two\nthree\n'
+    assert _pop_all(queue) == ['two', 'three']
+    assert _pop_all(FileQueue('commands', path)) == []
+
+
+def test_nothing_appended_during_background_compaction_is_lost(tmp_path):
+    path = str(tmp_path / 'commands.txt')
+    queue = FileQueue('commands', path)
+    queue.COMPACT_THRESHOLD = 200
+
+    def produce(name):
+        for index in range(300):
+            FileQueue.append_message(path, name + str(index))
+    producers = [threading.Thread(target=produce, args=(name,)) for name in ('a', 'b')]
+    for producer in producers:
+        producer.start()
+
+    received = []
+    while any(producer.is_alive() for producer in producers):
+        received.extend(_pop_all(queue))
+    for producer in producers:
+        producer.join()
+    received.extend(_pop_all(queue))
+
+    assert sorted(received) == sorted(name + str(index) for name in ('a', 'b') for index in range(300))
@@ -0,0 +1,68 @@
+import Hardware
+from Components import DigitalInput, DigitalOutput, PWMOutput
+from ProcessImage import ProcessImage
+
+
+def test_backend_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('PILC_BACKEND', 'simulated')
+    Hardware.set_backend(None)
+    assert Hardware.get_backend().NAME == 'SIMULATED'
+
+
+def test_components_get_the_current_backend(simulated_backend):
+    relay = DigitalOutput('relay', 1)
+    relay.attach()
+    assert relay.gpio is simulated_backend.gpio
+
+
+def test_digital_output_drives_its_pin(simulated_backend):
+    gpio = simulated_backend.gpio
+    relay = DigitalOutput('relay', 3)
+    relay.attach()
+    assert gpio.levels[relay.channel] == gpio.LOW
+    relay.set_value('HIGH')
+    assert gpio.levels[relay.channel] == gpio.HIGH
+    relay.toggle_value()
+    assert gpio.levels[relay.channel] == gpio.LOW
+
+
+def test_output_is_switched_off_and_released_on_teardown(simulated_backend):
+    gpio = simulated_backend.gpio
+    relay = DigitalOutput('relay', 2)
+    relay.attach()
+    relay.set_value('HIGH')
+    relay.teardown()
+    assert relay.channel not in gpio.levels
+
+
+def test_pwm_output_runs_on_a_simulated_pwm(simulated_backend):
+    fan = PWMOutput('fan', 1)
+    fan.attach()
+    fan.start(10)
+    assert fan.pwm_controller.running
+    fan.set_value(40)
+    assert fan.pwm_controller.duty_cycle == 40
+
+
+def test_process_image_only_writes_outputs_that_ended_up_changing(simulated_backend):
+    gpio = simulated_backend.gpio
+    relay = DigitalOutput('relay', 1)
+    relay.attach()
+    button = DigitalInput('button', 1)
+    button.attach()
+    image = ProcessImage([relay, button])
+    image.read_inputs()
+    assert button.value == 'HELD_UP'
+
+    relay.set_value('HIGH')
+    relay.set_value('LOW')
+    assert image.flush_outputs() == 0
+
+    relay.set_value('HIGH')
+    assert gpio.levels[relay.channel] == gpio.LOW
+    assert image.flush_outputs() == 1
+    assert gpio.levels[relay.channel] == gpio.HIGH
+
+    gpio.set_input(button.channel, gpio.LOW)
+    image.read_inputs()
+    assert button.value == 'PRESSED'
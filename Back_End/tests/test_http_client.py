@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from HttpClient import HttpClient
+
+requests = pytest.importorskip('requests')
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class Resource(BaseHTTPRequestHandler):
+    """
+    Serves server.body with server.etag, answering 304 when the client already has it
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.seen.append(self.headers.get('If-None-Match'))
+        if self.path != '/resource':
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = server.body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(('127.0.0.1', 0), Resource)
+    server.body = 'hello'
+    server.etag = '"v1"'
+    server.seen = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01})
+    thread.daemon = True
+    thread.start()
+    server.url = 'http://127.0.0.1:' + str(server.server_address[1]) + '/resource'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fresh_responses_come_from_the_cache(server):
+    client = HttpClient(ttl=60)
+    assert client.get(server.url) == 'hello'
+    assert client.get(server.url) == 'hello'
+    assert len(server.seen) == 1
+    report = client.get_report()
+    assert report['REQUESTS'] == 1 and report['CACHE_HITS'] == 1
+
+
+def test_stale_responses_get_revalidated_with_their_etag(server):
+    client = HttpClient(ttl=0)
+    assert client.get(server.url) == 'hello'
+    assert client.get(server.url) == 'hello'
+    assert server.seen == [None, '"v1"']
+    assert client.get_report()['NOT_MODIFIED'] == 1
+
+    # once it changes, the new body comes through
+    server.body = 'goodbye'
+    server.etag = '"v2"'
+    assert client.get(server.url) == 'goodbye'
+    assert client.get_report()['NOT_MODIFIED'] == 1
+
+
+def test_errors_are_raised_and_not_cached(server):
+    client = HttpClient(ttl=60)
+    missing = server.url.replace('/resource', '/missing')
+    with pytest.raises(requests.HTTPError):
+        client.get(missing)
+    with pytest.raises(requests.HTTPError):
+        client.get(missing)
+    assert len(server.seen) == 2
+
+
+def test_each_thread_gets_its_own_session(server):
+    client = HttpClient(ttl=0)
+    sessions = []
+
+    def fetch():
+        client.get(server.url)
+        sessions.append(client._session(server.url))
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(id(session) for session in sessions)) == 3
+    report = client.get_report()
+    assert report['HOSTS'] == 1 and report['REQUESTS'] == 3
@@ -0,0 +1,88 @@
+import sys
+import types
+from importlib.machinery import ModuleSpec
+
+import pytest
+
+import Hardware
+import Libraries
+from Components import AnalogInput, Counter, DigitalInput, Timer
+from Sampler import FakeADC
+from SimulatedGPIO import SimulatedGPIO
+
+# the libraries the Pi backend loads through Libraries
+HEAVY_LIBRARIES = ('RPi.GPIO', 'Adafruit_MCP3008', 'omxplayer.player', 'pygame')
+
+
+class StubLibraries(object):
+    """
+    Import hook standing in for the Pi's libraries, which aren't installed here
+    """
+
+    def __init__(self):
+        gpio = SimulatedGPIO()
+        self.modules = {'RPi': types.ModuleType('RPi'), 'RPi.GPIO': types.ModuleType('RPi.GPIO'),
+                        'Adafruit_MCP3008': types.ModuleType('Adafruit_MCP3008'),
+                        'omxplayer': types.ModuleType('omxplayer'),
+                        'omxplayer.player': types.ModuleType('omxplayer.player'),
+                        'pygame': types.ModuleType('pygame')}
+        for name in dir(gpio):
+            if not name.startswith('_'):
+                setattr(self.modules['RPi.GPIO'], name, getattr(gpio, name))
+        self.modules['Adafruit_MCP3008'].MCP3008 = lambda **pins: FakeADC()
+
+    def find_spec(self, name, path=None, target=None):
+        if name in self.modules:
+            return ModuleSpec(name, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return self.modules[spec.name]
+
+    def exec_module(self, module):
+        pass
+
+
+@pytest.fixture
+def pi_backend(monkeypatch):
+    stubs = StubLibraries()
+    monkeypatch.setattr(sys, 'meta_path', [stubs] + sys.meta_path)
+    monkeypatch.setattr(Libraries, '_modules', {})
+    monkeypatch.setattr(Libraries, '_load_times', [])
+    for name in stubs.modules:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    Hardware.set_backend(Hardware.PiBackend())
+    yield stubs
+    for name in stubs.modules:
+        sys.modules.pop(name, None)
+
+
+def _loaded():
+    return [name for name in HEAVY_LIBRARIES if name in sys.modules]
+
+
+def test_nothing_heavy_gets_imported_until_a_component_needs_it(pi_backend):
+    assert _loaded() == []
+
+    Counter('count', 0)
+    Timer('clock', 0)
+    assert _loaded() == []
+    assert Libraries.get_report() == {}
+
+    DigitalInput('button', 1).attach()
+    assert _loaded() == ['RPi.GPIO']
+    assert list(Libraries.get_report()) == ['RPi.GPIO']
+
+    AnalogInput('level', 0)
+    assert _loaded() == ['RPi.GPIO', 'Adafruit_MCP3008']
+    assert list(Libraries.get_report()) == ['RPi.GPIO', 'Adafruit_MCP3008']
+
+    # no media players, so neither of the media libraries ever gets loaded
+    assert 'omxplayer' not in sys.modules and 'pygame' not in sys.modules
+
+
+def test_each_library_is_only_loaded_once(pi_backend):
+    for number in (1, 2):
+        DigitalInput('button' + str(number), number).attach()
+    assert len(Libraries.get_report()) == 1
+    assert Libraries.load('RPi.GPIO') is sys.modules['RPi.GPIO']
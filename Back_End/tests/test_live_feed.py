@@ -0,0 +1,43 @@
+import socket
+
+from Components import Counter
+from LiveFeedServer import LiveFeedServer
+
+
+class Client(object):
+    def __init__(self):
+        self.sent = []
+
+    def send_changes(self, displays):
+        self.sent.append(dict(displays))
+
+
+def test_listens_on_the_pi_only_and_answers_only_allowed_origins():
+    server = LiveFeedServer(port=0)
+    server.start()
+    try:
+        assert server.address[0] == '127.0.0.1'
+        for origin, allowed in (('http://localhost:3000', True), ('http://evil.example', False)):
+            connection = socket.create_connection(server.address, timeout=2)
+            connection.sendall(('GET /live_feed HTTP/1.0\r\nOrigin: ' + origin + '\r\n\r\n').encode('ascii'))
+            headers = b''
+            while b'\r\n\r\n' not in headers:
+                headers += connection.recv(1024)
+            connection.close()
+            assert (b'Access-Control-Allow-Origin: ' + origin.encode('ascii') in headers) == allowed
+    finally:
+        server.stop()
+
+
+def test_values_already_sent_are_not_sent_again():
+    server = LiveFeedServer()
+    client = Client()
+    server.clients.append(client)
+    count = Counter('count', 0)
+
+    server.publish({count})
+    server.publish({count})
+    count.set_value(1)
+    server.publish({count})
+
+    assert [list(sent) for sent in client.sent] == [['count'], ['count']]
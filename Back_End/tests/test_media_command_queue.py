@@ -0,0 +1,89 @@
+import threading
+import time
+
+from MediaCommandQueue import MediaCommandQueue
+
+
+class Player(object):
+    """
+    Records the commands it's given, and can be made to hold them back like the real players do
+    """
+
+    def __init__(self, busy_for=0.0):
+        self.commands = []
+        self.busy_until = time.time() + busy_for
+        self.done = threading.Event()
+
+    def execute(self, command, submitted):
+        self.commands.append(command)
+        self.done.set()
+
+    def ready_in(self):
+        return max(0.0, self.busy_until - time.time())
+
+
+def test_conflicting_commands_collapse_into_the_latest():
+    player = Player()
+    queue = MediaCommandQueue('video', player.execute, player.ready_in)
+    for command in ('play', 'stop', 'play'):
+        queue.submit(command)
+    assert queue.depth() == 1
+
+    queue.start()
+    try:
+        assert player.done.wait(2)
+    finally:
+        queue.stop()
+    assert player.commands == ['play']
+    report = queue.get_report()
+    assert report['SUBMITTED'] == 3 and report['COLLAPSED'] == 2 and report['EXECUTED'] == 1
+
+
+def test_a_busy_player_gets_the_latest_command_once_it_is_ready():
+    player = Player(busy_for=0.05)
+    queue = MediaCommandQueue('video', player.execute, player.ready_in)
+    queue.start()
+    try:
+        queue.submit('play')
+        time.sleep(0.01)
+        # comes in while the player is still busy, so the play never happens
+        queue.submit('stop')
+        assert player.done.wait(2)
+    finally:
+        queue.stop()
+    assert player.commands == ['stop']
+
+    # the wait counts from the play that first came in, not the stop which replaced it
+    assert queue.get_report()['MAX_LATENCY'] >= 0.04
+
+
+def test_a_command_the_player_turns_down_gets_tried_again():
+    attempts = []
+    done = threading.Event()
+
+    def execute(command, submitted):
+        attempts.append(command)
+        if len(attempts) == 1:
+            return False
+        done.set()
+
+    queue = MediaCommandQueue('video', execute)
+    queue.start()
+    try:
+        queue.submit('play')
+        assert done.wait(2)
+    finally:
+        queue.stop()
+    assert attempts == ['play', 'play']
+    assert queue.get_report()['EXECUTED'] == 1
+
+
+def test_stop_drops_whatever_is_waiting():
+    player = Player(busy_for=10)
+    queue = MediaCommandQueue('video', player.execute, player.ready_in)
+    queue.start()
+    queue.submit('play')
+    queue.stop()
+    queue._thread.join(1)
+    assert not queue._thread.is_alive()
+    assert queue.depth() == 0 and player.commands == []
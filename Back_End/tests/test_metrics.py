@@ -0,0 +1,79 @@
+import FileHandler
+from Components import ComponentRegistry, Counter
+from Events import EventIndex, create_events, prune_event_timings
+from Metrics import BUCKET_COUNT, SUB_BUCKETS, Histogram, Metrics, _bucket_index, _bucket_top
+
+
+def test_small_values_get_a_bucket_each():
+    for micros in range(SUB_BUCKETS):
+        assert _bucket_index(micros) == micros
+        assert _bucket_top(micros) == micros
+
+
+def test_every_value_lands_in_the_bucket_whose_range_holds_it():
+    previous_top = SUB_BUCKETS - 1
+    for index in range(SUB_BUCKETS, 8 * SUB_BUCKETS):
+        top = _bucket_top(index)
+        # buckets pick up right where the last one left off
+        assert _bucket_index(previous_top + 1) == index
+        assert _bucket_index(top) == index
+        assert _bucket_index(top + 1) == index + 1
+        # and stay within 1/SUB_BUCKETS of the values in them
+        assert top - previous_top <= (top + 1) // SUB_BUCKETS
+        previous_top = top
+
+
+def test_huge_values_go_in_the_last_bucket():
+    assert _bucket_index(1 << 60) == BUCKET_COUNT - 1
+
+
+def test_percentiles_round_up_to_the_top_of_their_bucket():
+    histogram = Histogram()
+    assert histogram.percentile(99) == 0.0
+
+    # 90 quick ones at 10us, 10 slow ones at 1ms
+    for _ in range(90):
+        histogram.record(0.00001)
+    for _ in range(10):
+        histogram.record(0.001)
+
+    assert histogram.percentile(50) == 0.00001
+    assert histogram.percentile(90) == 0.00001
+    slow = histogram.percentile(99)
+    assert slow == histogram.max == 0.001
+
+    report = histogram.get_report()
+    assert report['COUNT'] == 100
+    assert report['P99_9'] == slow
+
+
+def test_timings_for_removed_events_get_dropped():
+    metrics = Metrics()
+    registry = ComponentRegistry([Counter('count', 0)])
+
+    def _events(*labels):
+        return create_events(registry, events_list=[
+            {'LABEL': label, 'CONDITIONS': [{'LABEL': 'count', 'METHOD': 'equal_to', 'VALUE': 1}], 'EFFECTS': []}
+            for label in labels])
+
+    EventIndex(_events('first', 'second'), metrics)
+    metrics.record('tick.duration', 0.001)
+    events = _events('second')
+    EventIndex(events, metrics)
+    prune_event_timings(metrics, events)
+
+    assert sorted(metrics.histograms) == ['event.second.evaluate', 'tick.duration']
+
+
+def test_metrics_only_get_saved_when_more_than_uptime_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(FileHandler, '_last_metrics', None)
+    metrics = Metrics()
+    metrics.record('tick.duration', 0.001)
+
+    assert FileHandler.save_metrics(metrics.get_report())
+    assert not FileHandler.save_metrics(metrics.get_report())
+    metrics.record('tick.duration', 0.002)
+    assert FileHandler.save_metrics(metrics.get_report())
+    FileHandler.flush_writes(True)
+    assert (tmp_path / 'metrics.json').exists()
@@ -0,0 +1,80 @@
+import threading
+
+from Persistence import FileWriter
+
+
+def test_the_writer_thread_flushes_on_its_own(tmp_path):
+    target = tmp_path / 'live_feed.json'
+    writer = FileWriter()
+    flushed = threading.Event()
+
+    class Histogram(object):
+        def record(self, seconds):
+            if target.exists():
+                flushed.set()
+    writer.histogram = Histogram()
+
+    writer.start(0.01)
+    try:
+        writer.write(str(target), '{"a":1}', 0)
+        assert flushed.wait(2)
+    finally:
+        writer.stop()
+    assert target.read_text() == '{"a":1}'
+
+
+def test_stop_writes_out_whatever_is_still_waiting(tmp_path):
+    target = tmp_path / 'definitions.json'
+    writer = FileWriter()
+    writer.start(60)
+    writer.write(str(target), '{}', 60)
+    writer.stop()
+    assert target.read_text() == '{}'
+    assert writer.pending() == []
+
+
+def test_identical_data_is_not_written_again(tmp_path):
+    target = tmp_path / 'metrics.json'
+    writer = FileWriter()
+    assert writer.write_now(str(target), '{}')
+    assert not writer.write_now(str(target), '{}')
+    assert writer.get_report()['SKIPPED_IDENTICAL'] == 1
+
+
+def test_data_from_a_function_is_only_made_when_the_write_is_due(tmp_path):
+    target = tmp_path / 'definitions.snapshot'
+    writer = FileWriter()
+    made = []
+
+    def make(data):
+        def maker():
+            made.append(data)
+            return data
+        return maker
+
+    writer.write(str(target), make(b'old'), 60)
+    writer.write(str(target), make(b'new'), 60)
+    assert made == []
+    writer.flush(True)
+    assert made == [b'new']
+    assert target.read_bytes() == b'new'
+
+
+def test_one_failed_write_leaves_the_rest_alone(tmp_path):
+    # the first file's directory doesn't exist, so its temp file can't be made
+    missing = tmp_path / 'gone' / 'live_feed.json'
+    targets = [tmp_path / 'definitions.json', tmp_path / 'metrics.json']
+    writer = FileWriter()
+    writer.write(str(missing), '{"a":1}', 0)
+    for target in targets:
+        writer.write(str(target), '{}', 0)
+
+    assert writer.flush() == 2
+    assert all(target.read_text() == '{}' for target in targets)
+    assert writer.pending() == [str(missing)]
+
+    # the failed write goes again, with whatever is newest for it
+    writer.write(str(missing), '{"a":2}', 0)
+    missing.parent.mkdir()
+    assert writer.flush() == 1
+    assert missing.read_text() == '{"a":2}'
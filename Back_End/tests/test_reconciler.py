@@ -0,0 +1,119 @@
+import pytest
+
+import Reconciler
+from Components import DigitalInput, create_components
+from Events import create_events
+
+
+def _definitions():
+    return {'COUNTER': [{'LABEL': 'count', 'VALUE': 0}],
+            'DIGITAL_OUTPUT': [{'LABEL': 'relay', 'VALUE': 1}]}
+
+
+def _event(label, component='count'):
+    return {'LABEL': label, 'CONDITIONS': [{'LABEL': component, 'METHOD': 'equal_to', 'VALUE': 1}],
+            'EFFECTS': [{'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}]}
+
+
+@pytest.fixture
+def running():
+    registry = create_components(components_dict=_definitions())
+    events = create_events(registry, events_list=[_event('bump')])
+    registry.get('relay').set_value('HIGH')
+    return registry, events
+
+
+def _relay_pin(gpio, registry):
+    channel = registry.get('relay').channel
+    return gpio.directions.get(channel), gpio.levels.get(channel)
+
+
+def test_unchanged_components_and_events_are_kept(running):
+    registry, events = running
+    relay = registry.get('relay')
+    updates = {'COMPONENTS': _definitions(), 'EVENTS': [_event('bump')]}
+    new_registry, new_events, comps_changed, events_changed = Reconciler.reconcile(registry, events, updates)
+
+    assert new_registry.get('relay') is relay
+    assert new_events[0] is events[0]
+    assert not comps_changed and not events_changed
+
+
+def test_a_counter_is_reconfigured_in_place(running):
+    registry, events = running
+    count = registry.get('count')
+    definitions = _definitions()
+    definitions['COUNTER'][0]['VALUE'] = 5
+    new_registry, _, comps_changed, _ = Reconciler.reconcile(registry, events, {'COMPONENTS': definitions})
+
+    assert new_registry.get('count') is count
+    assert count.INITIAL_VALUE == 5
+    assert comps_changed
+
+
+def test_a_bad_component_leaves_everything_running(simulated_backend, running):
+    registry, events = running
+    gpio = simulated_backend.gpio
+    definitions = _definitions()
+    definitions['DIGITAL_OUTPUT'] = []
+    definitions['ANALOG_INPUT'] = [{'LABEL': 'level', 'VALUE': 9}]
+
+    with pytest.raises(ValueError):
+        Reconciler.reconcile(registry, events, {'COMPONENTS': definitions})
+
+    assert 'relay' in registry and 'level' not in registry
+    assert _relay_pin(gpio, registry) == (gpio.OUT, gpio.HIGH)
+
+
+def test_an_event_on_an_unknown_component_rejects_the_whole_update(simulated_backend, running):
+    registry, events = running
+    gpio = simulated_backend.gpio
+    definitions = _definitions()
+    definitions['DIGITAL_OUTPUT'] = []
+
+    with pytest.raises(ValueError):
+        Reconciler.reconcile(registry, events, {'COMPONENTS': definitions, 'EVENTS': [_event('bump', 'ghost')]})
+
+    assert registry.get('relay').attached
+    assert _relay_pin(gpio, registry) == (gpio.OUT, gpio.HIGH)
+
+
+def test_a_replacement_only_gets_the_pin_on_commit(simulated_backend, running):
+    registry, events = running
+    gpio = simulated_backend.gpio
+    relay = registry.get('relay')
+    definitions = _definitions()
+    definitions['DIGITAL_INPUT'] = [{'LABEL': 'relay', 'VALUE': 1}]
+    del definitions['DIGITAL_OUTPUT']
+
+    reconciliation = Reconciler.prepare(registry, events, {'COMPONENTS': definitions})
+    assert reconciliation.is_current(registry, events)
+    assert _relay_pin(gpio, registry) == (gpio.OUT, gpio.HIGH)
+
+    new_registry, _ = reconciliation.commit()
+    button = new_registry.get('relay')
+    assert isinstance(button, DigitalInput) and button.attached
+    assert gpio.directions[button.channel] == gpio.IN
+    assert registry.get('relay') is relay
+    assert not relay.attached and relay.channel not in gpio.directions
+
+
+def test_a_failed_commit_puts_the_pins_back(simulated_backend, running, monkeypatch):
+    registry, events = running
+    gpio = simulated_backend.gpio
+    definitions = _definitions()
+    definitions['COUNTER'][0]['VALUE'] = 5
+    definitions['DIGITAL_INPUT'] = [{'LABEL': 'relay', 'VALUE': 1}]
+    del definitions['DIGITAL_OUTPUT']
+
+    def broken_attach(component):
+        raise RuntimeError('pin is busy')
+    monkeypatch.setattr(DigitalInput, 'attach', broken_attach)
+
+    reconciliation = Reconciler.prepare(registry, events, {'COMPONENTS': definitions})
+    with pytest.raises(RuntimeError):
+        reconciliation.commit()
+
+    assert registry.get('relay').attached
+    assert _relay_pin(gpio, registry) == (gpio.OUT, gpio.HIGH)
+    assert registry.get('count').INITIAL_VALUE == 0
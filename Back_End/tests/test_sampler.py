@@ -0,0 +1,98 @@
+import time
+
+from Components import AnalogInput, ComponentRegistry, Counter, pop_dirty_components
+from Events import EventIndex, create_events, register_windowed_inputs
+from Sampler import ADCSampler, FakeADC
+
+
+def _wait_for(predicate, timeout=1.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+def test_sampler_keeps_statistics_per_channel():
+    adc = FakeADC(values={0: 100, 1: 900})
+    sampler = ADCSampler(adc, channels=(0, 1), window=8)
+    for _ in range(8):
+        sampler.scan()
+    assert sampler.latest(0) == 100
+    assert sampler.mean(1) == 900
+    assert sampler.minimum(0) == sampler.maximum(0) == 100
+
+
+def test_sampler_catches_a_spike_between_scans():
+    adc = FakeADC(values={0: 10})
+    sampler = ADCSampler(adc, channels=(0,), window=4)
+    sampler.scan()
+    adc.set_value(0, 1000)
+    sampler.scan()
+    adc.set_value(0, 10)
+    sampler.scan()
+    assert sampler.latest(0) == 10
+    assert sampler.maximum(0) == 1000
+
+
+def test_analog_input_reads_through_the_running_sampler(simulated_backend):
+    simulated_backend.adc.set_value(2, 512)
+    AnalogInput.start_sampler(rate=2000, source=simulated_backend.adc)
+    analog = AnalogInput('a2', 2)
+    _wait_for(lambda: AnalogInput.sampler.latest(2) is not None)
+    analog.update()
+    assert analog.value == 512
+    assert analog.mean_greater_than(500)
+
+
+def test_analog_input_never_reads_the_chip_while_the_sampler_owns_it(simulated_backend):
+    # never started, so it never gets a reading
+    AnalogInput.sampler = ADCSampler(FakeADC(values={3: 7}))
+    analog = AnalogInput('a3', 3)
+    analog.value = 42
+
+    # no reading from the sampler yet: the last known value stands, and the chip is left alone
+    analog.update()
+    assert analog.value == 42
+    assert simulated_backend.adc.reads == 0
+    assert AnalogInput.mcp is None
+
+
+def test_teardown_stops_scanning_only_after_the_last_reader_goes(simulated_backend):
+    sampler = AnalogInput.sampler = ADCSampler(FakeADC())
+    first = AnalogInput('first', 1)
+    second = AnalogInput('second', 1)
+    assert sampler.channels == (1,)
+    first.teardown()
+    assert sampler.channels == (1,)
+    second.teardown()
+    assert sampler.channels == ()
+
+
+def test_a_spike_between_scans_still_gets_the_windowed_event_evaluated(simulated_backend):
+    adc = FakeADC(values={0: 10})
+    # never started, the test does the sampling
+    sampler = AnalogInput.sampler = ADCSampler(adc, window=8)
+    registry = ComponentRegistry([AnalogInput('level', 0), Counter('spikes', 0)])
+    events = create_events(registry, events_list=[
+        {'LABEL': 'spike', 'CONDITIONS': [{'LABEL': 'level', 'METHOD': 'max_greater_than', 'VALUE': 500}],
+         'EFFECTS': [{'LABEL': 'spikes', 'METHOD': 'increase_value', 'ARG': 1}]}])
+    register_windowed_inputs(registry, events)
+    index = EventIndex(events)
+    level = registry.get('level')
+
+    sampler.scan()
+    level.update()
+    index.evaluate(pop_dirty_components())
+    index.evaluate(pop_dirty_components())
+    assert registry.get('spikes').get_value() == 0
+
+    # up and back down again before the next scan, so the latest reading never moves
+    adc.set_value(0, 1000)
+    sampler.scan()
+    adc.set_value(0, 10)
+    sampler.scan()
+    level.update()
+    assert level.get_value() == 10
+    assert index.evaluate(pop_dirty_components()) == 1
+    assert registry.get('spikes').get_value() == 1
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from Scheduler import Scheduler
+
+
+def test_tasks_run_in_deadline_order():
+    scheduler = Scheduler()
+    ran = []
+    scheduler.call_later(0.02, lambda: ran.append('second'))
+    scheduler.call_later(0.01, lambda: ran.append('first'))
+    time.sleep(0.03)
+    assert scheduler.run_pending() == 2
+    assert ran == ['first', 'second']
+
+
+def test_nothing_runs_before_its_deadline():
+    scheduler = Scheduler()
+    ran = []
+    scheduler.call_later(10, lambda: ran.append(True))
+    assert scheduler.run_pending() == 0
+    assert ran == []
+
+
+def test_cancelled_tasks_do_not_run():
+    scheduler = Scheduler()
+    ran = []
+    task = scheduler.call_later(0, lambda: ran.append(True))
+    task.cancel()
+    assert scheduler.run_pending() == 0
+    assert scheduler.next_deadline() is None
+
+
+def test_periodic_tasks_get_rescheduled():
+    scheduler = Scheduler()
+    ran = []
+    scheduler.call_every(0.005, lambda: ran.append(True))
+    for _ in range(3):
+        scheduler.run_once(timeout=0.1)
+    assert len(ran) == 3
+    assert scheduler.next_deadline() is not None
+
+
+def test_a_failing_task_stays_scheduled_and_does_not_stop_others():
+    scheduler = Scheduler()
+    ran = []
+
+    def broken():
+        raise RuntimeError('boom')
+
+    scheduler.call_every(0.005, broken, label='BROKEN')
+    scheduler.call_every(0.005, lambda: ran.append(True), label='FINE')
+    for _ in range(4):
+        scheduler.run_once(timeout=0.1)
+
+    assert scheduler.errors >= 2
+    assert len(ran) >= 2
+    assert len(scheduler._queue) == 2
+
+
+def test_wake_cuts_the_sleep_short():
+    scheduler = Scheduler()
+    scheduler.call_later(10, lambda: None)
+    timer = threading.Timer(0.02, scheduler.wake)
+    timer.start()
+    start = time.time()
+    scheduler.run_once()
+    timer.join()
+    assert time.time() - start < 1
+
+
+def test_wake_before_the_sleep_is_not_lost():
+    scheduler = Scheduler()
+    scheduler.call_later(10, lambda: None)
+    original_next_deadline = scheduler.next_deadline
+
+    # a wake() which lands while run_once() is working out how long to sleep
+    def next_deadline():
+        scheduler.wake()
+        return original_next_deadline()
+    scheduler.next_deadline = next_deadline
+
+    start = time.time()
+    scheduler.run_once(timeout=5)
+    assert time.time() - start < 1
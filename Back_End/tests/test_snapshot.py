@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import Events
+import FileHandler
+import Snapshot
+from Components import COMPONENT_CLASSES
+
+
+@pytest.fixture
+def definitions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'commands.txt').write_text('')
+    components = {
+        'TIMER': [{'LABEL': 'clock', 'VALUE': 2.5}],
+        'COUNTER': [{'LABEL': 'count', 'VALUE': 4}],
+        'DIGITAL_INPUT': [{'LABEL': 'button', 'VALUE': 2}],
+        'DIGITAL_OUTPUT': [{'LABEL': 'relay', 'VALUE': 3}],
+        'ANALOG_INPUT': [{'LABEL': 'level', 'VALUE': 3}],
+        'FILE_QUEUE': [{'LABEL': 'commands', 'VALUE': 'commands.txt'}],
+        'SIMPLE_AUDIO_PLAYER': [{'LABEL': 'chime', 'VALUE': 'chime.wav'}],
+        'SIMPLE_VIDEO_PLAYER': [{'LABEL': 'movie', 'VALUE': 'movie.mp4'}],
+    }
+    assert sorted(components) == sorted(COMPONENT_CLASSES)
+    events = [
+        {'LABEL': 'ring', 'CONDITIONS': [{'LABEL': 'button', 'METHOD': 'equal_to', 'VALUE': 'PRESSED'},
+                                         {'LABEL': 'level', 'METHOD': 'greater_than', 'VALUE': 0.5}],
+         'EFFECTS': [{'LABEL': 'chime', 'METHOD': 'play', 'ARG': None},
+                     {'LABEL': 'count', 'METHOD': 'increase_value', 'ARG': 1}],
+         'ACTIVATE': [{'LABEL': 'clock', 'METHOD': 'greater_than', 'VALUE': float('inf')}],
+         'DEACTIVATE': [{'LABEL': 'count', 'METHOD': 'greater_than', 'VALUE': 9}]},
+        {'LABEL': 'show', 'CONDITIONS': [{'LABEL': 'commands', 'METHOD': 'equal_to', 'VALUE': 'go'}],
+         'EFFECTS': [{'LABEL': 'movie', 'METHOD': 'play', 'ARG': None},
+                     {'LABEL': 'relay', 'METHOD': 'toggle', 'ARG': None}]},
+    ]
+    data = json.dumps({'COMPONENTS': components, 'EVENTS': events})
+    (tmp_path / 'definitions.json').write_text(data)
+    yield data
+
+    # whatever's still waiting belongs in tmp_path, not wherever the tests were run from
+    FileHandler.flush_writes(True)
+
+
+def _describe(components, events):
+    return (sorted(json.dumps(component.get_definition(), sort_keys=True) for component in components),
+            [json.dumps(event.get_definition(), sort_keys=True) for event in events])
+
+
+def _teardown(components):
+    for component in components:
+        component.teardown()
+
+
+def test_a_snapshot_boots_the_same_as_the_json(definitions):
+    components, events = FileHandler.load_definition()
+    from_json = _describe(components, events)
+    FileHandler.flush_writes(True)
+    _teardown(components)
+
+    digest = Snapshot.digest(definitions.encode('utf-8'))
+    components, events = Snapshot.load(FileHandler.SNAPSHOT_FILE, digest)
+    assert components is not None
+    try:
+        assert _describe(components, events) == from_json
+        assert components.get('level').channel == 3
+        for event in events:
+            for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+                if condition is not None:
+                    assert condition.evaluate() == condition.__class__.evaluate(condition)
+    finally:
+        _teardown(components)
+
+
+def test_a_snapshot_of_other_definitions_is_ignored(definitions):
+    components, _ = FileHandler.load_definition()
+    FileHandler.flush_writes(True)
+    _teardown(components)
+    assert Snapshot.load(FileHandler.SNAPSHOT_FILE, Snapshot.digest(b'{}')) == (None, None)
+
+
+def test_the_snapshot_is_only_encoded_when_its_write_is_due(definitions, monkeypatch):
+    components, events = FileHandler.load_definition()
+    FileHandler.flush_writes(True)
+    packed = []
+    pack = Snapshot._pack
+    monkeypatch.setattr(Snapshot, '_pack', lambda *args: packed.append(args) or pack(*args))
+    try:
+        FileHandler.save_definition(components, events)
+        FileHandler.save_definition(components, events)
+        assert packed == []
+        FileHandler.flush_writes(True)
+        assert len(packed) == 1
+    finally:
+        _teardown(components)
+
+
+def test_the_code_cache_only_keeps_code_for_events_in_play(definitions):
+    components, events = FileHandler.load_definition()
+    Events.code_cache['lambda: stale'] = compile('True', '<condition>', 'eval')
+    try:
+        Events.prune_code_cache(events)
+        live = set()
+        for event in events:
+            for condition in (event.condition, event.activate_condition, event.deactivate_condition):
+                if condition is not None:
+                    live.update(condition.sources)
+        assert set(Events.code_cache) == live
+
+        Events.prune_code_cache(events[:1])
+        assert len(Events.code_cache) < len(live)
+    finally:
+        _teardown(components)
@@ -0,0 +1,118 @@
+import pytest
+
+import Hardware
+import SoundBank
+from Components import SimpleAudioPlayer
+
+
+class StubMixer(Hardware.SimulatedBackend):
+    """
+    Simulated backend which counts decodes, and gives each track the length it's told to
+    """
+
+    def __init__(self, lengths=None):
+        super(StubMixer, self).__init__()
+        self.lengths = lengths if lengths is not None else {}
+        self.decoded = []
+
+    def load_sound(self, path):
+        if path not in self.lengths:
+            raise IOError('unsupported format')
+        self.decoded.append(path)
+        return Hardware.SimulatedSound(path, length=self.lengths[path])
+
+
+@pytest.fixture
+def mixer(monkeypatch):
+    mixer = StubMixer({'beep.wav': 0.5, 'ding.wav': 1.0, 'chime.wav': 1.0, 'soundtrack.ogg': 600.0})
+    Hardware.set_backend(mixer)
+    monkeypatch.setattr(SoundBank, '_bank', None)
+    return mixer
+
+
+def test_a_track_is_decoded_once(mixer):
+    bank = SoundBank.SoundBank(mixer)
+    sound = bank.load('beep.wav')
+    assert bank.get('beep.wav') is sound
+    assert mixer.decoded == ['beep.wav']
+    assert bank.get_report()['BYTES'] == mixer.sound_bytes(sound)
+
+
+def test_long_and_undecodable_tracks_stream(mixer):
+    bank = SoundBank.SoundBank(mixer)
+    assert bank.load('soundtrack.ogg') is None
+    assert bank.load('broken.mp3') is None
+
+    # and nobody tries decoding them again
+    assert bank.get('soundtrack.ogg') is None
+    assert mixer.decoded == ['soundtrack.ogg']
+    report = bank.get_report()
+    assert report['STREAMED'] == 2 and report['SOUNDS'] == 0 and report['BYTES'] == 0
+
+
+def test_the_least_recently_played_sound_makes_room(mixer):
+    one_second = Hardware.SimulatedSound.BYTES_PER_SECOND
+    bank = SoundBank.SoundBank(mixer, max_bytes=2 * one_second)
+    bank.load('ding.wav')
+    bank.load('chime.wav')
+    bank.get('ding.wav')
+    bank.load('beep.wav')
+
+    report = bank.get_report()
+    assert report['SOUNDS'] == 2 and report['EVICTIONS'] == 1
+    assert report['BYTES'] <= report['MAX_BYTES']
+
+    # chime went, so it gets decoded again
+    bank.get('ding.wav')
+    assert mixer.decoded.count('ding.wav') == 1
+    bank.get('chime.wav')
+    assert mixer.decoded.count('chime.wav') == 2
+
+
+def test_players_share_sounds_but_not_channels(mixer):
+    first = SimpleAudioPlayer('first', 'beep.wav')
+    second = SimpleAudioPlayer('second', 'beep.wav')
+    try:
+        assert first.bank is second.bank
+        assert mixer.decoded == ['beep.wav']
+        assert first.channel is not second.channel
+
+        # both sound at once
+        first.play()
+        second.play()
+        assert first.channel.get_busy() and second.channel.get_busy()
+        assert first.channel.get_sound() is second.channel.get_sound()
+
+        first.stop()
+        assert not first.channel.get_busy() and second.channel.get_busy()
+    finally:
+        first.teardown()
+        second.teardown()
+
+
+def test_a_torn_down_players_channel_goes_to_the_next_one(mixer):
+    first = SimpleAudioPlayer('first', 'beep.wav')
+    channel = first.channel
+    first.play()
+    first.teardown()
+    assert not channel.get_busy()
+
+    second = SimpleAudioPlayer('second', 'ding.wav')
+    try:
+        assert second.channel is channel
+        assert SoundBank.get_sound_bank().get_report()['CHANNELS'] == 1
+    finally:
+        second.teardown()
+
+
+def test_the_report_adds_up_the_decoded_audio(mixer):
+    bank = SoundBank.SoundBank(mixer)
+    bank.load('beep.wav')
+    bank.load('ding.wav')
+    bank.load('soundtrack.ogg')
+    bank.reserve_channel()
+
+    report = bank.get_report()
+    assert report['BYTES'] == int(1.5 * Hardware.SimulatedSound.BYTES_PER_SECOND)
+    assert report['SOUNDS'] == 2 and report['STREAMED'] == 1
+    assert report['LOADS'] == 2 and report['CHANNELS'] == 1
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from Components import Timer
+from Scheduler import Scheduler, clock
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Timer.scheduler = Scheduler()
+    yield scheduler
+    Timer.scheduler = None
+
+
+def _scan(scheduler, timer, seconds, method='equal_to', value=0.02):
+    """
+    Runs the scheduler and scans timer for seconds
+    :return: how many scans method(value) was true for
+    """
+    hits = 0
+    deadline = clock() + seconds
+    while clock() < deadline:
+        scheduler.run_once(timeout=0.002)
+        timer.update()
+        if getattr(timer, method)(value):
+            hits += 1
+    return hits
+
+
+def test_equal_to_is_true_for_exactly_one_scan(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.02])
+    timer.set_state('RUNNING')
+    assert _scan(scheduler, timer, 0.06) == 1
+    assert timer._threshold_task is None
+
+
+def test_every_threshold_gets_its_own_wake_up(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.04, 0.02])
+    timer.set_state('RUNNING')
+    assert timer._threshold_task.deadline == pytest.approx(timer.start_time + 0.02)
+    assert _scan(scheduler, timer, 0.03) == 1
+    assert timer._threshold_task.deadline == pytest.approx(timer.start_time + 0.04)
+    assert _scan(scheduler, timer, 0.03, value=0.04) == 1
+
+
+def test_pausing_takes_the_threshold_out_of_the_heap(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.02])
+    timer.set_state('RUNNING')
+    timer.set_state('PAUSED')
+    assert timer._threshold_task is None
+    assert scheduler.next_deadline() is None
+
+    # a pause longer than the threshold doesn't cross it
+    assert _scan(scheduler, timer, 0.03) == 0
+
+    # and the clock picks up where it left off
+    timer.set_state('RUNNING')
+    assert timer._threshold_task.deadline == pytest.approx(clock() + 0.02 - timer.value, abs=0.005)
+    assert _scan(scheduler, timer, 0.04) == 1
+
+
+def test_stopping_starts_the_thresholds_over(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.02])
+    timer.set_state('RUNNING')
+    assert _scan(scheduler, timer, 0.03) == 1
+
+    timer.set_state('STOPPED')
+    assert timer._threshold_task is None
+    assert timer.get_value() == 0
+
+    timer.set_state('RUNNING')
+    assert _scan(scheduler, timer, 0.03) == 1
+
+
+def test_setting_the_time_skips_thresholds_it_jumps_over(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.02, 0.05])
+    timer.set_state('RUNNING')
+    timer.set_value(0.03)
+    assert timer._threshold_task.deadline == pytest.approx(timer.start_time + 0.05)
+    assert _scan(scheduler, timer, 0.01) == 0
+
+    # winding it back arms the earlier one again
+    timer.set_value(0)
+    assert timer._threshold_task.deadline == pytest.approx(timer.start_time + 0.02)
+
+
+def test_a_late_wake_up_counts_every_threshold_it_passed(scheduler):
+    timer = Timer('clock', 0)
+    timer.set_thresholds([0.01, 0.02])
+    timer.set_state('RUNNING')
+    time.sleep(0.03)
+    scheduler.run_once(timeout=0)
+    timer.update()
+    assert timer.equal_to(0.01) and timer.equal_to(0.02)
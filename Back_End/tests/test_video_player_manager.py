@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from Components import SimpleVideoPlayer
+from VideoPlayerManager import VideoPlayerManager
+
+
+@pytest.fixture
+def manager(simulated_backend):
+    # never started, the tests warm it up themselves
+    manager = VideoPlayerManager(simulated_backend)
+    yield manager
+    manager.stop_all()
+
+
+@pytest.fixture
+def video_players():
+    yield
+    if SimpleVideoPlayer.manager is not None:
+        SimpleVideoPlayer.manager.stop_all()
+        SimpleVideoPlayer.manager = None
+    SimpleVideoPlayer.time_out = 0
+
+
+def test_the_warm_player_waits_paused_and_hidden(simulated_backend, manager):
+    manager.preload('intro.mp4')
+    manager.warm_up()
+    manager.warm_up()
+
+    assert simulated_backend.video_players == [manager.player]
+    assert manager.player.paused and not manager.player.visible
+    assert not manager.is_playing()
+
+
+def test_replaying_the_warm_track_is_a_seek(simulated_backend, manager):
+    manager.preload('intro.mp4')
+    manager.warm_up()
+    manager.play('intro.mp4', requested=time.time() - 0.25)
+
+    assert len(simulated_backend.video_players) == 1
+    assert manager.is_playing('intro.mp4') and manager.player.visible
+    report = manager.get_report()
+    assert report['WARM_STARTS'] == 1 and report['SPAWNS'] == 1
+    assert report['MAX_LATENCY'] >= 0.25
+
+
+def test_another_track_reuses_the_same_player(simulated_backend, manager):
+    manager.preload('intro.mp4')
+    manager.preload('outro.mp4')
+    manager.warm_up()
+    manager.play('outro.mp4')
+
+    assert len(simulated_backend.video_players) == 1
+    assert manager.player.get_source() == 'outro.mp4'
+    assert manager.get_report()['LOADS'] == 1
+
+    # already playing, so nothing happens
+    manager.play('intro.mp4')
+    assert manager.player.get_source() == 'outro.mp4'
+    assert manager.get_report()['PLAYS'] == 1
+
+
+def test_stopping_parks_the_player_rather_than_quitting_it(manager):
+    manager.preload('intro.mp4')
+    manager.warm_up()
+    manager.play('intro.mp4')
+    player = manager.player
+
+    # somebody else's track isn't playing, so there's nothing for them to stop
+    manager.stop('outro.mp4')
+    assert manager.is_playing('intro.mp4')
+
+    manager.stop('intro.mp4')
+    assert manager.player is player and not player.quit_called
+    assert player.paused and player.position == 0.0 and not player.visible
+
+
+def test_a_player_that_went_away_gets_replaced(simulated_backend, manager):
+    manager.preload('intro.mp4')
+    manager.warm_up()
+    simulated_backend.video_players[0].quit()
+
+    assert not manager.is_playing()
+    manager.warm_up()
+    assert len(simulated_backend.video_players) == 2
+    assert manager.player is simulated_backend.video_players[1]
+
+
+def test_stop_all_quits_the_player(manager):
+    manager.preload('intro.mp4')
+    manager.warm_up()
+    player = manager.player
+    manager.stop_all()
+    assert player.quit_called and manager.player is None
+
+
+def test_video_players_take_turns_with_the_one_player(simulated_backend, video_players):
+    first = SimpleVideoPlayer('first', 'intro.mp4')
+    second = SimpleVideoPlayer('second', 'outro.mp4')
+    try:
+        assert first.manager is second.manager
+        first.run_command('play')
+        assert first.manager.is_playing('intro.mp4')
+
+        # the player is first's until its time is up, so second's command has to wait
+        assert second.run_command('play') is False
+        assert not first.manager.is_playing('outro.mp4')
+    finally:
+        first.teardown()
+        second.teardown()
+
+
+def test_teardown_stops_the_command_queue(simulated_backend, video_players):
+    player = SimpleVideoPlayer('first', 'intro.mp4')
+    player.teardown()
+    player.commands._thread.join(1)
+    assert not player.commands._thread.is_alive()